@@ -0,0 +1,91 @@
+#!/usr/bin/env python2.7
+# -*- coding: utf-8 -*-
+
+"""
+Persistent UCSF Chimera worker for ColBuilder.
+
+Started once per run with "chimera --nogui --silent --script worker.py", it runs the
+scripts of this directory (matrixget.py, matrixset.py, swapaa.py, generate_copies.py)
+on request, so Chimera starts only once.
+
+Protocol, one JSON object per line:
+    request on stdin:   {"id": 1, "script": "swapaa.py", "env": {...}, "args": [...], "cwd": "..."}
+    response on stdout: COLBUILDER_WORKER {"id": 1, "ok": true, "error": null}
+A response {"ready": true} is sent once at start. A request with "script": null or the
+end of stdin stops the worker. Output of the scripts goes to stderr.
+
+Run with --fake to answer requests without Chimera, e.g. to test clients of the protocol.
+"""
+
+import json
+import os
+import sys
+import traceback
+
+PREFIX = "COLBUILDER_WORKER "
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def respond(out, message):
+    """Write a response line to the protocol stream."""
+    out.write(PREFIX + json.dumps(message) + "\n")
+    out.flush()
+
+def get_script(request):
+    """Get path of the requested script, only scripts of this directory can be run."""
+    script = os.path.join(SCRIPTS_DIR, os.path.basename(request['script']))
+    if not os.path.exists(script):
+        raise IOError("Script not found: %s" % script)
+    return script
+
+def run_script(request):
+    """Run a script in Chimera like "chimera --script", closing all models afterwards."""
+    import chimera
+
+    script = get_script(request)
+    env = request.get('env') or {}
+    cwd = os.getcwd()
+    saved_env = dict((key, os.environ.get(key)) for key in env)
+    os.environ.update(env)
+    sys.argv = [script] + list(request.get('args') or [])
+    os.chdir(request.get('cwd') or cwd)
+    try:
+        try:
+            execfile(script, {'__name__': '__main__', '__file__': script})
+        except SystemExit as e:
+            if e.code not in (None, 0):
+                raise RuntimeError("%s exited with code %s" % (request['script'], e.code))
+    finally:
+        chimera.openModels.close(chimera.openModels.list())
+        os.chdir(cwd)
+        for key, value in saved_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+def fake_script(request):
+    """Answer a request without running it."""
+    get_script(request)
+    sys.stderr.write("fake worker: %s %s\n" % (request['script'], ' '.join(request.get('args') or [])))
+
+def serve(execute):
+    """Answer requests from stdin until a stop request or the end of stdin."""
+    out = sys.stdout
+    sys.stdout = sys.stderr
+    respond(out, {'ready': True})
+    for line in iter(sys.stdin.readline, ''):
+        line = line.strip()
+        if not line:
+            continue
+        request = json.loads(line)
+        if request.get('script') is None:
+            break
+        try:
+            execute(request)
+            respond(out, {'id': request.get('id'), 'ok': True, 'error': None})
+        except Exception as e:
+            traceback.print_exc()
+            respond(out, {'id': request.get('id'), 'ok': False, 'error': str(e)})
+
+if __name__ == "__main__":
+    serve(fake_script if '--fake' in sys.argv else run_script)
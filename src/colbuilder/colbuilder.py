@@ -33,7 +33,7 @@ from pathlib import Path
 import traceback
 from typing import (
     Dict, Any, Tuple, Optional, AsyncIterator, 
-    Union, Protocol, runtime_checkable
+    Union, Protocol, runtime_checkable, List, Callable, Awaitable
 )
 import click
 from colorama import init, Fore, Style
@@ -41,6 +41,8 @@ from . import VERSION
 
 from colbuilder.core.utils.logger import setup_logger
 from colbuilder.core.utils.dec import timeit
+from colbuilder.core.utils.runner import set_max_processes
+from colbuilder.core.utils.checkpoint import Checkpoint
 from colbuilder.core.utils.config import (
     ColbuilderConfig, 
     get_config, 
@@ -58,6 +60,7 @@ from colbuilder.core.utils.exceptions import (
     ErrorSeverity
 )
 from colbuilder.core.geometry.system import System
+from colbuilder.core.geometry.chimera import close_workers
 
 ConfigDict = Dict[str, Any]
 RatioDict = Dict[str, int]
@@ -463,6 +466,69 @@ async def run_topology_generation(ctx: BuildContext) -> None:
             }
         )
 
+def get_stage_outputs(ctx: BuildContext, stage: str) -> List[Path]:
+    """
+    Get the output files of a pipeline stage, recorded in its checkpoint.
+    
+    Args:
+        ctx: Build context containing configuration and state
+        stage: Stage name
+        
+    Returns:
+        Paths to the output files
+    """
+    if stage == 'sequence':
+        return list(ctx.sequence_result) if ctx.sequence_result else []
+    if stage == 'topology':
+        topology_dir = Path(f"{ctx.config.output}_topology_files")
+        return [Path(f"{ctx.config.output}.top"), Path(f"{ctx.config.output}.gro"),
+                *sorted(topology_dir.glob('*.itp'))]
+    return [Path(ctx.config.output).with_suffix('.pdb')]
+
+async def run_stage(
+    ctx: BuildContext,
+    checkpoint: Checkpoint,
+    stage: str,
+    operation: Callable[[BuildContext], Awaitable[None]],
+    upstream: Optional[str]
+) -> str:
+    """
+    Run a pipeline stage, or restore its result from the checkpoint when resuming
+    and its inputs and outputs are unchanged.
+    
+    Args:
+        ctx: Build context containing configuration and state
+        checkpoint: Checkpoint manifest of the working directory
+        stage: Stage name
+        operation: Operation running the stage
+        upstream: Digest of the stage run before, None for the first stage
+        
+    Returns:
+        Digest of the stage
+    """
+    record = checkpoint.get_stage(stage, ctx.config, upstream)
+    if record is not None:
+        if stage == 'sequence':
+            msa, final_pdb = record['result']['msa'], record['result']['final_pdb']
+            ctx.sequence_result = (Path(msa), Path(final_pdb))
+            ctx.config.pdb_file = final_pdb
+        elif record.get('snapshot'):
+            ctx.system = checkpoint.load_system(record)
+        LOG.info(f"{Fore.BLUE}Resuming: {stage} unchanged since {record['completed']}, skipped.{Style.RESET_ALL}")
+        return record['digest']
+
+    await operation(ctx)
+
+    result = None
+    if stage == 'sequence':
+        result = {'msa': str(ctx.sequence_result[0]), 'final_pdb': str(ctx.sequence_result[1])}
+    return checkpoint.complete_stage(
+        stage, ctx.config, upstream,
+        outputs=get_stage_outputs(ctx, stage),
+        result=result,
+        system=ctx.system if stage in ('geometry', 'mix', 'replace') else None
+    )
+
 @timeit
 async def run_operations(ctx: BuildContext) -> None:
     """
@@ -478,12 +544,14 @@ async def run_operations(ctx: BuildContext) -> None:
         ColbuilderError: If any operation fails
         SystemError: If an unexpected error occurs
     """
+    checkpoint = Checkpoint(ctx.config.working_directory, resume=ctx.config.resume)
+    upstream = None
     try:
         # Sequence Generation
         if OperationMode.SEQUENCE in ctx.config.mode:
             LOG.section("Generating collagen triple helix...")
             LOG.subsection("Homology Modelling")
-            await run_sequence_generation(ctx)
+            upstream = await run_stage(ctx, checkpoint, 'sequence', run_sequence_generation, upstream)
             LOG.info(
                 f"{Fore.BLUE}Homology modelling completed.\n{Style.RESET_ALL}"
                 f"{Fore.BLUE}MSA: {ctx.sequence_result[0]}\n"
@@ -494,24 +562,24 @@ async def run_operations(ctx: BuildContext) -> None:
         if OperationMode.GEOMETRY in ctx.config.mode:
             LOG.section("Generating collagen fibril...")
             LOG.subsection("Geometry Generation")
-            await run_geometry_generation(ctx)
+            upstream = await run_stage(ctx, checkpoint, 'geometry', run_geometry_generation, upstream)
             LOG.info(f"{Fore.BLUE}Geometry generation completed.{Style.RESET_ALL}")
 
         # Mixing Operation (can now run independently)
         if OperationMode.MIX in ctx.config.mode:
             LOG.section("Mixing geometry...")
             LOG.subsection("Mixing Geometry")
-            await run_mix_geometry(ctx)
+            upstream = await run_stage(ctx, checkpoint, 'mix', run_mix_geometry, upstream)
             LOG.info(f"{Fore.BLUE}Mixing completed.{Style.RESET_ALL}")
 
         # Replacement Operation
         if OperationMode.REPLACE in ctx.config.mode:
             LOG.subsection("Replacing Geometry")
-            await run_replace_geometry(ctx)
+            upstream = await run_stage(ctx, checkpoint, 'replace', run_replace_geometry, upstream)
 
         if OperationMode.TOPOLOGY in ctx.config.mode:
             LOG.section("Generating topology...")
-            await run_topology_generation(ctx)
+            upstream = await run_stage(ctx, checkpoint, 'topology', run_topology_generation, upstream)
             LOG.info(f"{Fore.BLUE}Topology generation completed.{Style.RESET_ALL}")
 
     except ColbuilderError:
@@ -527,6 +595,8 @@ async def run_operations(ctx: BuildContext) -> None:
                 "traceback": traceback.format_exc()
             }
         )
+    finally:
+        await close_workers()
 
 def setup_configuration(kwargs: Dict[str, Any]) -> ColbuilderConfig:
     """
@@ -623,6 +693,24 @@ def log_configuration_summary(cfg: ColbuilderConfig) -> None:
               help='Optimize crystalcontacts')
 @click.option('-space', '--solution_space', nargs=3, type=float, default=[1,1,1],
               help='Solution space of optimisation problem [ d_x d_y d_z ]')
+@click.option('-cache', '--geometry_cache/--no_geometry_cache', default=True,
+              help='Reuse cached geometry of identical inputs (default: on)')
+@click.option('--native_caps/--pymol_caps', default=True,
+              help='Place terminal caps from ideal internal coordinates, or with PyMOL (default: native)')
+@click.option('--cache_dir', type=click.Path(file_okay=False, path_type=Path),
+              help='Cache directory (default: ~/.cache/colbuilder)')
+@click.option('--cache_size', type=float, default=1024,
+              help='Maximum size of the cache in MB')
+@click.option('-workers', '--n_workers', type=int,
+              help='Number of worker processes and concurrent external tools (default: all CPUs)')
+@click.option('--crosslink_replicas', type=click.IntRange(min=1), default=1,
+              help='Seeded Monte Carlo replicas per crosslink optimization, the best is kept')
+@click.option('--crosslink_exchange', type=click.IntRange(min=0), default=0,
+              help='Steps between temperature exchanges of the crosslink replicas (default: 0, independent replicas)')
+@click.option('--crosslink_batch', type=click.IntRange(min=1), default=1,
+              help='Crosslink Monte Carlo moves scored per step, the best is tried (default: 1)')
+@click.option('--resume', is_flag=True,
+              help='Skip stages and topology models unchanged since the last checkpoint')
 @click.option('-mix', '--mix_bool', is_flag=True,
               help='Generate a mixed crosslinked microfibril')
 @click.option('-ratio_mix', '--ratio_mix', nargs=2, type=(str, int), multiple=True,
@@ -668,6 +756,7 @@ def main(**kwargs: Any) -> None:
         LOG.section("Configuration Setup")
         config = setup_configuration(kwargs)
         log_configuration_summary(config)
+        set_max_processes(config.n_workers)
 
         ctx = BuildContext(config=config)
         asyncio.run(run_operations(ctx))
@@ -0,0 +1,148 @@
+# Copyright (c) 2024, Colbuilder Development Team
+# Distributed under the terms of the Apache License 2.0
+
+"""
+Native builder of acetyl (ACE) and N-methyl-amide (NME) caps.
+
+Cap atoms are placed from ideal internal coordinates (bond length, angle and dihedral)
+relative to the backbone atoms of the terminal residue, vectorized over all termini of
+all models. Reference atoms follow the GROMACS rtp convention: '+X' is atom X of the
+residue after an ACE cap, '-X' is atom X of the residue before an NME cap, plain names
+are cap atoms placed before. Atom names are those of PyMOL's attach_amino_acid.
+"""
+
+from __future__ import annotations
+import numpy as np
+from typing import Dict, List, Sequence, Tuple
+
+from colbuilder.core.utils import pdbio
+from colbuilder.core.utils.pdbio import ATOM_DTYPE
+
+# (name, element, (a, b, c), bond c-d, angle b-c-d, dihedral a-b-c-d)
+CAP_GEOMETRY: Dict[str, List[Tuple[str, str, Tuple[str, str, str], float, float, float]]] = {
+    'ace': [
+        ('C', 'C', ('+C', '+CA', '+N'), 1.335, 121.9, -75.0),
+        ('O', 'O', ('+CA', '+N', 'C'), 1.229, 122.7, 0.0),
+        ('CH3', 'C', ('+CA', '+N', 'C'), 1.522, 116.2, 180.0),
+        ('1HH3', 'H', ('+N', 'C', 'CH3'), 1.090, 109.5, 180.0),
+        ('2HH3', 'H', ('+N', 'C', 'CH3'), 1.090, 109.5, 60.0),
+        ('3HH3', 'H', ('+N', 'C', 'CH3'), 1.090, 109.5, -60.0),
+    ],
+    'nme': [
+        ('N', 'N', ('-O', '-CA', '-C'), 1.335, 116.2, 180.0),
+        ('H', 'H', ('-O', '-C', 'N'), 1.010, 119.8, 180.0),
+        ('CH3', 'C', ('-O', '-C', 'N'), 1.449, 121.9, 0.0),
+        ('1HH3', 'H', ('-C', 'N', 'CH3'), 1.090, 109.5, 180.0),
+        ('2HH3', 'H', ('-C', 'N', 'CH3'), 1.090, 109.5, 60.0),
+        ('3HH3', 'H', ('-C', 'N', 'CH3'), 1.090, 109.5, -60.0),
+    ],
+}
+
+CAP_RESNAMES: Dict[str, str] = {'ace': 'ACE', 'nme': 'NME'}
+
+def place_atoms(a: np.ndarray, b: np.ndarray, c: np.ndarray,
+                bond: float, angle: float, dihedral: float) -> np.ndarray:
+    """
+    Place atoms d from internal coordinates relative to atoms a, b, c (NeRF).
+
+    Args:
+        a (np.ndarray): Coordinates of atoms a with shape (N, 3).
+        b (np.ndarray): Coordinates of atoms b with shape (N, 3).
+        c (np.ndarray): Coordinates of atoms c with shape (N, 3).
+        bond (float): Bond length c-d in Angstrom.
+        angle (float): Angle b-c-d in degrees.
+        dihedral (float): Dihedral a-b-c-d in degrees.
+
+    Returns:
+        np.ndarray: Coordinates of atoms d with shape (N, 3).
+    """
+    angle, dihedral = np.radians(angle), np.radians(dihedral)
+    bc = c - b
+    bc /= np.linalg.norm(bc, axis=1, keepdims=True)
+    n = np.cross(b - a, bc)
+    n /= np.linalg.norm(n, axis=1, keepdims=True)
+    m = np.cross(n, bc)
+    d = np.array([-bond * np.cos(angle),
+                  bond * np.sin(angle) * np.cos(dihedral),
+                  bond * np.sin(angle) * np.sin(dihedral)])
+    return c + d[0] * bc + d[1] * m + d[2] * n
+
+def get_residue_atoms(atoms: np.ndarray, chain: str, resid: int, names: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Get indices of all atoms and of named atoms of a residue.
+
+    Args:
+        atoms (np.ndarray): Structured atoms of a model.
+        chain (str): Chain identifier.
+        resid (int): Residue number.
+        names (Sequence[str]): Atom names.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Indices of all atoms of the residue and of the named atoms in the order of names.
+
+    Raises:
+        ValueError: If an atom is missing.
+    """
+    residue = np.flatnonzero((atoms['chain'] == chain) & (np.char.strip(atoms['resid']) == str(resid)))
+    residue_names = list(np.char.strip(atoms['name'][residue]))
+    missing = [name for name in names if name not in residue_names]
+    if missing:
+        raise ValueError(f"Atoms {missing} missing in residue {resid} of chain {chain}")
+    return residue, residue[[residue_names.index(name) for name in names]]
+
+def build_caps(models: Sequence[np.ndarray], sites: Sequence[List[Tuple[str, int, str]]]) -> List[np.ndarray]:
+    """
+    Add caps to models, cap atoms of all termini of all models are placed at once.
+
+    Args:
+        models (Sequence[np.ndarray]): Structured atoms of each model.
+        sites (Sequence[List[Tuple[str, int, str]]]): Chain, residue number and cap ('ace' or 'nme')
+            of each terminus to cap, per model.
+
+    Returns:
+        List[np.ndarray]: Structured atoms of each capped model, serial numbers start at 1.
+    """
+    termini = {cap: [] for cap in CAP_GEOMETRY}
+    for index, (atoms, model_sites) in enumerate(zip(models, sites)):
+        for chain, resid, cap in model_sites:
+            termini[cap].append((index, chain, resid))
+
+    insertions = [[] for _ in models]
+    for cap, geometry in CAP_GEOMETRY.items():
+        if not termini[cap]:
+            continue
+        names = sorted({ref[1:] for *_, refs, _, _, _ in geometry for ref in refs if ref[0] in '+-'})
+        refs, positions = [], []
+        for index, chain, resid in termini[cap]:
+            atoms = models[index]
+            residue, named = get_residue_atoms(atoms, chain, resid, names)
+            refs.append(pdbio.get_coords(atoms[named]))
+            positions.append(residue.min() if cap == 'ace' else residue.max() + 1)
+        refs = np.stack(refs)
+
+        coords = {f"{'+' if cap == 'ace' else '-'}{name}": refs[:, i] for i, name in enumerate(names)}
+        for name, _, (a, b, c), bond, angle, dihedral in geometry:
+            coords[name] = place_atoms(coords[a], coords[b], coords[c], bond, angle, dihedral)
+
+        for k, (index, chain, resid) in enumerate(termini[cap]):
+            residue = np.zeros(len(geometry), dtype=ATOM_DTYPE)
+            residue['record'] = 'ATOM  '
+            residue['name'] = [f" {name:<3}" if len(name) < 4 else name for name, *_ in geometry]
+            residue['resname'] = CAP_RESNAMES[cap]
+            residue['chain'] = chain
+            residue['resid'] = str(resid - 1 if cap == 'ace' else resid + 1)
+            residue['tail'] = [f"{1.0:6.2f}{0.0:6.2f}{'':10}{element:>2}" for _, element, *_ in geometry]
+            pdbio.set_coords(residue, np.stack([coords[name][k] for name, *_ in geometry]))
+            insertions[index].append((positions[k], residue))
+
+    capped = []
+    for atoms, model_insertions in zip(models, insertions):
+        model = atoms.copy()
+        if model_insertions:
+            # An NME cap ending a chain goes before the ACE cap starting the next chain
+            model_insertions.sort(key=lambda insertion: (insertion[0], insertion[1]['resname'][0] == 'ACE'))
+            positions = np.concatenate([np.full(len(residue), position) for position, residue in model_insertions])
+            model = np.insert(model, positions, np.concatenate([residue for _, residue in model_insertions]))
+        model['serial'] = np.arange(1, len(model) + 1).astype(str)
+        capped.append(model)
+    return capped
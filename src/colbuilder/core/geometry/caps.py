@@ -1,11 +1,51 @@
 # Copyright (c) 2024, Colbuilder Development Team
 # Distributed under the terms of the Apache License 2.0
 
-from pymol import cmd, editor
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
 import subprocess
-from typing import List, Dict, Any, Optional
+import numpy as np
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple, Union
 import os
 
+from colbuilder.core.geometry.cap_builder import build_caps
+from colbuilder.core.geometry.store import CoordinateStore
+from colbuilder.core.utils import pdbio
+
+def cap_model(name: str, pdb: Optional[str] = None, pdb_file: Optional[str] = None,
+              selections: Optional[List[Tuple[str, str]]] = None, scratch: Optional[str] = None) -> Optional[str]:
+    """
+    Attaches caps to a single triple helix in the PyMOL instance of the current process.
+    Runs in worker processes of Caps, each worker owns its PyMOL instance.
+
+    Args:
+        name (str): Name of the PyMOL object, unique per task.
+        pdb (Optional[str]): Content of the PDB file, used instead of pdb_file.
+        pdb_file (Optional[str]): Path to the PDB file.
+        selections (Optional[List[Tuple[str, str]]]): Selection of the terminal atom and cap residue ('ace' or 'nme').
+        scratch (Optional[str]): Path to save the capped model to, unique per task.
+
+    Returns:
+        Optional[str]: Content of the capped PDB file, None if saved to scratch.
+    """
+    from pymol import cmd, editor
+
+    if pdb is not None:
+        cmd.read_pdbstr(pdb, name)
+    else:
+        cmd.load(pdb_file, name)
+    for selection, cap in selections or []:
+        cmd.edit(f"{name} and {selection}")
+        editor.attach_amino_acid('pk1', cap, ss=0)
+    capped = None
+    if scratch is not None:
+        cmd.save(scratch, name)
+    else:
+        capped = cmd.get_pdbstr(name)
+    cmd.delete(name=name)
+    return capped
+
 class Caps:
     """
     Adding Caps to a single triple helix.
@@ -25,9 +65,15 @@ class Caps:
         is_line (tuple): Tuple of valid line types in PDB file.
         chain_length (Dict[str, int]): Dictionary to store chain lengths.
         model (Dict[str, List[int]]): Dictionary to store residue numbers for each chain.
+        store (Optional[CoordinateStore]): Coordinate store of the system, models found there are capped in memory.
+        template_caps (Dict[str, Tuple[np.ndarray, Dict[str, Tuple[int, int]]]]): Capped atoms and
+            terminal residues of each chain for each template capped so far.
+        n_workers (Optional[int]): Number of worker processes for capping models one by one with PyMOL.
+            If None, uses all CPUs; 1 caps in the current process.
+        native (bool): Place caps from ideal internal coordinates (cap_builder) instead of with PyMOL.
     """
 
-    def __init__(self, system: Any):
+    def __init__(self, system: Any, n_workers: Optional[int] = None, native: bool = True):
         self.system = system
         self.system_size = system.size
         self.chains: List[str] = ['A', 'B', 'C']
@@ -35,6 +81,10 @@ class Caps:
         self.is_line: tuple = ('ATOM  ', 'HETATM', 'ANISOU', 'TER   ')
         self.chain_length: Dict[str, int] = {k: 0 for k in self.chains}
         self.model: Dict[str, List[int]] = {k: [] for k in self.chains}
+        self.store: Optional[CoordinateStore] = getattr(system, 'store', None)
+        self.template_caps: Dict[str, Tuple[np.ndarray, Dict[str, Tuple[int, int]]]] = {}
+        self.n_workers: int = n_workers or os.cpu_count() or 1
+        self.native: bool = native
         self.get_chain_length(system=system)
 
     def read_residues(self, pdb_id: int) -> None:
@@ -49,17 +99,42 @@ class Caps:
             FileNotFoundError: If the PDB file is not found.
         """
         self.model = {k: [] for k in self.chains}
+        self.set_residues(atoms=self.get_atoms(pdb_id=pdb_id))
+
+    def get_atoms(self, pdb_id: int) -> np.ndarray:
+        """
+        Gets atoms of a single triple helix from the coordinate store or its PDB file.
+
+        Args:
+            pdb_id (int): PDB file identifier for single triple helix.
+
+        Returns:
+            np.ndarray: Structured atoms of the triple helix.
+
+        Raises:
+            FileNotFoundError: If the PDB file is not found.
+        """
+        if self.store is not None and str(pdb_id) in self.store:
+            return self.store.view_model(str(pdb_id))
+
         pdb_file = f"{pdb_id}.pdb"
         
         if not os.path.exists(pdb_file):
             raise FileNotFoundError(f"PDB file not found: {pdb_file}")
         
-        with open(pdb_file, 'r') as f:
-            for line in f:
-                if line[0:6] in self.is_line and line[13:15] == 'CA':
-                    chain = line[21]
-                    if chain in self.chains:
-                        self.model[chain].append(int(line[22:26]))
+        return pdbio.read_atoms(pdb_file)
+
+    def set_residues(self, atoms: np.ndarray) -> None:
+        """
+        Collects residue numbers of the CA atoms of each chain.
+
+        Args:
+            atoms (np.ndarray): Structured atoms of a single triple helix.
+        """
+        ca = np.char.strip(atoms['name']) == 'CA'
+        for chain, resid in zip(atoms['chain'][ca], atoms['resid'][ca]):
+            if chain in self.chains:
+                self.model[chain].append(int(resid))
 
     def get_line(self, cap: str, chain_id: str) -> str:
         """
@@ -107,23 +182,303 @@ class Caps:
             FileNotFoundError: If the PDB file is not found.
         """
         pdb_file = f"{pdb_id}.pdb"
-        if not os.path.exists(pdb_file):
+        in_store = self.store is not None and str(pdb_id) in self.store
+        if not in_store and not os.path.exists(pdb_file):
             raise FileNotFoundError(f"PDB file not found: {pdb_file}")
 
         output_dir = crosslink_type if crosslink_type else "NC"
 
-        cmd.load(pdb_file)
+        if self.native:
+            capped = build_caps(models=[self.get_atoms(pdb_id=pdb_id)], sites=[self.get_sites()])[0]
+            return self.set_caps(atoms=capped, pdb_id=pdb_id, output_dir=output_dir)
+
+        capped = cap_model(**self.get_task(pdb_id=pdb_id))
+        return self.save_caps(pdb_id=pdb_id, capped=capped, output_dir=output_dir)
+
+    def get_task(self, pdb_id: int) -> Dict[str, Any]:
+        """
+        Gets arguments of cap_model for a model, its residues have to be read before.
+        Models of the coordinate store are passed as PDB content, others are saved to a scratch file per model.
+
+        Args:
+            pdb_id (int): PDB identifier.
+
+        Returns:
+            Dict[str, Any]: Keyword arguments of cap_model.
+        """
+        task = {'name': f"model_{pdb_id}", 'selections': self.get_selections()}
+        if self.store is not None and str(pdb_id) in self.store:
+            task['pdb'] = ''.join(self.store.format_atoms(self.store.view_model(str(pdb_id))))
+        else:
+            task['pdb_file'] = f"{pdb_id}.pdb"
+            task['scratch'] = f"tmp_{pdb_id}.pdb"
+        return task
+
+    def save_caps(self, pdb_id: int, capped: Optional[str], output_dir: str) -> str:
+        """
+        Saves the result of cap_model to the coordinate store or the caps file.
+
+        Args:
+            pdb_id (int): PDB identifier.
+            capped (Optional[str]): Content of the capped PDB file, None if saved to its scratch file.
+            output_dir (str): Directory of the output file.
+
+        Returns:
+            str: Path to the new PDB file with caps.
+        """
+        if capped is not None:
+            atoms = self.store.read_atoms(capped.splitlines(True))
+            return self.set_caps(atoms=atoms, pdb_id=pdb_id, output_dir=output_dir)
+        return self.write_caps(pdb=f"tmp_{pdb_id}.pdb", pdb_id=pdb_id, output_dir=output_dir)
+
+    def add_caps_native(self, pdb_ids: List[int], crosslink_type: Optional[str] = None) -> List[str]:
+        """
+        Adds caps to models one by one, cap atoms of all models are placed in one pass.
+
+        Args:
+            pdb_ids (List[int]): PDB identifiers.
+            crosslink_type (Optional[str]): Type of crosslink. Uses 'NC' for non-crosslinked structures.
+
+        Returns:
+            List[str]: Paths to the new PDB files with caps, in the order of pdb_ids.
+
+        Raises:
+            FileNotFoundError: If a PDB file is not found.
+        """
+        output_dir = crosslink_type if crosslink_type else "NC"
+        models, sites = [], []
+        for pdb_id in pdb_ids:
+            models.append(self.get_atoms(pdb_id=pdb_id))
+            self.model = {k: [] for k in self.chains}
+            self.set_residues(atoms=models[-1])
+            sites.append(self.get_sites())
+
+        capped = build_caps(models=models, sites=sites)
+        return [self.set_caps(atoms=atoms, pdb_id=pdb_id, output_dir=output_dir)
+                for pdb_id, atoms in zip(pdb_ids, capped)]
+
+    def add_caps_parallel(self, pdb_ids: List[int], crosslink_type: Optional[str] = None) -> List[str]:
+        """
+        Adds caps to models one by one, spread over worker processes with a PyMOL instance each.
+
+        Args:
+            pdb_ids (List[int]): PDB identifiers.
+            crosslink_type (Optional[str]): Type of crosslink. Uses 'NC' for non-crosslinked structures.
+
+        Returns:
+            List[str]: Paths to the new PDB files with caps, in the order of pdb_ids.
+
+        Raises:
+            FileNotFoundError: If a PDB file is not found.
+        """
+        n_workers = min(self.n_workers, len(pdb_ids))
+        if n_workers <= 1:
+            caps_files = []
+            for pdb_id in pdb_ids:
+                self.read_residues(pdb_id=pdb_id)
+                caps_files.append(self.add_caps(pdb_id=pdb_id, crosslink_type=crosslink_type))
+            return caps_files
+
+        output_dir = crosslink_type if crosslink_type else "NC"
+        tasks = []
+        for pdb_id in pdb_ids:
+            self.read_residues(pdb_id=pdb_id)
+            tasks.append(self.get_task(pdb_id=pdb_id))
+
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=n_workers, mp_context=context) as executor:
+            futures = [executor.submit(cap_model, **task) for task in tasks]
+            return [self.save_caps(pdb_id=pdb_id, capped=future.result(), output_dir=output_dir)
+                    for pdb_id, future in zip(pdb_ids, futures)]
+
+    def get_sites(self) -> List[Tuple[str, int, str]]:
+        """
+        Gets the termini of the residues read last that need a cap,
+        i.e. all termini that are not the terminus of the full chain.
+
+        Returns:
+            List[Tuple[str, int, str]]: Chain, residue number and cap residue ('ace' or 'nme') of each terminus.
+        """
+        sites = []
         for cap in self.caps:
             for chain in self.chains:
                 line_cap = self.get_line(cap=cap, chain_id=chain)
                 resi = int(line_cap.split(' ')[1])
                 if (cap == 'N' and resi != 1) or (cap == 'C' and resi != int(self.chain_length[chain])):
-                    cmd.edit(line_cap)
-                    editor.attach_amino_acid('pk1', 'ace' if cap == 'N' else 'nme', ss=0)
+                    sites.append((chain, resi, 'ace' if cap == 'N' else 'nme'))
+        return sites
+
+    def get_selections(self) -> List[Tuple[str, str]]:
+        """
+        Gets PyMOL selections of the termini of the residues read last that need a cap.
+
+        Returns:
+            List[Tuple[str, str]]: Selection of the terminal atom and cap residue ('ace' or 'nme').
+        """
+        return [(self.get_line(cap='N' if cap == 'ace' else 'C', chain_id=chain), cap)
+                for chain, _, cap in self.get_sites()]
+
+    def get_termini(self) -> Dict[str, Tuple[int, int]]:
+        """
+        Gets first and last residue of each chain of the residues read last.
+
+        Returns:
+            Dict[str, Tuple[int, int]]: Terminal residue numbers of each chain.
+        """
+        return {chain: (resids[0], resids[-1]) for chain, resids in self.model.items() if resids}
+
+    def get_template_caps(self, template: Union[str, Path]) -> Tuple[np.ndarray, Dict[str, Tuple[int, int]]]:
+        """
+        Caps the triple helix template once, models sharing its termini are translations of it.
+
+        Args:
+            template (Union[str, Path]): Path to the PDB file of the template.
+
+        Returns:
+            Tuple[np.ndarray, Dict[str, Tuple[int, int]]]: Structured atoms of the capped template
+            and its terminal residues of each chain.
+        """
+        key = str(template)
+        if key not in self.template_caps:
+            atoms = pdbio.read_atoms(Path(template).with_suffix('.pdb'))
+            self.model = {k: [] for k in self.chains}
+            self.set_residues(atoms=atoms)
+            if self.native:
+                capped = build_caps(models=[atoms], sites=[self.get_sites()])[0]
+            else:
+                capped = cap_model(name='capped_template', pdb=''.join(pdbio.format_atoms(atoms)),
+                                   selections=self.get_selections())
+                capped = pdbio.parse_atoms(capped)
+            capped = self.set_ter(atoms=capped)
+            self.template_caps[key] = (capped, self.get_termini())
+        return self.template_caps[key]
+
+    def get_translation(self, pdb_id: int) -> np.ndarray:
+        """
+        Gets the translation of a model relative to the template.
+
+        Args:
+            pdb_id (int): PDB identifier.
+
+        Returns:
+            np.ndarray: Translation [x, y, z].
+        """
+        if self.store is not None and str(pdb_id) in self.store.instances:
+            return self.store.get_transforms(keys=[pdb_id])[0]
+        return np.asarray(self.system.get_model(model_id=float(pdb_id)).transformation, dtype=float)
+
+    def translate_caps(self, pdb_id: int, template: Union[str, Path], output_dir: str) -> Optional[str]:
+        """
+        Caps a model by translating the capped template, cropped to the residues of the model.
+        Only models with the terminal residues of the template are capped this way.
+
+        Args:
+            pdb_id (int): PDB identifier, its residues have to be read before.
+            template (Union[str, Path]): Path to the PDB file of the template.
+            output_dir (str): Directory of the output file.
+
+        Returns:
+            Optional[str]: Path to the new PDB file with caps, None if the termini of the model
+            differ from the template.
+        """
+        capped, termini = self.get_template_caps(template=template)
+        self.read_residues(pdb_id=pdb_id)
+        if self.get_termini() != termini:
+            return None
+        
+        residues = [f"{chain}{resid}" for chain, resids in self.model.items() for resid in resids]
+        keep = np.isin(np.char.add(capped['chain'], np.char.strip(capped['resid'])), residues)
+        keep |= np.isin(np.char.strip(capped['resname']), ['ACE', 'NME'])
+        atoms = None if keep.all() else np.flatnonzero(keep)
+        translation = self.get_translation(pdb_id=pdb_id)
+        output_file = f"{output_dir}/{pdb_id}.caps.pdb"
+
+        if self.store is not None and str(pdb_id) in self.store:
+            template_key = f"{output_dir}/{Path(template).stem}.caps"
+            if template_key not in self.store.templates:
+                self.store.set_template(template_key, capped, chain_ter=False)
+            self.store.set_instance(f"{output_dir}/{pdb_id}.caps", template=template_key,
+                                    translate=translation, atoms=atoms)
+            self.store.delete_model(str(pdb_id))
+            return output_file
+
+        model = capped.copy() if atoms is None else capped[atoms]
+        pdbio.set_coords(model, pdbio.get_coords(model) + translation)
+        os.makedirs(output_dir, exist_ok=True)
+        pdbio.write_atoms(output_file, model, end=False)
+        os.remove(f"{pdb_id}.pdb")
+        return output_file
+
+    def cap_models(self, pdb_ids: List[int], crosslink_type: Optional[str] = None,
+                   template: Optional[Union[str, Path]] = None) -> List[str]:
+        """
+        Adds caps to all models. The template is capped once and translated to each model
+        sharing its termini; models whose termini were cut by the fibril length are capped one by one,
+        in parallel worker processes.
+
+        Args:
+            pdb_ids (List[int]): PDB identifiers.
+            crosslink_type (Optional[str]): Type of crosslink. Uses 'NC' for non-crosslinked structures.
+            template (Optional[Union[str, Path]]): Path to the PDB file of the template.
+                If None, uses the PDB file of the crystal.
+
+        Returns:
+            List[str]: Paths to the new PDB files with caps.
+        """
+        output_dir = crosslink_type if crosslink_type else "NC"
+        template = template or self.system.crystal.pdb_file
+        caps_files, cut = [], []
+        for pdb_id in pdb_ids:
+            caps_file = self.translate_caps(pdb_id=pdb_id, template=template, output_dir=output_dir)
+            if caps_file is None:
+                cut.append(pdb_id)
+            else:
+                caps_files.append(caps_file)
+
+        if self.native:
+            caps_files.extend(self.add_caps_native(pdb_ids=cut, crosslink_type=crosslink_type))
+        else:
+            caps_files.extend(self.add_caps_parallel(pdb_ids=cut, crosslink_type=crosslink_type))
+        return caps_files
+
+    def set_ter(self, atoms: np.ndarray) -> np.ndarray:
+        """
+        Writes HETATM records of caps as ATOM and flags TER after each chain end.
+
+        Args:
+            atoms (np.ndarray): Structured atoms of a capped model.
+
+        Returns:
+            np.ndarray: The updated atoms.
+        """
+        atoms['record'][atoms['record'] == 'HETATM'] = 'ATOM  '
+        resname, name = np.char.strip(atoms['resname']), np.char.strip(atoms['name'])
+        atoms['ter'] = ((resname == 'NME') & (atoms['name'] == '3HH3')) | ((resname == 'ALA') & (name == 'OXT'))
+        return atoms
+
+    def set_caps(self, atoms: np.ndarray, pdb_id: int, output_dir: str) -> str:
+        """
+        Keep model with caps in the coordinate store, in-memory counterpart of write_caps.
+        Models not kept in the store are written to their caps file right away.
         
-        cmd.save('tmp.pdb')
-        cmd.delete(name=str(pdb_id))
-        return self.write_caps(pdb='tmp.pdb', pdb_id=pdb_id, output_dir=output_dir)
+        Args:
+            atoms (np.ndarray): Structured atoms of the capped model.
+            pdb_id (int): PDB identifier.
+            output_dir (str): Directory of the output file once written to disk.
+
+        Returns:
+            str: Path of the PDB file with caps, written on flush of the store.
+        """
+        output_file = f"{output_dir}/{pdb_id}.caps.pdb"
+        if self.store is None or str(pdb_id) not in self.store:
+            os.makedirs(output_dir, exist_ok=True)
+            pdbio.write_atoms(output_file, self.set_ter(atoms=atoms), end=False)
+            os.remove(f"{pdb_id}.pdb")
+            return output_file
+
+        self.store.set_model(f"{output_dir}/{pdb_id}.caps", self.set_ter(atoms=atoms))
+        self.store.delete_model(str(pdb_id))
+        return output_file
 
     def write_caps(self, pdb: str, pdb_id: int, output_dir: str) -> str:
         """
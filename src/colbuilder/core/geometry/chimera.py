@@ -1,14 +1,225 @@
 # Copyright (c) 2024, Colbuilder Development Team
 # Distributed under the terms of the Apache License 2.0
 
-import subprocess
+import asyncio
+import json
 import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
 
 from colbuilder.core.utils.logger import setup_logger
 from colbuilder.core.utils.config import ColbuilderConfig
+from colbuilder.core.utils.runner import RunResult, run_command
 
 LOG = setup_logger(__name__)
 
+WORKER_PREFIX = "COLBUILDER_WORKER "
+
+class ChimeraWorker(object):
+    """
+    Long-lived Chimera process running chimera_scripts/worker.py, reused for all Chimera calls of a run.
+
+    Requests are sent as JSON lines to stdin of the worker and answered one at a time,
+    see chimera_scripts/worker.py for the protocol.
+
+    Attributes:
+        chimera_dir (Path): Directory of the Chimera scripts.
+        command (List[str]): Command starting the worker, Chimera by default. The protocol can be
+            tested without Chimera by [sys.executable, 'worker.py', '--fake'].
+        process (Optional[asyncio.subprocess.Process]): Running worker process.
+        n_requests (int): Number of requests answered so far.
+    """
+    def __init__(self, chimera_dir: Union[str, Path], command: Optional[Sequence[str]] = None):
+        self.chimera_dir = Path(chimera_dir)
+        script = self.chimera_dir / 'worker.py'
+        self.command: List[str] = list(command) if command else ['chimera', '--nogui', '--silent', '--script', str(script)]
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.n_requests: int = 0
+        self._lock: Optional[asyncio.Lock] = None
+        self._stderr: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        """Whether the worker process is running."""
+        return self.process is not None and self.process.returncode is None
+
+    async def start(self, timeout: Optional[float] = 120) -> None:
+        """
+        Start the worker process and wait until it is ready.
+
+        Args:
+            timeout (Optional[float]): Seconds to wait for the worker to be ready.
+
+        Raises:
+            OSError: If the worker cannot be started.
+            RuntimeError: If the worker exits before it is ready.
+        """
+        self.process = await asyncio.create_subprocess_exec(
+            *self.command,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        self._stderr = asyncio.ensure_future(self._log_stderr())
+        await asyncio.wait_for(self._read_response(), timeout=timeout)
+        LOG.debug(f"Chimera worker started: {' '.join(self.command)}")
+
+    async def ensure_started(self) -> None:
+        """
+        Start the worker unless it is running.
+
+        Raises:
+            OSError: If the worker cannot be started.
+            RuntimeError: If the worker exits before it is ready.
+        """
+        async with self.lock:
+            if not self.running:
+                await self.start()
+
+    @property
+    def lock(self) -> asyncio.Lock:
+        """Lock serializing requests, the worker answers one request at a time."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def _log_stderr(self) -> None:
+        """Stream output of the scripts to the debug log."""
+        async for line in self.process.stderr:
+            LOG.debug(f"chimera worker: {line.decode(errors='replace').rstrip()}")
+
+    async def _read_response(self) -> Dict:
+        """
+        Read the next response of the worker, other output is logged.
+
+        Returns:
+            Dict: The response.
+
+        Raises:
+            RuntimeError: If the worker exits.
+        """
+        while True:
+            line = await self.process.stdout.readline()
+            if not line:
+                raise RuntimeError(f"Chimera worker exited with code {await self.process.wait()}")
+            line = line.decode(errors='replace')
+            if line.startswith(WORKER_PREFIX):
+                return json.loads(line[len(WORKER_PREFIX):])
+            LOG.debug(f"chimera worker: {line.rstrip()}")
+
+    async def request(self, script: str, env: Optional[Dict[str, str]] = None,
+                      args: Optional[Sequence[str]] = None, timeout: Optional[float] = None) -> RunResult:
+        """
+        Run a script of the Chimera scripts directory in the worker, starting the worker if needed.
+
+        Args:
+            script (str): Name of the script, e.g. 'swapaa.py'.
+            env (Optional[Dict[str, str]]): Environment variables read by the script.
+            args (Optional[Sequence[str]]): Arguments of the script.
+            timeout (Optional[float]): Seconds to wait for the response, the worker is stopped on timeout.
+
+        Returns:
+            RunResult: Return code 0 if the script succeeded, 1 with the error as stderr otherwise.
+        """
+        async with self.lock:
+            if not self.running:
+                await self.start()
+            self.n_requests += 1
+            message = {'id': self.n_requests, 'script': script, 'env': env or {},
+                       'args': [str(arg) for arg in args or []], 'cwd': os.getcwd()}
+            start = time.perf_counter()
+            self.process.stdin.write((json.dumps(message) + '\n').encode())
+            await self.process.stdin.drain()
+            try:
+                response = await asyncio.wait_for(self._read_response(), timeout=timeout)
+            except asyncio.TimeoutError:
+                await self.close(timeout=0)
+                response = {'ok': False, 'error': f"Chimera worker timed out after {timeout} s"}
+
+        LOG.debug(f"Chimera worker ran {script} in {time.perf_counter() - start:.2f} s")
+        return RunResult(
+            command=self.command + [script, *message['args']],
+            returncode=0 if response.get('ok') else 1,
+            stderr=response.get('error') or '',
+            wall_time=time.perf_counter() - start
+        )
+
+    async def close(self, timeout: float = 10) -> None:
+        """
+        Stop the worker process, it is killed if it does not stop within the timeout.
+
+        Args:
+            timeout (float): Seconds to wait for the worker to stop.
+        """
+        if not self.running:
+            return
+        try:
+            if timeout <= 0:
+                raise asyncio.TimeoutError
+            self.process.stdin.write((json.dumps({'script': None}) + '\n').encode())
+            await self.process.stdin.drain()
+            self.process.stdin.close()
+            await asyncio.wait_for(self.process.wait(), timeout=timeout)
+        except (asyncio.TimeoutError, BrokenPipeError, ConnectionResetError):
+            self.process.kill()
+            await self.process.wait()
+        if self._stderr is not None:
+            await self._stderr
+        LOG.debug(f"Chimera worker stopped after {self.n_requests} requests")
+
+_WORKERS: Dict[str, ChimeraWorker] = {}
+
+def get_worker(chimera_dir: Union[str, Path]) -> ChimeraWorker:
+    """
+    Get the shared Chimera worker of a scripts directory, it is started with its first request.
+
+    Args:
+        chimera_dir (Union[str, Path]): Directory of the Chimera scripts.
+
+    Returns:
+        ChimeraWorker: The shared worker.
+    """
+    key = str(Path(chimera_dir).resolve())
+    if key not in _WORKERS:
+        _WORKERS[key] = ChimeraWorker(chimera_dir)
+    return _WORKERS[key]
+
+async def close_workers() -> None:
+    """Stop all shared Chimera workers."""
+    for worker in _WORKERS.values():
+        await worker.close()
+    _WORKERS.clear()
+
+async def run_chimera_script(chimera_dir: Union[str, Path], script: str, env: Optional[Dict[str, str]] = None,
+                             args: Optional[Sequence[str]] = None, persistent: bool = True) -> RunResult:
+    """
+    Run a Chimera script, in the shared worker if persistent, otherwise in a new Chimera process.
+    Chimera is started per call as well if the worker cannot be started.
+
+    Args:
+        chimera_dir (Union[str, Path]): Directory of the Chimera scripts.
+        script (str): Name of the script, e.g. 'matrixget.py'.
+        env (Optional[Dict[str, str]]): Environment variables read by the script.
+        args (Optional[Sequence[str]]): Arguments of the script.
+        persistent (bool): Use the shared worker.
+
+    Returns:
+        RunResult: Result of the script.
+    """
+    if persistent:
+        worker = get_worker(chimera_dir)
+        try:
+            await worker.ensure_started()
+        except (OSError, RuntimeError, asyncio.TimeoutError) as e:
+            LOG.warning(f"Chimera worker not available, starting Chimera per call: {e}")
+        else:
+            return await worker.request(script, env=env, args=args)
+
+    script_path = os.path.join(str(chimera_dir), script)
+    script_arg = ' '.join([script_path, *[str(arg) for arg in args or []]])
+    return await run_command(['chimera', '--nogui', '--silent', '--script', script_arg], env=env, check=False)
+
 class Chimera(object):
     """
     Generate collagen microfibril with the "crystal contacts" command from UCSF Chimera.
@@ -20,6 +231,7 @@ class Chimera(object):
 
     Attributes:
         pdb_file (str): Path to the PDB file.
+        persistent (bool): Run the scripts in the shared Chimera worker instead of a Chimera process per call.
 
     Methods:
         matrixget: Gets transformation matrices based on crystal contacts.
@@ -36,8 +248,9 @@ class Chimera(object):
         """
         self.chimera_dir = config.CHIMERA_SCRIPTS_DIR
         self.pdb_file = pdb
+        self.persistent = getattr(config, 'chimera_worker', True)
 
-    def matrixget(self, pdb=None, contact_distance=0, crystalcontacts=""):
+    async def matrixget(self, pdb=None, contact_distance=0, crystalcontacts=""):
         """
         Call Chimera via Python 2.7 script from terminal to get transformation matrices.
 
@@ -47,62 +260,46 @@ class Chimera(object):
             crystalcontacts (str): Output file name for crystal contacts.
 
         Returns:
-            subprocess.CompletedProcess: Result of the subprocess run.
+            RunResult: Result of the Chimera run.
         """
         
         if pdb is None:
             pdb = self.pdb_file
         
         pdb_full_path = os.path.abspath(pdb)
-        script_path = os.path.join(self.chimera_dir, 'matrixget.py')
         
-        env = os.environ.copy()
-        env['PDB_FILE'] = pdb_full_path
-        env['CONTACT_DISTANCE'] = str(contact_distance)
-        env['CRYSTALCONTACTS_FILE'] = crystalcontacts
-
-        chimera_command = [
-            'chimera', '--nogui', '--silent',
-            '--script', script_path
-        ]
-        
-        result = subprocess.run(' '.join(chimera_command), shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
-        
-        LOG.debug("Chimera stdout: %s", result.stdout.decode())
-        LOG.debug("Chimera stderr: %s", result.stderr.decode())
+        env = {
+            'PDB_FILE': pdb_full_path,
+            'CONTACT_DISTANCE': str(contact_distance),
+            'CRYSTALCONTACTS_FILE': crystalcontacts
+        }
+
+        result = await run_chimera_script(self.chimera_dir, 'matrixget.py', env=env, persistent=self.persistent)
         
         if result.returncode != 0:
-            raise RuntimeError(f"Chimera command failed: {result.stderr.decode()}")
+            raise RuntimeError(f"Chimera command failed: {result.stderr}")
 
         return result
 
-    def matrixset(self, pdb=None, crystalcontacts="", system_size=0, fibril_length=0.0):
+    async def matrixset(self, pdb=None, crystalcontacts="", system_size=0, fibril_length=0.0):
         if pdb is None:
             pdb = self.pdb_file
         
         pdb_full_path = os.path.abspath(pdb)
-        script_path = os.path.join(self.chimera_dir, 'matrixset.py')
-
-        env = os.environ.copy()
-        env['PDB_FILE'] = pdb_full_path
-        env['CRYSTALCONTACTS_FILE'] = crystalcontacts
-        env['SYSTEM_SIZE'] = str(system_size)
-        env['FIBRIL_LENGTH'] = str(fibril_length)
-
-        chimera_command = [
-            'chimera', '--nogui', '--silent',
-            '--script', script_path
-        ]
-        
-        LOG.debug(f"Running command: {' '.join(chimera_command)}")
-        
-        result = subprocess.run(' '.join(chimera_command), shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+
+        env = {
+            'PDB_FILE': pdb_full_path,
+            'CRYSTALCONTACTS_FILE': crystalcontacts,
+            'SYSTEM_SIZE': str(system_size),
+            'FIBRIL_LENGTH': str(fibril_length)
+        }
+
+        LOG.debug(f"Running Chimera script matrixset.py for {pdb_full_path}")
         
-        LOG.debug("Chimera stdout: %s", result.stdout.decode())
-        LOG.debug("Chimera stderr: %s", result.stderr.decode())
+        result = await run_chimera_script(self.chimera_dir, 'matrixset.py', env=env, persistent=self.persistent)
         
         if result.returncode != 0:
-            raise RuntimeError(f"Chimera command failed: {result.stderr.decode()}")
+            raise RuntimeError(f"Chimera command failed: {result.stderr}")
 
         expected_file = f"{crystalcontacts}_id.txt"
         if os.path.exists(expected_file):
@@ -115,7 +312,7 @@ class Chimera(object):
 
         return result
 
-    def swapaa(self, replace: str, system_type: str) -> subprocess.CompletedProcess:
+    async def swapaa(self, replace: str, system_type: str) -> RunResult:
             """
             Call Chimera via Python 2.7 script from terminal to swap amino acids.
 
@@ -124,11 +321,10 @@ class Chimera(object):
                 system_type (str): Type of the system.
 
             Returns:
-                subprocess.CompletedProcess: Result of the subprocess run.
+                RunResult: Result of the Chimera run.
             """
-            swapaa_script = os.path.join(self.directory, 'swapaa.py')
-            cmd = f"chimera --nogui --silent --script \"{swapaa_script} {replace} {system_type}\""
-            LOG.debug(f"Running Chimera command: {cmd}")
-            result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
+            LOG.debug(f"Running Chimera script swapaa.py {replace} {system_type}")
+            result = await run_chimera_script(self.chimera_dir, 'swapaa.py', args=[replace, system_type],
+                                              persistent=self.persistent)
             LOG.debug(f"Chimera command completed with return code: {result.returncode}")
-            return result
\ No newline at end of file
+            return result
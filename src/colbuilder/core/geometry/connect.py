@@ -6,6 +6,7 @@ import numpy as np
 from itertools import product
 from typing import Dict, List, Optional, Any, Union, Set, Tuple
 from pathlib import Path
+from scipy.spatial import cKDTree
 
 from colbuilder.core.geometry import model
 from colbuilder.core.utils.logger import setup_logger
@@ -23,6 +24,8 @@ class Connect:
         connect_file (Optional[Path]): Path to the connection file.
         external_connect (List[float]): List of external connections.
         is_line (Tuple[str, ...]): Tuple of valid line types in PDB files.
+        stencil (Optional[Set[Tuple[int, int, int]]]): Relative unit-cell shifts between connected models,
+            used by get_model_connect and the crystal contacts optimizer.
     """
 
     def __init__(self, system: Optional[Any] = None, connect_file: Optional[Path] = None):
@@ -32,6 +35,62 @@ class Connect:
         self.connect_file = Path(connect_file) if connect_file else None
         self.external_connect: List[float] = []
         self.is_line: Tuple[str, ...] = ('ATOM  ', 'HETATM', 'ANISOU', 'TER   ')
+        self.stencil: Optional[Set[Tuple[int, int, int]]] = None
+
+    def get_stencil(self, system: Any, cut_off: float = 3.0) -> Set[Tuple[int, int, int]]:
+        """
+        Get connectivity stencil of the crystal lattice: all relative unit-cell shifts between
+        the template and its copy for which a pair of crosslinks is closer than cut_off.
+
+        All models are translations of the same template, hence two models are connected if and
+        only if the difference of their unit-cell shifts is part of the stencil.
+
+        Args:
+            system (Any): The system object.
+            cut_off (float): Distance cut-off in Angstroms.
+
+        Returns:
+            Set[Tuple[int, int, int]]: Set of relative unit-cell shifts (ref_model - model).
+        """
+        if self.stencil is not None:
+            return self.stencil
+
+        position = system.crystal.get_crosslink_template().position
+        cs_matrix = system.crystal.get_cs_matrix()
+        diff = (position[:, None, :] - position[None, :, :]).reshape(-1, 3)
+        if not diff.size:
+            self.stencil = set()
+            return self.stencil
+
+        reach = np.abs(diff).max(axis=0) + cut_off
+        corners = np.array(list(product(*zip(-reach, reach))))
+        bounds = np.ceil(np.abs(np.linalg.solve(cs_matrix, corners.T)).max(axis=1)).astype(int)
+        shifts = np.array(list(product(*(range(-b, b + 1) for b in bounds))))
+
+        distance = np.linalg.norm(diff[None, :, :] + (shifts @ cs_matrix.T)[:, None, :], axis=2)
+        self.stencil = {tuple(int(i) for i in shift) for shift in shifts[(distance < cut_off).any(axis=1)]}
+        LOG.debug(f"Connectivity stencil with {len(self.stencil)} relative unit-cell shifts")
+        return self.stencil
+
+    def is_connected(self, system: Any, ref_model: Any, model: Any) -> bool:
+        """
+        Check connection between two models by looking up the difference of their unit-cell shifts
+        in the connectivity stencil. Falls back to the distance check for models without unit cell.
+
+        Args:
+            system (Any): The system object.
+            ref_model (Any): Reference model.
+            model (Any): Model to compare.
+
+        Returns:
+            bool: True if models are connected, False otherwise.
+        """
+        if ref_model.unit_cell is None or model.unit_cell is None:
+            return self.get_connect(ref_model=ref_model, model=model)
+        if not ref_model.crosslink or not model.crosslink:
+            return False
+        shift = np.rint(np.subtract(ref_model.unit_cell, model.unit_cell)).astype(int)
+        return tuple(int(i) for i in shift) in self.get_stencil(system=system)
 
     def get_model_connect(self, system: Any, unit_cell: List[float]) -> bool:
         """
@@ -45,45 +104,76 @@ class Connect:
             bool: True if a connection is found, False otherwise.
         """
         transformation = system.crystal.get_t_matrix(s_matrix=unit_cell)
-        add_ = model.Model(id='add', transformation=transformation, pdb_file=system.crystal.pdb_file)
+        add_ = model.Model(id='add', transformation=transformation, unit_cell=unit_cell,
+                           crosslink_template=system.crystal.get_crosslink_template())
 
         for ref_model in self.system.get_models():
-            if self.get_connect(ref_model=system.get_model(model_id=ref_model), model=add_):
+            if self.is_connected(system=system, ref_model=system.get_model(model_id=ref_model), model=add_):
                 return True
         return False
 
-    def get_contact_connect(self, system: Any) -> Dict[float, List[float]]:
+    def get_contact_connect(self, system: Any, cut_off: float = 3.0) -> Dict[float, List[float]]:
         """
         Get connection between all models/contacts in system.
 
+        The crosslink positions of all models are stacked into one array, tagged with the index
+        of their model, and all crosslink pairs closer than cut_off are found in a single KD-tree query.
+        The connectivity stencil is not used here, the query covers models without unit cell as well.
+
         Args:
             system (Any): The system object.
+            cut_off (float): Distance cut-off in Angstroms.
 
         Returns:
             Dict[float, List[float]]: Dictionary of connections.
         """
-        self.pairs = {key: [] for key in self.system.get_models()}
-        for ref_model, model in product(self.system.get_models(), repeat=2):
-            if ref_model != model:
-                if self.get_connect(ref_model=system.get_model(model_id=ref_model),
-                                    model=system.get_model(model_id=model)):
-                    self.pairs[ref_model].append(model)
+        model_ids = self.system.get_models()
+        positions, owners = [], []
+        for idx, model_id in enumerate(model_ids):
+            for cross in getattr(system.get_model(model_id=model_id), 'crosslink', None) or []:
+                positions.append(cross.position)
+                owners.append(idx)
+
+        neighbors: Set[Tuple[int, int]] = set()
+        if positions:
+            tree = cKDTree(np.array(positions, dtype=float))
+            cross_pairs = tree.query_pairs(r=np.nextafter(cut_off, 0), output_type='ndarray')
+            model_pairs = np.array(owners, dtype=int)[cross_pairs].reshape(-1, 2)
+            model_pairs = model_pairs[model_pairs[:, 0] != model_pairs[:, 1]]
+            for i, j in model_pairs:
+                neighbors.update({(int(i), int(j)), (int(j), int(i))})
+
+        self.pairs = {key: [] for key in model_ids}
+        for i, j in sorted(neighbors):
+            self.pairs[model_ids[i]].append(model_ids[j])
         
         LOG.debug(f"Established connections: {self.pairs}")
         return self.merge_contacts(pairs=self.pairs)
 
     def merge_contacts(self, pairs: Dict[float, List[float]]) -> Dict[float, List[float]]:
         """
-        Merges contacts to generate groups of connections
+        Merges contacts to generate groups of connections: all models that are linked,
+        directly or through other models, end up in the same group (union-find).
+        Groups are transitive, so models linked only through a chain of contacts are merged
+        into one molecule downstream, not only direct neighbours of a model.
         """
-        self.connect = {key: set([key]) for key in pairs}
+        parent = {key: key for key in pairs}
+
+        def find(key: float) -> float:
+            while parent[key] != key:
+                parent[key] = parent[parent[key]]
+                key = parent[key]
+            return key
+
         for ref_key, connected_models in pairs.items():
             for model in connected_models:
-                self.connect[ref_key].add(model)
-                if model in self.connect:
-                    self.connect[model].add(ref_key)
-        
-        self.connect = {k: sorted(v) for k, v in self.connect.items()}
+                if model in parent:
+                    parent[find(model)] = find(ref_key)
+
+        groups: Dict[float, List[float]] = {}
+        for key in pairs:
+            groups.setdefault(find(key), []).append(key)
+        self.connect = {key: sorted(groups[find(key)]) for key in pairs}
         
         LOG.debug(f"Merged connections: {self.connect}")
         return self.clean_contacts(contactpairs=self.connect)
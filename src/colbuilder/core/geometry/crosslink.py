@@ -6,6 +6,8 @@ import numpy as np
 from typing import List, Optional, Union
 from pathlib import Path
 
+from colbuilder.core.utils import pdbio
+
 class Crosslink:
     """
     Container class storing information about each model's crosslink.
@@ -66,35 +68,93 @@ def read_crosslink(pdb_file: Union[str, Path]) -> List[Crosslink]:
     crosslinks = []
     pdb_path = Path(pdb_file).with_suffix('.pdb')
     
-    with open(pdb_path, 'r') as f:
-        for line in f:
-            if ((line[17:20] == ('LYX' or 'LXY' or 'LYY' or 'LXX') and line[13:16] == ('C13' or 'C12')) or
-                (line[17:20] == ('LY3' or 'LX3' or 'L3Y' or 'L2Y' or 'L3X' or 'L2X') and line[13:15] == 'CG') or
-                (line[17:20] == ('LY2' or 'LX2') and line[13:15] == 'CB')):
-                crosslinks.append(Crosslink(
-                    resid=line[22:26].strip(),
-                    resname=line[17:20],
-                    chain=line[21],
-                    position=[float(line[29:38]), float(line[38:46]), float(line[46:56])],
-                    type='T'
-                ))
-            elif ((line[17:20] == ('L4Y' or 'L4X' or 'LY4' or 'LX4') and line[13:15] == 'CE') or
-                  (line[17:20] == ('L5Y' or 'L5X' or 'LY5' or 'LX5') and line[13:15] == 'NZ')):
-                crosslinks.append(Crosslink(
-                    resid=line[22:26].strip(),
-                    resname=line[17:20],
-                    chain=line[21],
-                    position=[float(line[29:38]), float(line[38:46]), float(line[46:56])],
-                    type='D'
-                ))
-            elif ((line[17:20] == ('LGX' or 'LPS') and line[13:15] == 'CE') or
-                  (line[17:20] == ('AGS' or 'APD') and line[13:15] == 'NZ')):
-                crosslinks.append(Crosslink(
-                    resid=line[22:26].strip(),
-                    resname=line[17:20],
-                    chain=line[21],
-                    position=[float(line[29:38]), float(line[38:46]), float(line[46:56])],
-                    type='D'
-                ))
+    atoms = pdbio.read_atoms(pdb_path)
+    for atom in atoms:
+        resname, name = atom['resname'][:3], atom['name']
+        position = [atom['x'], atom['y'], atom['z']]
+        if ((resname == ('LYX' or 'LXY' or 'LYY' or 'LXX') and name[1:4] == ('C13' or 'C12')) or
+            (resname == ('LY3' or 'LX3' or 'L3Y' or 'L2Y' or 'L3X' or 'L2X') and name[1:3] == 'CG') or
+            (resname == ('LY2' or 'LX2') and name[1:3] == 'CB')):
+            crosslinks.append(Crosslink(
+                resid=atom['resid'].strip(),
+                resname=resname,
+                chain=atom['chain'],
+                position=position,
+                type='T'
+            ))
+        elif ((resname == ('L4Y' or 'L4X' or 'LY4' or 'LX4') and name[1:3] == 'CE') or
+              (resname == ('L5Y' or 'L5X' or 'LY5' or 'LX5') and name[1:3] == 'NZ')):
+            crosslinks.append(Crosslink(
+                resid=atom['resid'].strip(),
+                resname=resname,
+                chain=atom['chain'],
+                position=position,
+                type='D'
+            ))
+        elif ((resname == ('LGX' or 'LPS') and name[1:3] == 'CE') or
+              (resname == ('AGS' or 'APD') and name[1:3] == 'NZ')):
+            crosslinks.append(Crosslink(
+                resid=atom['resid'].strip(),
+                resname=resname,
+                chain=atom['chain'],
+                position=position,
+                type='D'
+            ))
    
     return crosslinks
+
+
+class CrosslinkTemplate:
+    """
+    Crosslinks of the template triple helix, parsed once and stored as arrays.
+
+    All models are translations of the template, hence the crosslinks of each model
+    are obtained by adding the translation vector of the model to the template positions.
+
+    Attributes:
+        position (np.ndarray): 3D coordinates of the crosslinks (K, 3).
+        resid (np.ndarray): Residue IDs (K,).
+        resname (np.ndarray): Residue names (K,).
+        chain (np.ndarray): Chain identifiers (K,).
+        type (np.ndarray): Types of the crosslinks ('T' or 'D') (K,).
+    """
+
+    def __init__(self, crosslinks: List[Crosslink]):
+        self.position = np.array([cross.position for cross in crosslinks], dtype=float).reshape(-1, 3)
+        self.resid = np.array([cross.resid for cross in crosslinks], dtype=str)
+        self.resname = np.array([cross.resname for cross in crosslinks], dtype=str)
+        self.chain = np.array([cross.chain for cross in crosslinks], dtype=str)
+        self.type = np.array([cross.type for cross in crosslinks], dtype=str)
+
+    @classmethod
+    def from_pdb(cls, pdb_file: Union[str, Path]) -> CrosslinkTemplate:
+        """
+        Reads the crosslink template from a PDB file.
+
+        Args:
+            pdb_file (Union[str, Path]): Path to the PDB file.
+
+        Returns:
+            CrosslinkTemplate: Crosslinks of the template.
+        """
+        return cls(read_crosslink(pdb_file=pdb_file))
+
+    def __len__(self) -> int:
+        return len(self.position)
+
+    def get_crosslinks(self, transform: List[float], model_id: Optional[Union[int, float]] = None) -> List[Crosslink]:
+        """
+        Builds the crosslinks of a model translated by the transformation matrix.
+
+        Args:
+            transform (List[float]): Translation vector.
+            model_id (Optional[Union[int, float]]): ID of the model.
+
+        Returns:
+            List[Crosslink]: List of Crosslink objects.
+        """
+        positions = self.position + np.asarray(transform, dtype=float)
+        return [Crosslink(resid=str(resid), resname=str(resname), chain=str(chain), position=position,
+                          type=str(type_), model_id=model_id)
+                for resid, resname, chain, position, type_
+                in zip(self.resid, self.resname, self.chain, positions, self.type)]
@@ -7,7 +7,7 @@ import os
 
 from colbuilder.core.geometry.crystal import Crystal
 from colbuilder.core.geometry.system import System
-from colbuilder.core.geometry.chimera import Chimera
+from colbuilder.core.geometry.crystal_engine import CrystalEngine
 from colbuilder.core.geometry.connect import Connect
 from colbuilder.core.geometry.caps import Caps
 from colbuilder.core.geometry.crystalcontacts import CrystalContacts
@@ -45,9 +45,9 @@ class CrosslinkMixer:
         system = System(crystal=crystal, crystalcontacts=crystalcontacts)
         
         transformation = system.crystalcontacts.read_t_matrix()
+        s_matrices = system.crystal.get_s_matrices(t_matrices=list(transformation.values()))
         unit_cell: Dict[float, Any] = {
-            k: system.crystal.get_s_matrix(t_matrix=transformation[k])
-            for k in transformation
+            k: list(s_matrix) for k, s_matrix in zip(transformation, s_matrices)
         }
         
         from colbuilder.core.geometry.model import Model
@@ -56,7 +56,7 @@ class CrosslinkMixer:
                 id=key_m,
                 transformation=transformation[key_m],
                 unit_cell=unit_cell[key_m],
-                pdb_file=crystal.pdb_file
+                crosslink_template=crystal.get_crosslink_template()
             )
             system.add_model(model=model)
         
@@ -70,7 +70,6 @@ class CrosslinkMixer:
         contact_distance: float,
         solution_space: List[float],
         crystalcontacts_file: Optional[str],
-        chimera: Chimera,
         crystal: Crystal
     ) -> Tuple[System, CrystalContacts, Connect]:
         """Build system from contact distance."""
@@ -78,7 +77,7 @@ class CrosslinkMixer:
         connect_file = 'connect_from_colbuilder'
         
         LOG.debug(f'     Getting CrystalContacts for contact distance {contact_distance} Ang')
-        chimera.matrixget(
+        CrystalEngine(crystal, str(path_pdb_file)).matrixget(
             pdb=str(path_pdb_file),
             contact_distance=contact_distance,
             crystalcontacts=self.crystalcontacts_file
@@ -127,19 +126,21 @@ class CrosslinkMixer:
         return system, connect
     
     @staticmethod
-    def _cap_system(system: System, crosslink_type: str) -> Caps:
-        """Add caps to the system."""
+    def _cap_system(system: System, crosslink_type: str, template: Optional[Union[str, Path]] = None,
+                    n_workers: Optional[int] = None, native: bool = True) -> Caps:
+        """Add caps to the system, translating the capped template where the termini were not cut."""
         LOG.debug("Capping models in the system with terminal groups")
-        caps = Caps(system=system)
+        caps = Caps(system=system, n_workers=n_workers, native=native)
         
+        pdb_ids = []
         for idx in system.get_models():
             pdb_id = int(idx)
             pdb_file = f"{pdb_id}.pdb"
-            if not os.path.exists(pdb_file):
+            if pdb_id not in system.store and not os.path.exists(pdb_file):
                 LOG.warning(f"PDB file {pdb_file} not found. Model IDs: {list(system.get_models())}")
                 continue
-            caps.read_residues(pdb_id=pdb_id)
-            caps.add_caps(pdb_id=pdb_id, crosslink_type=crosslink_type)
+            pdb_ids.append(pdb_id)
+        caps.cap_models(pdb_ids=pdb_ids, crosslink_type=crosslink_type, template=template)
             
         LOG.debug("Caps added to models")
         return caps
@@ -197,8 +198,6 @@ class CrosslinkMixer:
                 crystal = Crystal(first_pdb)
                 crystal.translate_crystal(pdb=first_pdb, translate=[0, 0, 4000])
                 
-                chimera = Chimera(config, str(self.path_wd / first_pdb))
-                
                 # Build initial system
                 system, crystalcontacts, connect = self._build_from_contactdistance(
                     self.path_wd,
@@ -206,7 +205,6 @@ class CrosslinkMixer:
                     self.contact_distance,
                     config.solution_space,
                     None,
-                    chimera,
                     crystal
                 )
                 
@@ -232,16 +230,18 @@ class CrosslinkMixer:
                     pdb=str(mix_pdb[key]),
                     translate=[0, 0, 4000]
                 )
-                chimera = Chimera(config, str(self.path_wd / mix_pdb[key]))
+                engine = CrystalEngine(pdb=str(self.path_wd / mix_pdb[key]))
                 
                 LOG.info(f' System {key}:')
                 LOG.info(f'     Generating system from {mix_pdb[key]} {Fore.BLUE}...{Style.RESET_ALL}')
                 
-                chimera.matrixset(
+                engine.matrixset(
                     pdb=str(mix_pdb[key]),
                     crystalcontacts=str(system.crystalcontacts.crystalcontacts_file),
                     system_size=system_size,
-                    fibril_length=self.fibril_length
+                    fibril_length=self.fibril_length,
+                    store=system.store,
+                    instanced=system.instanced
                 )
                 
                 LOG.info(f'     Cutting system to {self.fibril_length} nm')
@@ -252,7 +252,8 @@ class CrosslinkMixer:
                 if dir_path.exists():
                     shutil.rmtree(dir_path)
                 dir_path.mkdir(exist_ok=True)
-                self._cap_system(system, key)
+                self._cap_system(system, key, template=mix_pdb[key], n_workers=config.n_workers,
+                                 native=config.native_caps)
             
             LOG.info(f'Step 2/2 Mixing systems')
             mix_ = Mix(ratio_mix=mix_setup, system=system)
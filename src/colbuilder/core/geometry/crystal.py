@@ -6,6 +6,8 @@ import numpy as np
 from typing import Dict, List, Optional, Tuple
 from pathlib import Path
 
+from colbuilder.core.geometry.crosslink import CrosslinkTemplate
+from colbuilder.core.utils import pdbio
 from colbuilder.core.utils.logger import setup_logger
 
 LOG = setup_logger(__name__)
@@ -23,12 +25,21 @@ class Crystal:
         Tuple of valid line types in PDB files.
     crystal : Dict[str, Optional[float]]
         Dictionary to store crystal parameters.
+    crosslink_template : Optional[CrosslinkTemplate]
+        Crosslinks of the PDB file, parsed on first use.
+    cs_matrix : Optional[np.ndarray]
+        Crystal-symmetry matrix of the PDB file, parsed on first use.
+    cs_inverse : Optional[np.ndarray]
+        Inverse of the crystal-symmetry matrix.
     """
 
     def __init__(self, pdb=None):
         self.pdb_file = Path(pdb) if pdb else None
         self.is_line = ('ATOM  ', 'HETATM', 'ANISOU')
         self.crystal = {k: None for k in ['a', 'b', 'c', 'alpha', 'beta', 'gamma']}
+        self.crosslink_template: Optional[CrosslinkTemplate] = None
+        self.cs_matrix: Optional[np.ndarray] = None
+        self.cs_inverse: Optional[np.ndarray] = None
 
     def read_crystal(self, pdb: Optional[Path] = None) -> Dict[str, str]:
         """
@@ -110,6 +121,90 @@ class Crystal:
         else:
             raise ValueError(f'Space-group not recognized: Crystal-rotation-matrix only for space-group 1 available. Got {spacegroup}')
 
+    def get_cs_matrix(self, pdb: Optional[Path] = None) -> np.ndarray:
+        """
+        Get crystal-symmetry matrix CS, the CRYST1 record of the own PDB file is read only once.
+
+        Parameters
+        ----------
+        pdb : Optional[Path], default=None
+            Path to the PDB file. If None, uses the instance's pdb_file.
+
+        Returns
+        -------
+        np.ndarray
+            Crystal-symmetry matrix.
+        """
+        if pdb is not None and self._is_other_pdb(pdb):
+            return self.read_cs_matrix(Path(pdb))
+        if self.cs_matrix is None:
+            self.cs_matrix = self.read_cs_matrix(self.pdb_file)
+            self.cs_inverse = np.linalg.inv(self.cs_matrix)
+        return self.cs_matrix
+
+    def get_cs_inverse(self, pdb: Optional[Path] = None) -> np.ndarray:
+        """
+        Get inverse of the crystal-symmetry matrix CS.
+
+        Parameters
+        ----------
+        pdb : Optional[Path], default=None
+            Path to the PDB file. If None, uses the instance's pdb_file.
+
+        Returns
+        -------
+        np.ndarray
+            Inverse crystal-symmetry matrix.
+        """
+        if pdb is not None and self._is_other_pdb(pdb):
+            return np.linalg.inv(self.read_cs_matrix(Path(pdb)))
+        self.get_cs_matrix()
+        return self.cs_inverse
+
+    def _is_other_pdb(self, pdb: Path) -> bool:
+        """Check if pdb refers to another file than the instance's pdb_file."""
+        return self.pdb_file is None or Path(pdb).with_suffix('.pdb') != self.pdb_file.with_suffix('.pdb')
+
+    def get_s_matrices(self, t_matrices, cs_matrix: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Get unit-cell shifts S of many transformation matrices T at once: S = CS^-1 x T.
+
+        Parameters
+        ----------
+        t_matrices : array_like
+            Transformation matrices with shape (N, 3).
+        cs_matrix : Optional[np.ndarray], default=None
+            Crystal-symmetry matrix. If None, uses the cached matrix of the PDB file.
+
+        Returns
+        -------
+        np.ndarray
+            Unit-cell shifts with shape (N, 3).
+        """
+        cs_inverse = self.get_cs_inverse() if cs_matrix is None else np.linalg.inv(cs_matrix)
+        t_matrices = np.asarray(t_matrices, dtype=float).reshape(-1, 3)
+        return (t_matrices @ cs_inverse.T).round(decimals=0).astype(int)
+
+    def get_t_matrices(self, s_matrices, cs_matrix: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Get transformation matrices T of many unit-cell shifts S at once: T = CS x S.
+
+        Parameters
+        ----------
+        s_matrices : array_like
+            Unit-cell shifts with shape (N, 3).
+        cs_matrix : Optional[np.ndarray], default=None
+            Crystal-symmetry matrix. If None, uses the cached matrix of the PDB file.
+
+        Returns
+        -------
+        np.ndarray
+            Transformation matrices with shape (N, 3).
+        """
+        cs_matrix = self.get_cs_matrix() if cs_matrix is None else cs_matrix
+        s_matrices = np.asarray(s_matrices, dtype=float).reshape(-1, 3)
+        return (s_matrices @ cs_matrix.T).round(decimals=3).astype(float)
+
     def get_s_matrix(self, pdb: Optional[Path] = None, cs_matrix: Optional[np.ndarray] = None, t_matrix: Optional[List[float]] = None) -> List[int]:
         """
         Get shift matrix S from transformation matrix T using crystal-symmetry matrix CS: S = T \ CS.
@@ -134,7 +229,7 @@ class Crystal:
             If no transform matrix is provided.
         """
         if cs_matrix is None:
-            cs_matrix = self.read_cs_matrix(pdb)
+            cs_matrix = self.get_cs_matrix(pdb)
         if t_matrix is None:
             raise ValueError('No transform-matrix given, hence no unit-cell shift matrix can be calculated.')
         return list(np.linalg.solve(cs_matrix, t_matrix).round(decimals=0).astype(int))
@@ -163,7 +258,7 @@ class Crystal:
             If no unit-cell shift matrix is provided.
         """
         if cs_matrix is None:
-            cs_matrix = self.read_cs_matrix(pdb)
+            cs_matrix = self.get_cs_matrix(pdb)
         if s_matrix is None:
             raise ValueError('No unit-cell shift-matrix given, hence no transform matrix can be calculated.')
         return list(np.dot(cs_matrix, s_matrix).round(decimals=3).astype(float))
@@ -185,16 +280,41 @@ class Crystal:
         pdb = Path(pdb) if pdb else self.pdb_file
         if not bool_system:
             translate = [0, 0, translate[2] - self.get_cog(pdb)]
-        with open(pdb.with_suffix('.pdb'), 'r') as f:
-            atoms = f.readlines()
-        with open(pdb.with_suffix('.pdb'), 'w') as f:
-            for line in atoms:
-                if line[:6] in self.is_line:
-                    x, y, z = float(line[30:38]), float(line[38:46]), float(line[46:54])
-                    new_z = round(z + translate[2], 3)
-                    f.write(f"{line[:30]}{x:8.3f}{y:8.3f}{new_z:8.3f}{line[54:]}")
-                else:
-                    f.write(line)
+        self.crosslink_template = None
+        atoms = pdbio.read_atoms(pdb.with_suffix('.pdb'))
+        atoms['z'] = np.round(atoms['z'] + translate[2], decimals=3)
+        pdbio.update_atoms(pdb.with_suffix('.pdb'), atoms)
+
+    def get_crosslink_template(self) -> CrosslinkTemplate:
+        """
+        Get crosslinks of the PDB file, read only once and reused for all models.
+
+        Returns
+        -------
+        CrosslinkTemplate
+            Crosslinks of the untransformed triple helix.
+        """
+        if self.crosslink_template is None:
+            self.crosslink_template = CrosslinkTemplate.from_pdb(pdb_file=self.pdb_file)
+            LOG.debug(f"Read {len(self.crosslink_template)} crosslinks from {self.pdb_file}")
+        return self.crosslink_template
+
+    def get_coords(self, pdb=None) -> np.ndarray:
+        """
+        Get atom coordinates of PDB file.
+
+        Parameters
+        ----------
+        pdb : Union[str, Path], default=None
+            Path to the PDB file.
+
+        Returns
+        -------
+        np.ndarray
+            Atom coordinates with shape (N, 3).
+        """
+        pdb = Path(pdb) if pdb else self.pdb_file
+        return pdbio.read_coords(pdb.with_suffix('.pdb'))
 
     def get_cog(self, pdb=None):
         """
@@ -211,6 +331,4 @@ class Crystal:
             Z-coordinate of the center of gravity.
         """
         pdb = Path(pdb) if pdb else self.pdb_file
-        with open(pdb.with_suffix('.pdb'), 'r') as f:
-            z_coords = [float(line[46:54]) for line in f if line[:6] in self.is_line]
-        return np.nanmean(z_coords)
\ No newline at end of file
+        return np.nanmean(pdbio.read_atoms(pdb.with_suffix('.pdb'))['z'])
\ No newline at end of file
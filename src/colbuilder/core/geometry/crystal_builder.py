@@ -16,12 +16,14 @@ from pathlib import Path
 from typing import Tuple, Optional, List, Dict, Any, Union
 import shutil
 import os
+import numpy as np
 from colorama import Fore, Style
 
 from ..utils.exceptions import GeometryGenerationError
 from ..utils.logger import setup_logger
 from ..utils.config import ColbuilderConfig
 from ..utils.dec import timeit
+from ..utils.cache import Cache
 
 from .crystal import Crystal
 from .system import System
@@ -30,7 +32,7 @@ from .crystalcontacts import CrystalContacts
 from .connect import Connect
 from .caps import Caps
 from .optimize import Optimizer
-from .chimera import Chimera
+from .crystal_engine import CrystalEngine
 
 LOG = setup_logger(__name__)
 
@@ -98,31 +100,48 @@ class CrystalBuilder:
         try:
             LOG.info(f"Step 1/{self.steps} Initializing crystal")
             crystal = await self._initialize_crystal(config)
+
+            # Keyed on the template PDB centered in place by _initialize_crystal, the same on every run
+            cache = Cache(cache_dir=config.cache_dir, max_size=config.cache_size) if config.geometry_cache else None
+            cache_key = self._get_cache_key(cache, config) if cache else None
             
             LOG.info(f"Step 2/{self.steps} Building initial system")
-            system, crystalcontacts, connect = await self._build_initial_system(crystal, config)
+            cached = self._load_cached_system(cache, cache_key, crystal, config) if cache else None
+            if cached is not None:
+                system, crystalcontacts, connect, coords = cached
+            else:
+                system, crystalcontacts, connect = await self._build_initial_system(crystal, config)
+                coords = None
             
             LOG.info(f"Step 3/{self.steps} Writing crystal contacts")
-            crystalcontacts.write_crystalcontacts(
-                system=system,
-                crystalcontacts_file=crystalcontacts.crystalcontacts_file
-            )
+            if cached is None:
+                crystalcontacts.write_crystalcontacts(
+                    system=system,
+                    crystalcontacts_file=crystalcontacts.crystalcontacts_file
+                )
             
             LOG.info(f"Step 4/{self.steps} Generating system matrix")
-            LOG.info(f'{Fore.BLUE}Please wait, this may take some time ...{Style.RESET_ALL}')
-            
-            chimera = Chimera(config, str(Path(config.working_directory) / config.pdb_file))
-            chimera.matrixset(
-                pdb=str(config.pdb_file),
-                crystalcontacts=crystalcontacts.crystalcontacts_file,
-                system_size=system.get_size(),
-                fibril_length=config.fibril_length
-            )
-            
-            system = self.matrixset_system(system=system, crystalcontacts_file=crystalcontacts.crystalcontacts_file)
+            engine = CrystalEngine(system.crystal, str(Path(config.working_directory) / config.pdb_file))
+            if coords is not None:
+                engine.load_models(store=system.store, arrays=coords, pdb=str(config.pdb_file))
+            else:
+                LOG.info(f'{Fore.BLUE}Please wait, this may take some time ...{Style.RESET_ALL}')
+                engine.matrixset(
+                    pdb=str(config.pdb_file),
+                    crystalcontacts=crystalcontacts.crystalcontacts_file,
+                    system_size=system.get_size(),
+                    fibril_length=config.fibril_length,
+                    store=system.store,
+                    instanced=system.instanced
+                )
+                
+                system = self.matrixset_system(system=system, crystalcontacts_file=crystalcontacts.crystalcontacts_file)
            
             LOG.info(f"Step 5/{self.steps} Writing {connect.connect_file}")
             connect.write_connect(system=system, connect_file=connect.connect_file)
+
+            if cache and coords is None:
+                self._cache_system(cache, cache_key, system, crystalcontacts, connect, engine)
             
             LOG.info(f"Step 6/{self.steps} Adding caps")
             model_type = system.get_model(model_id=0.0).type
@@ -131,26 +150,28 @@ class CrystalBuilder:
             
             has_crosslinks = self._needs_optimization(system)
             if has_crosslinks:
-                caps = Caps(system=system)
+                caps = Caps(system=system, n_workers=config.n_workers, native=config.native_caps)
+                pdb_ids = []
                 for idx in system.get_models():
                     pdb_id = int(idx)
                     pdb_file = f"{pdb_id}.pdb"
-                    if not os.path.exists(pdb_file):
+                    if pdb_id not in system.store and not os.path.exists(pdb_file):
                         LOG.warning(f"PDB file {pdb_file} not found. Model IDs: {list(system.get_models())}")
                         continue
-                    caps.read_residues(pdb_id=pdb_id)
-                    caps.add_caps(pdb_id=pdb_id, crosslink_type=model_type)
+                    pdb_ids.append(pdb_id)
+                caps.cap_models(pdb_ids=pdb_ids, crosslink_type=model_type)
             else:
                 LOG.debug("System has no crosslinks, using standard capping")
-                caps = Caps(system=system)
+                caps = Caps(system=system, n_workers=config.n_workers, native=config.native_caps)
+                pdb_ids = []
                 for idx in system.get_models():
                     pdb_id = int(idx)
                     pdb_file = f"{pdb_id}.pdb"
-                    if not os.path.exists(pdb_file):
+                    if pdb_id not in system.store and not os.path.exists(pdb_file):
                         LOG.warning(f"PDB file {pdb_file} not found. Model IDs: {list(system.get_models())}")
                         continue
-                    caps.read_residues(pdb_id=pdb_id)
-                    caps.add_caps(pdb_id=pdb_id, crosslink_type="NC")
+                    pdb_ids.append(pdb_id)
+                caps.cap_models(pdb_ids=pdb_ids, crosslink_type="NC")
             
             LOG.info(f"Step 7/{self.steps} Writing final structure")
             system.write_pdb(
@@ -264,13 +285,13 @@ class CrystalBuilder:
         try:
             pdb_path = Path(config.working_directory) / config.pdb_file
             
-            chimera = Chimera(config, str(pdb_path))
+            engine = CrystalEngine(crystal, str(pdb_path))
             crystalcontacts_file = 'crystalcontacts_from_colbuilder'
             connect_file = 'connect_from_colbuilder'
             
             LOG.debug(f'Getting CrystalContacts for contact distance {config.contact_distance} Ang')
             
-            chimera.matrixget(
+            engine.matrixget(
                 pdb=str(pdb_path),
                 contact_distance=config.contact_distance,
                 crystalcontacts=crystalcontacts_file
@@ -398,9 +419,10 @@ class CrystalBuilder:
             system = System(crystal=crystal, crystalcontacts=crystalcontacts)
             transformation = system.crystalcontacts.read_t_matrix()
             
+            s_matrices = system.crystal.get_s_matrices(t_matrices=list(transformation.values()))
             unit_cell = {
-                model_id: system.crystal.get_s_matrix(t_matrix=transformation[model_id])
-                for model_id in transformation
+                model_id: list(s_matrix)
+                for model_id, s_matrix in zip(transformation, s_matrices)
             }
             
             for model_id in transformation:
@@ -409,7 +431,7 @@ class CrystalBuilder:
                         id=model_id,
                         transformation=transformation[model_id],
                         unit_cell=unit_cell[model_id],
-                        pdb_file=crystal.pdb_file
+                        crosslink_template=crystal.get_crosslink_template()
                     )
                     system.add_model(model=model)
                 except Exception as e:
@@ -484,6 +506,137 @@ class CrystalBuilder:
                 context={"connect_file": connect_file}
             )
 
+    def _get_cache_key(self, cache: Cache, config: ColbuilderConfig) -> str:
+        """
+        Get the cache key of the geometry: contents of the template PDB and of the input
+        crystal contacts and connect files, and all parameters the geometry depends on.
+        The template PDB is hashed after _initialize_crystal has centered it.
+        
+        Args:
+            cache: Geometry cache
+            config: Configuration settings
+            
+        Returns:
+            str: Cache key
+        """
+        input_files = [
+            Path(config.crystalcontacts_file).with_suffix('.txt') if config.crystalcontacts_file else None,
+            Path(config.connect_file).with_suffix('.txt') if config.connect_file else None
+        ]
+        return cache.get_key(
+            'geometry',
+            files=[Path(str(config.pdb_file)).with_suffix('.pdb')] + input_files,
+            contact_distance=config.contact_distance,
+            solution_space=list(config.solution_space),
+            crystalcontacts_optimize=config.crystalcontacts_optimize,
+            fibril_length=config.fibril_length
+        )
+
+    def _load_cached_system(
+        self,
+        cache: Cache,
+        cache_key: str,
+        crystal: Crystal,
+        config: ColbuilderConfig
+    ) -> Optional[Tuple[System, CrystalContacts, Connect, Optional[Dict[str, Any]]]]:
+        """
+        Rebuild the system from the geometry cache: models with their transformation,
+        unit cell and connect group, as after writing the connect file.
+        The cached crystal contacts files are restored to the working directory.
+        
+        Args:
+            cache: Geometry cache
+            cache_key: Cache key of the geometry
+            crystal: Crystal structure
+            config: Configuration settings
+            
+        Returns:
+            Tuple containing system, crystal contacts, connections and the cut models
+            (None if not cached), or None on a cache miss
+        """
+        entry = cache.get(cache_key)
+        if entry is None:
+            return None
+        try:
+            data = cache.read_json(entry, 'system.json')
+            crystalcontacts = CrystalContacts(data['crystalcontacts_file'])
+            system = System(crystal=crystal, crystalcontacts=crystalcontacts)
+            crosslink_template = crystal.get_crosslink_template()
+            for item in data['models']:
+                model = Model(
+                    id=item['id'],
+                    transformation=item['transformation'],
+                    unit_cell=item['unit_cell'],
+                    crosslink_template=crosslink_template
+                )
+                model.connect, model.connect_id = item['connect'], item['connect_id']
+                system.add_model(model=model)
+            connect = Connect(system=system, connect_file=data['connect_file'])
+
+            for name in data['files']:
+                shutil.copy(entry / 'files' / name, Path(crystalcontacts.crystalcontacts_file).with_name(name))
+
+            coords = None
+            if (entry / 'coords.npz').exists():
+                with np.load(entry / 'coords.npz') as arrays:
+                    coords = {name: arrays[name] for name in arrays.files}
+        except Exception as e:
+            LOG.warning(f"Ignoring unreadable geometry cache entry {entry}: {str(e)}")
+            return None
+        
+        LOG.info(f'{Fore.BLUE}Using cached geometry with {system.get_size()} models{Style.RESET_ALL}')
+        return system, crystalcontacts, connect, coords
+
+    def _cache_system(
+        self,
+        cache: Cache,
+        cache_key: str,
+        system: System,
+        crystalcontacts: CrystalContacts,
+        connect: Connect,
+        engine: CrystalEngine
+    ) -> None:
+        """
+        Add the system to the geometry cache: transformation, unit cell and connect group
+        of each model, the crystal contacts files, and the models cut to the fibril length.
+        A failure to write the cache is logged and ignored.
+        
+        Args:
+            cache: Geometry cache
+            cache_key: Cache key of the geometry
+            system: System after writing the connect file
+            crystalcontacts: Crystal contacts information
+            connect: System connections
+            engine: Crystal engine that set the models
+        """
+        models = []
+        for model_id in system.get_models():
+            model = system.get_model(model_id=model_id)
+            models.append({
+                'id': float(model_id),
+                'transformation': [float(i) for i in model.transformation],
+                'unit_cell': None if model.unit_cell is None else [float(i) for i in model.unit_cell],
+                'connect': None if model.connect is None else [float(i) for i in model.connect],
+                'connect_id': None if model.connect_id is None else float(model.connect_id)
+            })
+        crystalcontacts_file = Path(crystalcontacts.crystalcontacts_file)
+        files = [crystalcontacts_file.with_suffix('.txt'),
+                 crystalcontacts_file.with_name(f"{crystalcontacts_file.name}_id.txt")]
+        try:
+            with cache.put(cache_key) as entry:
+                (entry / 'files').mkdir()
+                for file in files:
+                    shutil.copy(file, entry / 'files' / file.name)
+                cache.write_json(entry, 'system.json', {
+                    'crystalcontacts_file': str(crystalcontacts_file),
+                    'connect_file': str(connect.connect_file),
+                    'files': [file.name for file in files],
+                    'models': models
+                })
+                np.savez(entry / 'coords.npz', **engine.save_models(store=system.store))
+        except Exception as e:
+            LOG.warning(f"Failed to cache geometry: {str(e)}")
+
     def _needs_optimization(self, system: System) -> bool:
         """
         Check if system needs optimization.
@@ -0,0 +1,329 @@
+# Copyright (c) 2024, Colbuilder Development Team
+# Distributed under the terms of the Apache License 2.0
+
+from __future__ import annotations
+import numpy as np
+from itertools import product
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+from scipy.spatial import cKDTree
+
+from colbuilder.core.geometry.crystal import Crystal
+from colbuilder.core.geometry.crystalcontacts import CrystalContacts
+from colbuilder.core.geometry.store import CoordinateStore
+from colbuilder.core.utils import pdbio
+from colbuilder.core.utils.constants import ATOM_MASSES
+from colbuilder.core.utils.logger import setup_logger
+
+LOG = setup_logger(__name__)
+
+class CrystalEngine:
+    """
+    Generate collagen microfibril from unit-cell translations of the crystal (space group P1)
+    without UCSF Chimera.
+
+    Native counterpart of the "crystalcontacts", "matrixget" and "matrixset" commands of Chimera:
+    all copies of the triple helix, shifted by an integer number of unit cells, that
+    come within the contact distance of the reference helix are collected with a KD-tree
+    and written in the crystal contacts format read by CrystalContacts. The models of the
+    system are generated by translating one in-memory copy of the triple helix and cut to
+    the fibril length based on the center of mass of each residue.
+
+    Attributes:
+        crystal (Crystal): Crystal object providing the crystal-symmetry matrix.
+        pdb_file (Optional[Path]): Path to the PDB file of the triple helix.
+        is_line (Tuple[str, ...]): Tuple of atom line types in PDB files.
+    """
+    def __init__(self, crystal: Optional[Crystal] = None, pdb: Optional[Union[str, Path]] = None):
+        self.pdb_file = Path(pdb) if pdb else None
+        self.crystal = crystal or Crystal(pdb=self.pdb_file)
+        self.is_line: Tuple[str, ...] = ('ATOM  ', 'HETATM')
+
+    def get_shifts(self, coords: np.ndarray, cs_matrix: np.ndarray, contact_distance: float) -> np.ndarray:
+        """
+        Get all unit-cell shifts whose copy has an atom within the contact distance of the reference.
+
+        Args:
+            coords (np.ndarray): Atom coordinates of the reference triple helix (N, 3).
+            cs_matrix (np.ndarray): Crystal-symmetry matrix.
+            contact_distance (float): Contact distance in Angstrom.
+
+        Returns:
+            np.ndarray: Unit-cell shifts (M, 3) in contact with the reference, excluding the reference itself.
+        """
+        lower, upper = coords.min(axis=0), coords.max(axis=0)
+        extent = upper - lower + contact_distance
+
+        # The largest fractional shift is reached at a corner of the box of possible translations
+        corners = np.array(list(product(*zip(-extent, extent))))
+        bounds = np.ceil(np.abs(np.linalg.solve(cs_matrix, corners.T)).max(axis=1)).astype(int)
+        shifts = np.array(list(product(*(range(-b, b + 1) for b in bounds))))
+        shifts = shifts[np.any(shifts != 0, axis=1)]
+
+        translations = shifts @ cs_matrix.T
+        overlap = np.all(np.abs(translations) <= extent, axis=1)
+        shifts, translations = shifts[overlap], translations[overlap]
+
+        tree = cKDTree(coords)
+        box_min, box_max = lower - contact_distance, upper + contact_distance
+        contacts = []
+        for shift, translation in zip(shifts, translations):
+            copy = coords + translation
+            copy = copy[np.all((copy >= box_min) & (copy <= box_max), axis=1)]
+            if not copy.size:
+                continue
+            distance, _ = tree.query(copy, k=1, distance_upper_bound=contact_distance)
+            if np.isfinite(distance).any():
+                contacts.append(shift)
+
+        LOG.debug(f"Found {len(contacts)} crystal contacts out of {len(shifts)} candidate unit-cell shifts")
+        return np.array(contacts, dtype=int).reshape(-1, 3)
+
+    def get_contacts(self, pdb: Optional[Union[str, Path]] = None, contact_distance: float = 0) -> Dict[float, List[float]]:
+        """
+        Get transformation matrices of all crystal contacts, the reference model has id 0.
+
+        Args:
+            pdb (Optional[Union[str, Path]]): Path to the PDB file. If None, uses self.pdb_file.
+            contact_distance (float): Contact distance in Angstrom.
+
+        Returns:
+            Dict[float, List[float]]: Dictionary of transformation matrices.
+        """
+        pdb = Path(pdb) if pdb else self.pdb_file
+        cs_matrix = self.crystal.get_cs_matrix(pdb)
+        coords = self.crystal.get_coords(pdb)
+        shifts = self.get_shifts(coords=coords, cs_matrix=cs_matrix, contact_distance=float(contact_distance))
+        translations = self.crystal.get_t_matrices(s_matrices=shifts, cs_matrix=cs_matrix)
+
+        t_matrix = {0.0: [0.0, 0.0, 0.0]}
+        for idx, translation in enumerate(translations, start=1):
+            t_matrix[float(idx)] = list(translation)
+        return t_matrix
+
+    def matrixget(self, pdb: Optional[Union[str, Path]] = None, contact_distance: float = 0,
+                  crystalcontacts: str = "") -> Dict[float, List[float]]:
+        """
+        Get transformation matrices based on crystal contacts and write them to file.
+
+        Args:
+            pdb (Optional[Union[str, Path]]): Path to the PDB file. If None, uses self.pdb_file.
+            contact_distance (float): Contact distance for crystal contacts.
+            crystalcontacts (str): Output file name for crystal contacts.
+
+        Returns:
+            Dict[float, List[float]]: Dictionary of transformation matrices.
+        """
+        t_matrix = self.get_contacts(pdb=pdb, contact_distance=contact_distance)
+        with open(Path(crystalcontacts).with_suffix('.txt'), 'w') as f:
+            for model_id, transformation in t_matrix.items():
+                f.write(f"Model {model_id}\n")
+                for i, val in enumerate(transformation):
+                    f.write(f"         {'1' if i == 0 else '0'} {'1' if i == 1 else '0'} {'1' if i == 2 else '0'} {val:.3f}\n")
+        return t_matrix
+
+    def read_residues(self, pdb: Optional[Union[str, Path]] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Read atoms of the triple helix with coordinates, atomic masses and residue index of each atom.
+
+        Args:
+            pdb (Optional[Union[str, Path]]): Path to the PDB file. If None, uses self.pdb_file.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]: Structured atoms, coordinates (N, 3),
+            masses (N,) and residue indices (N,).
+        """
+        pdb = Path(pdb) if pdb else self.pdb_file
+        atoms = pdbio.read_atoms(pdb.with_suffix('.pdb'))
+
+        # Element from columns 77-78, else from the first letter of the atom name
+        tail = np.char.ljust(atoms['tail'], 26).astype('U26').view('U1').reshape(-1, 26)
+        elements = np.char.strip(np.char.add(tail[:, 22], tail[:, 23]))
+        names = np.char.lstrip(np.char.strip(atoms['name']), '0123456789').astype('U1')
+        elements = np.char.capitalize(np.where(elements != '', elements, names))
+        unique, inverse = np.unique(elements, return_inverse=True)
+        masses = np.array([ATOM_MASSES.get(element, ATOM_MASSES['C']) for element in unique])[inverse.reshape(-1)]
+
+        residue = np.char.add(np.char.add(atoms['chain'], atoms['resid']), atoms['icode'])
+        residues = np.cumsum(np.append(False, residue[1:] != residue[:-1]), dtype=int)
+        return atoms, pdbio.get_coords(atoms), masses.astype(float), residues
+
+    def get_fibril_window(self, coords: np.ndarray, fibril_length: float) -> Tuple[float, float]:
+        """
+        Get z-range of the fibril centered between first and last atom of the triple helix.
+
+        Args:
+            coords (np.ndarray): Atom coordinates of the triple helix (N, 3).
+            fibril_length (float): Length of the fibril in nm.
+
+        Returns:
+            Tuple[float, float]: Lower and upper z-position of the fibril in Angstrom.
+        """
+        start_z, end_z = coords[0, 2], coords[-1, 2]
+        center_z = np.sqrt((abs(end_z) - abs(start_z)) ** 2) / 2 + start_z
+        return center_z - 5 * fibril_length, center_z + 5 * fibril_length
+
+    def matrixset(self, pdb: Optional[Union[str, Path]] = None, crystalcontacts: Union[str, Path] = "",
+                  system_size: int = 0, fibril_length: float = 0.0,
+                  store: Optional[CoordinateStore] = None, instanced: bool = False) -> List[float]:
+        """
+        Set PDB models based on transformation matrices and cut them to the fibril length.
+
+        Each model is written to <model_id>.pdb, or kept in the coordinate store if given,
+        keeping only residues with their center of mass inside the fibril; the ids of all
+        models with at least one residue are written to <crystalcontacts>_id.txt.
+
+        Args:
+            pdb (Optional[Union[str, Path]]): Path to the PDB file. If None, uses self.pdb_file.
+            crystalcontacts (Union[str, Path]): Crystal contacts file with transformation matrices.
+            system_size (int): Number of models in the system.
+            fibril_length (float): Length of the fibril in nm.
+            store (Optional[CoordinateStore]): Coordinate store to keep the models in memory.
+            instanced (bool): Keep models in the store as translated instances of the triple helix.
+
+        Returns:
+            List[float]: IDs of the models kept in the fibril.
+        """
+        t_matrix = CrystalContacts(crystalcontacts).read_t_matrix()
+        if system_size and system_size != len(t_matrix):
+            LOG.warning(f"System size {system_size} differs from {len(t_matrix)} models in {crystalcontacts}")
+
+        helix, coords, masses, residues = self.read_residues(pdb)
+        z_min, z_max = self.get_fibril_window(coords=coords, fibril_length=fibril_length)
+
+        res_mass = np.bincount(residues, weights=masses)
+        res_com_z = np.bincount(residues, weights=masses * coords[:, 2]) / res_mass
+
+        model_ids = list(t_matrix.keys())
+        translations = np.array([t_matrix[model_id] for model_id in model_ids]).reshape(-1, 3)
+        com_z = res_com_z[None, :] + translations[:, 2, None]
+        keep = (com_z >= z_min) & (com_z <= z_max)
+
+        template = helix if store is not None else None
+        if instanced and store is not None:
+            template_key = self.set_template(store=store, key=str(pdb), template=template)
+        contacts = []
+        for model_id, translation, keep_res in zip(model_ids, translations, keep):
+            atoms = np.flatnonzero(keep_res[residues])
+            if not atoms.size:
+                continue
+            if instanced and store is not None:
+                store.set_instance(key=str(int(model_id)), template=template_key, translate=translation,
+                                   atoms=None if atoms.size == len(helix) else atoms)
+            elif store is not None:
+                self.set_model(store=store, key=str(int(model_id)), template=template,
+                               coords=coords[atoms] + translation, atoms=atoms)
+            else:
+                self.write_model(pdb_out=f"{int(model_id)}.pdb", helix=helix,
+                                 coords=coords[atoms] + translation, atoms=atoms)
+            contacts.append(model_id)
+
+        with open(f"{crystalcontacts}_id.txt", 'w') as f:
+            for model_id in contacts:
+                f.write(f"Model {int(model_id)}\n")
+
+        LOG.debug(f"Kept {len(contacts)} of {len(model_ids)} models within {fibril_length} nm")
+        return contacts
+
+    def set_template(self, store: CoordinateStore, key: str, template: np.ndarray) -> str:
+        """
+        Keep the triple helix as template of instanced models, with TER records at chain changes.
+
+        Args:
+            store (CoordinateStore): Coordinate store of the system.
+            key (str): Template key in the store.
+            template (np.ndarray): Structured atoms of the triple helix.
+
+        Returns:
+            str: Template key.
+        """
+        template['ter'] = np.append(template['chain'][1:] != template['chain'][:-1], True)
+        store.set_template(key, template)
+        return key
+
+    def save_models(self, store: CoordinateStore) -> Dict[str, np.ndarray]:
+        """
+        Get the models set by matrixset as arrays, e.g. to save them with np.savez.
+
+        Instances are saved as their translation and the indices of the kept template atoms,
+        other models as their structured atoms.
+
+        Args:
+            store (CoordinateStore): Coordinate store of the system.
+
+        Returns:
+            Dict[str, np.ndarray]: Arrays named 'translate_<key>' and 'atoms_<key>' for instances,
+            'model_<key>' for other models.
+        """
+        arrays = {}
+        for key in store.keys():
+            if key in store.instances:
+                _, translations, atoms = store.instances[key]
+                arrays[f"translate_{key}"] = translations.sum(axis=0)
+                if atoms is not None:
+                    arrays[f"atoms_{key}"] = atoms
+            else:
+                arrays[f"model_{key}"] = store.view_model(key)
+        return arrays
+
+    def load_models(self, store: CoordinateStore, arrays: Dict[str, np.ndarray],
+                    pdb: Optional[Union[str, Path]] = None) -> List[str]:
+        """
+        Set models saved by save_models in the coordinate store, instead of running matrixset.
+
+        Args:
+            store (CoordinateStore): Coordinate store of the system.
+            arrays (Dict[str, np.ndarray]): Arrays returned by save_models.
+            pdb (Optional[Union[str, Path]]): Path to the PDB file of the template. If None, uses self.pdb_file.
+
+        Returns:
+            List[str]: Keys of the loaded models.
+        """
+        pdb = Path(pdb) if pdb else self.pdb_file
+        keys = []
+        for name in arrays:
+            kind, key = name.split('_', 1)
+            if kind == 'model':
+                store.set_model(key, arrays[name])
+                keys.append(key)
+            elif kind == 'translate':
+                if str(pdb) not in store.templates:
+                    self.set_template(store=store, key=str(pdb), template=self.read_residues(pdb)[0])
+                atoms = arrays.get(f"atoms_{key}")
+                store.set_instance(key=key, template=str(pdb), translate=arrays[name], atoms=atoms)
+                keys.append(key)
+        LOG.debug(f"Loaded {len(keys)} models into coordinate store")
+        return keys
+
+    def write_model(self, pdb_out: Union[str, Path], helix: np.ndarray, coords: np.ndarray, atoms: np.ndarray) -> None:
+        """
+        Write atoms of one model with new coordinates to PDB file.
+
+        Args:
+            pdb_out (Union[str, Path]): Path to the output PDB file.
+            helix (np.ndarray): Structured atoms of the triple helix.
+            coords (np.ndarray): New coordinates of the selected atoms (M, 3).
+            atoms (np.ndarray): Indices of the selected atoms in helix (M,).
+        """
+        model = pdbio.set_coords(helix[atoms], coords)
+        model['ter'] = np.append(model['chain'][1:] != model['chain'][:-1], True)
+        with open(pdb_out, 'w') as f:
+            f.writelines(pdbio.format_atoms(model))
+            f.write('END\n')
+
+    def set_model(self, store: CoordinateStore, key: str, template: np.ndarray, coords: np.ndarray, atoms: np.ndarray) -> None:
+        """
+        Keep atoms of one model with new coordinates in the coordinate store.
+
+        Args:
+            store (CoordinateStore): Coordinate store of the system.
+            key (str): Model key in the store.
+            template (np.ndarray): Structured atoms of the triple helix.
+            coords (np.ndarray): New coordinates of the selected atoms (M, 3).
+            atoms (np.ndarray): Indices of the selected atoms in template (M,).
+        """
+        model = template[atoms]
+        coords = coords.round(decimals=3)
+        model['x'], model['y'], model['z'] = coords[:, 0], coords[:, 1], coords[:, 2]
+        model['ter'] = np.append(model['chain'][1:] != model['chain'][:-1], True)
+        store.set_model(key, model)
@@ -211,7 +211,12 @@ class GeometryReplacer:
             
             chimera = await self._initialize_chimera(system, config)
             
+            # Chimera works on the caps files: write models kept in memory and read them back after swapping
+            flushed = system.store.keys()
+            system.store.flush(keys=flushed)
             await self._swap_amino_acids(chimera, replace_file, system)
+            for key in flushed:
+                system.store.load(key)
             
             await self._write_final_structure(system, config)
             
@@ -275,7 +280,7 @@ class GeometryReplacer:
             GeometryGenerationError: If swap operation fails
         """
         try:
-            result = chimera.swapaa(
+            result = await chimera.swapaa(
                 replace=replace_file,
                 system_type=system.get_model(model_id=0.0).type
             )
@@ -14,13 +14,14 @@ class Model:
         unit_cell (Optional[List[float]]): Unit cell parameters.
         connect (Optional[List[float]]): List of connected model IDs.
         connect_id (Optional[float]): ID of the connection.
+        crosslink_template (Optional[crosslink.CrosslinkTemplate]): Crosslinks of the template, used instead of reading pdb_file.
         crosslink (List[crosslink.Crosslink]): List of crosslink objects (empty if none present).
         type (str): Type of the model based on crosslinks ('NC' for non-crosslinked).
         cog (np.ndarray): Center of geometry of the model.
     """
     def __init__(self, id: Any, transformation: List[float], unit_cell: Optional[List[float]] = None,
                  connect: Optional[List[float]] = None, connect_id: Optional[float] = None,
-                 pdb_file: Optional[str] = None):
+                 pdb_file: Optional[str] = None, crosslink_template: Optional[crosslink.CrosslinkTemplate] = None):
         self.id = id
         self.transformation = transformation
         self.unit_cell = unit_cell
@@ -28,7 +29,9 @@ class Model:
         self.connect_id = connect_id
         
         self.crosslink = []  
-        if pdb_file:
+        if crosslink_template is not None:
+            self.crosslink = crosslink_template.get_crosslinks(transform=self.transformation, model_id=self.id)
+        elif pdb_file:
             crosslinks = crosslink.read_crosslink(pdb_file=pdb_file)
             if crosslinks: 
                 self.crosslink = self.add_crosslink(crosslinks)
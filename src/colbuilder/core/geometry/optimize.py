@@ -7,6 +7,12 @@ from typing import Dict, List, Optional, Any
 import os
 
 from colbuilder.core.geometry import model
+from colbuilder.core.utils.logger import setup_logger
+
+LOG = setup_logger(__name__)
+
+NODE_RANGE = 1 << 20
+NODE_OFFSET = NODE_RANGE // 2
 
 class Optimizer:
     """
@@ -27,7 +33,8 @@ class Optimizer:
         self.system = system
         self.solution_space = solution_space
         self.t_matrix = system.crystalcontacts.read_t_matrix()
-        self.s_matrix = {k: system.crystal.get_s_matrix(t_matrix=self.t_matrix[k]) for k in self.t_matrix}
+        s_matrices = system.crystal.get_s_matrices(t_matrices=list(self.t_matrix.values()))
+        self.s_matrix = {k: list(s) for k, s in zip(self.t_matrix, s_matrices)}
         self.grid: List[List[float]] = []
 
     def get_grid(self, z_grid: int, s_matrix: Optional[Dict[float, List[int]]] = None) -> np.ndarray:
@@ -146,6 +153,11 @@ class Optimizer:
         Double check based on the point reflection of system: 
         Both added model and point reflection have to be connected to be added.
 
+        All nodes of a plane are scored at once against the unit cells occupied by the system,
+        using the connectivity stencil of Connect. Nodes are then visited in the serial order and
+        every added pair connects the remaining nodes of its neighbourhood (frontier), hence the
+        result is identical to checking each node against the system one at a time.
+
         Args:
             s_matrix (Optional[Dict[float, List[int]]]): The shift matrix to use.
             connect (Any): The connect object.
@@ -160,14 +172,73 @@ class Optimizer:
         d_z = int(self.solution_space[2])
         z_grid = int(max(max(v) for v in s_matrix.values()))
 
+        if not self._is_lattice(system=system):
+            LOG.debug("Models without unit cell in system - optimizing node by node")
+            for plane in range(z_grid - d_z, z_grid + 1):
+                for node in self.set_grid(z_grid=plane, s_matrix=s_matrix):
+                    if self.check_node_connect(connect=connect, system=system, node=node):
+                        pr_node = [-i for i in node]
+                        if self.check_node_connect(connect=connect, system=system, node=pr_node):
+                            self._add_model_pair(system, node, pr_node)
+            return system
+
+        stencil = np.array(sorted(connect.get_stencil(system=system)), dtype=int).reshape(-1, 3)
+        occupied = self.encode_nodes([
+            system.get_model(model_id=model_id).unit_cell for model_id in system.get_models()
+            if system.get_model(model_id=model_id).crosslink
+        ])
+
         for plane in range(z_grid - d_z, z_grid + 1):
-            for node in self.set_grid(z_grid=plane, s_matrix=s_matrix):
-                if self.check_node_connect(connect=connect, system=system, node=node):
-                    pr_node = [-i for i in node]
-                    if self.check_node_connect(connect=connect, system=system, node=pr_node):
-                        self._add_model_pair(system, node, pr_node)
+            nodes = self.set_grid(z_grid=plane, s_matrix=s_matrix)
+            if not nodes or not stencil.size:
+                continue
+            cells = np.rint(np.array(nodes)).astype(int)
+            node_keys = self.encode_nodes(cells)
+            neighbors = self.encode_nodes((cells[:, None, :] + stencil[None, :, :]).reshape(-1, 3))
+            connected = np.isin(neighbors, occupied).reshape(len(cells), -1).any(axis=1)
+
+            for idx, node in enumerate(nodes):
+                if not connected[idx]:
+                    continue
+                pr_neighbors = self.encode_nodes(stencil - cells[idx])
+                if not np.isin(pr_neighbors, occupied).any():
+                    continue
+                pr_node = [-i for i in node]
+                self._add_model_pair(system, node, pr_node)
+                # Frontier: nodes of the plane next to the added pair are connected from now on
+                added = np.array([cells[idx], -cells[idx]])
+                occupied = np.union1d(occupied, self.encode_nodes(added))
+                frontier = self.encode_nodes((added[:, None, :] - stencil[None, :, :]).reshape(-1, 3))
+                connected |= np.isin(node_keys, frontier)
         return system
 
+    def _is_lattice(self, system: Any) -> bool:
+        """
+        Check if all models of the system are placed on the crystal lattice.
+
+        Args:
+            system (Any): The system object.
+
+        Returns:
+            bool: True if every model has a unit cell, False otherwise.
+        """
+        return all(system.get_model(model_id=model_id).unit_cell is not None
+                   for model_id in system.get_models())
+
+    @staticmethod
+    def encode_nodes(nodes: Any) -> np.ndarray:
+        """
+        Encode integer nodes (N, 3) as unique integer keys for fast look-up.
+
+        Args:
+            nodes (Any): Nodes in integer space.
+
+        Returns:
+            np.ndarray: Keys with shape (N,).
+        """
+        nodes = np.rint(np.asarray(nodes, dtype=float)).astype(np.int64).reshape(-1, 3) + NODE_OFFSET
+        return (nodes[:, 0] * NODE_RANGE + nodes[:, 1]) * NODE_RANGE + nodes[:, 2]
+
     def _add_model_pair(self, system: Any, node: List[float], pr_node: List[float]):
         """
         Add a pair of models to the system.
@@ -182,5 +253,5 @@ class Optimizer:
                 id=float(system.get_size()),
                 unit_cell=current_node,
                 transformation=system.crystal.get_t_matrix(s_matrix=current_node),
-                pdb_file=system.crystal.pdb_file
+                crosslink_template=system.crystal.get_crosslink_template()
             ))
@@ -0,0 +1,312 @@
+# Copyright (c) 2024, Colbuilder Development Team
+# Distributed under the terms of the Apache License 2.0
+
+from __future__ import annotations
+import numpy as np
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, TextIO, Tuple, Union
+
+from colbuilder.core.utils import pdbio
+from colbuilder.core.utils.pdbio import ATOM_DTYPE
+from colbuilder.core.utils.logger import setup_logger
+
+LOG = setup_logger(__name__)
+
+class CoordinateStore:
+    """
+    In-memory store of the atoms of all models of a system.
+
+    All atoms are kept in one NumPy structured table (pdbio.ATOM_DTYPE), each model owns a slice of it.
+    Models are addressed by the path of the PDB file they replace, without suffix
+    (e.g. '12' for 12.pdb or 'D/12.caps' for D/12.caps.pdb), and are only written
+    to disk on flush.
+
+    Models can also be instances: a translation of a template, optionally restricted to a
+    subset of its atoms. Only the template and the translations are kept in memory, the atoms
+    of an instance are expanded while writing or once the model is modified.
+
+    Attributes:
+        atoms (np.ndarray): Structured atom table of all models.
+        slices (Dict[str, slice]): Slice of each model in the atom table.
+        pending (Dict[str, np.ndarray]): Models added since the atom table was last built.
+        templates (Dict[str, np.ndarray]): Structured atoms of the templates of instances.
+        chain_ter (Dict[str, bool]): Whether TER records of a template are placed at chain changes,
+            hence have to be placed again for subsets of its atoms.
+        instances (Dict[str, Tuple[str, np.ndarray, Optional[np.ndarray]]]): Template key,
+            translations (K, 3) applied in order, and atom indices (None for all atoms) of each instance.
+    """
+    def __init__(self):
+        self.atoms: np.ndarray = np.empty(0, dtype=ATOM_DTYPE)
+        self.slices: Dict[str, slice] = {}
+        self.pending: Dict[str, np.ndarray] = {}
+        self.templates: Dict[str, np.ndarray] = {}
+        self.chain_ter: Dict[str, bool] = {}
+        self.instances: Dict[str, Tuple[str, np.ndarray, Optional[np.ndarray]]] = {}
+
+    def __contains__(self, key: object) -> bool:
+        return str(key) in self.slices or str(key) in self.pending or str(key) in self.instances
+
+    def __len__(self) -> int:
+        return len(self.keys())
+
+    def keys(self) -> List[str]:
+        """
+        Get keys of all models in the store.
+
+        Returns:
+            List[str]: Model keys in insertion order.
+        """
+        keys = list(self.slices) + [key for key in self.pending if key not in self.slices]
+        return keys + [key for key in self.instances if key not in keys]
+
+    def consolidate(self) -> np.ndarray:
+        """
+        Rebuild the atom table from all models, dropping deleted and replaced slices.
+
+        Returns:
+            np.ndarray: The atom table.
+        """
+        if not self.pending and sum(s.stop - s.start for s in self.slices.values()) == len(self.atoms):
+            return self.atoms
+        models = {key: self.atoms[s] for key, s in self.slices.items() if key not in self.pending}
+        models.update(self.pending)
+        start, slices = 0, {}
+        for key, atoms in models.items():
+            slices[key] = slice(start, start + len(atoms))
+            start += len(atoms)
+        self.atoms = np.concatenate(list(models.values())) if models else np.empty(0, dtype=ATOM_DTYPE)
+        self.slices, self.pending = slices, {}
+        return self.atoms
+
+    def get_model(self, key: Union[str, int]) -> np.ndarray:
+        """
+        Get atoms of a model, the returned view modifies the store in place.
+
+        Args:
+            key (Union[str, int]): Model key.
+
+        Returns:
+            np.ndarray: Structured atoms of the model.
+
+        Raises:
+            KeyError: If the model is not in the store.
+        """
+        key = str(key)
+        if key not in self:
+            raise KeyError(f"Model not in coordinate store: {key}")
+        if key in self.instances:
+            self.set_model(key, self.expand(key))
+        self.consolidate()
+        return self.atoms[self.slices[key]]
+
+    def view_model(self, key: Union[str, int]) -> np.ndarray:
+        """
+        Get atoms of a model for reading, instances are expanded without being stored.
+
+        Args:
+            key (Union[str, int]): Model key.
+
+        Returns:
+            np.ndarray: Structured atoms of the model.
+        """
+        key = str(key)
+        if key in self.instances:
+            return self.expand(key)
+        return self.get_model(key)
+
+    def set_template(self, key: str, atoms: np.ndarray, chain_ter: bool = True) -> None:
+        """
+        Add a template for instances.
+
+        Args:
+            key (str): Template key.
+            atoms (np.ndarray): Structured atoms of the template.
+            chain_ter (bool): TER records are placed at chain changes, otherwise they are kept with their atom.
+        """
+        self.templates[key] = np.asarray(atoms, dtype=ATOM_DTYPE).copy()
+        self.chain_ter[key] = chain_ter
+
+    def set_instance(self, key: Union[str, int], template: str, translate: List[float],
+                     atoms: Optional[np.ndarray] = None) -> None:
+        """
+        Add or replace a model by an instance of a template.
+
+        Args:
+            key (Union[str, int]): Model key.
+            template (str): Template key.
+            translate (List[float]): Translation of the template [x, y, z].
+            atoms (Optional[np.ndarray]): Indices of the template atoms kept in the model, None for all atoms.
+
+        Raises:
+            KeyError: If the template is not in the store.
+        """
+        if template not in self.templates:
+            raise KeyError(f"Template not in coordinate store: {template}")
+        key = str(key)
+        self.slices.pop(key, None)
+        self.pending.pop(key, None)
+        self.instances[key] = (template, np.asarray(translate, dtype=float).reshape(1, 3),
+                               None if atoms is None else np.asarray(atoms, dtype=np.int32))
+
+    def expand(self, key: Union[str, int]) -> np.ndarray:
+        """
+        Expand atoms of an instance: template atoms translated and rounded like written coordinates.
+        TER records of a subset of atoms are placed at chain changes, unless kept with their atom by the template.
+
+        Args:
+            key (Union[str, int]): Model key.
+
+        Returns:
+            np.ndarray: Structured atoms of the model.
+        """
+        template, translations, atoms = self.instances[str(key)]
+        model = self.templates[template].copy() if atoms is None else self.templates[template][atoms]
+        coords = np.column_stack((model['x'], model['y'], model['z']))
+        for translate in translations:
+            coords = np.round(coords + translate, decimals=3)
+        model['x'], model['y'], model['z'] = coords[:, 0], coords[:, 1], coords[:, 2]
+        if atoms is not None and len(model) and self.chain_ter[template]:
+            model['ter'] = np.append(model['chain'][1:] != model['chain'][:-1], True)
+        return model
+
+    def get_transforms(self, keys: Optional[Iterable[Union[str, int]]] = None) -> np.ndarray:
+        """
+        Get total translations of instances relative to their templates.
+
+        Args:
+            keys (Optional[Iterable[Union[str, int]]]): Model keys. If None, all instances.
+
+        Returns:
+            np.ndarray: Translations with shape (N, 3).
+        """
+        keys = list(self.instances) if keys is None else [str(k) for k in keys]
+        return np.array([self.instances[key][1].sum(axis=0) for key in keys], dtype=float).reshape(-1, 3)
+
+    def set_model(self, key: Union[str, int], atoms: np.ndarray) -> None:
+        """
+        Add or replace atoms of a model.
+
+        Args:
+            key (Union[str, int]): Model key.
+            atoms (np.ndarray): Structured atoms of the model.
+        """
+        key = str(key)
+        self.instances.pop(key, None)
+        if key in self.slices and key not in self.pending:
+            s = self.slices[key]
+            if s.stop - s.start == len(atoms):
+                self.atoms[s] = atoms
+                return
+        self.pending[key] = np.asarray(atoms, dtype=ATOM_DTYPE).copy()
+
+    def delete_model(self, key: Union[str, int]) -> None:
+        """
+        Delete a model from the store.
+
+        Args:
+            key (Union[str, int]): Model key.
+        """
+        key = str(key)
+        self.slices.pop(key, None)
+        self.pending.pop(key, None)
+        self.instances.pop(key, None)
+
+    def get_coords(self, key: Union[str, int]) -> np.ndarray:
+        """
+        Get coordinates of a model.
+
+        Args:
+            key (Union[str, int]): Model key.
+
+        Returns:
+            np.ndarray: Coordinates with shape (N, 3).
+        """
+        return pdbio.get_coords(self.view_model(key))
+
+    def translate(self, keys: Iterable[Union[str, int]], translate: List[float]) -> None:
+        """
+        Translate models in place.
+
+        Args:
+            keys (Iterable[Union[str, int]]): Model keys.
+            translate (List[float]): Translation vector [x, y, z].
+        """
+        for key in keys:
+            if str(key) in self.instances:
+                template, translations, atoms = self.instances[str(key)]
+                translations = np.vstack((translations, np.asarray(translate, dtype=float).reshape(1, 3)))
+                self.instances[str(key)] = (template, translations, atoms)
+                continue
+            atoms = self.get_model(key)
+            for axis, value in zip(('x', 'y', 'z'), translate):
+                atoms[axis] = np.round(atoms[axis] + value, decimals=3)
+
+    def read_atoms(self, lines: Iterable[str]) -> np.ndarray:
+        """
+        Parse ATOM/HETATM records, a TER record flags the atom before it.
+
+        Args:
+            lines (Iterable[str]): Lines of a PDB file.
+
+        Returns:
+            np.ndarray: Structured atoms.
+        """
+        return pdbio.parse_atoms(list(lines))
+
+    def format_atoms(self, atoms: np.ndarray) -> List[str]:
+        """
+        Format structured atoms as PDB lines, followed by TER where flagged.
+
+        Args:
+            atoms (np.ndarray): Structured atoms.
+
+        Returns:
+            List[str]: Lines of a PDB file.
+        """
+        return pdbio.format_atoms(atoms)
+
+    def load(self, key: Union[str, int], pdb: Optional[Union[str, Path]] = None) -> np.ndarray:
+        """
+        Load a model from a PDB file into the store.
+
+        Args:
+            key (Union[str, int]): Model key.
+            pdb (Optional[Union[str, Path]]): Path to the PDB file. If None, uses <key>.pdb.
+
+        Returns:
+            np.ndarray: Structured atoms of the model.
+        """
+        pdb = Path(pdb) if pdb else Path(f"{key}.pdb")
+        self.set_model(key, pdbio.read_atoms(pdb))
+        return self.get_model(key)
+
+    def write_model(self, key: Union[str, int], f: TextIO) -> None:
+        """
+        Write atom records of a model to an open file.
+
+        Args:
+            key (Union[str, int]): Model key.
+            f (TextIO): File handle to write to.
+        """
+        f.writelines(self.format_atoms(self.view_model(key)))
+
+    def flush(self, keys: Optional[Iterable[Union[str, int]]] = None) -> List[Path]:
+        """
+        Write models to <key>.pdb.
+
+        Args:
+            keys (Optional[Iterable[Union[str, int]]]): Model keys. If None, all models are written.
+
+        Returns:
+            List[Path]: Paths of the written PDB files.
+        """
+        written = []
+        for key in (self.keys() if keys is None else [str(k) for k in keys]):
+            pdb = Path(f"{key}.pdb")
+            pdb.parent.mkdir(parents=True, exist_ok=True)
+            with open(pdb, 'w') as f:
+                self.write_model(key, f)
+                f.write('END\n')
+            written.append(pdb)
+        LOG.debug(f"Flushed {len(written)} models from coordinate store")
+        return written
@@ -8,6 +8,8 @@ import numpy as np
 import os
 import shutil
 
+from colbuilder.core.geometry.store import CoordinateStore
+from colbuilder.core.utils import pdbio
 from colbuilder.core.utils.logger import setup_logger
 
 LOG = setup_logger(__name__)
@@ -40,6 +42,10 @@ class System:
         Type of the system.
     pdb_fibril : Path
         Path to the PDB file of the fibril.
+    store : CoordinateStore
+        In-memory atoms of all models, written to disk only on request.
+    instanced : bool
+        Whether models are kept as one template plus a translation per model, expanded only when written.
     """
 
     def __init__(self, crystal: Optional[Any] = None, crystalcontacts: Optional[Any] = None, pdb_fibril: Path = Path()):
@@ -53,6 +59,8 @@ class System:
         self.size: int = 0
         self.type: str = ''
         self.pdb_fibril: Path = pdb_fibril
+        self.store: CoordinateStore = CoordinateStore()
+        self.instanced: bool = True
 
     def add_model(self, model: Any) -> None:
         """
@@ -177,6 +185,10 @@ class System:
         for model in self.system.values():
             if model.connect is not None:
                 for connect_id in model.connect:
+                    key = self.get_caps_key(model_type=model.type, model_id=connect_id)
+                    if key in self.store:
+                        self.store.translate(keys=[key], translate=translate)
+                        continue
                     crystal.translate_crystal(
                         pdb=Path(model.type) / f"{int(connect_id)}.caps.pdb",
                         translate=translate,
@@ -201,6 +213,10 @@ class System:
         for model_id in self.get_models():
             if self.get_model(model_id=model_id).connect is not None:
                 for connect_id in self.get_model(model_id=model_id).connect:
+                    key = self.get_caps_key(model_type=self.get_model(model_id=model_id).type, model_id=connect_id)
+                    if key in self.store:
+                        cog.append(np.nanmean(self.store.view_model(key)['z']))
+                        continue
                     full_path = f"{self.get_model(model_id=model_id).type}/{int(connect_id)}.caps.pdb"
                     try:
                         cog.append(crystal.get_cog(pdb=full_path))
@@ -209,6 +225,24 @@ class System:
                         continue
         return np.mean(cog)
 
+    def get_caps_key(self, model_type: str, model_id: float) -> str:
+        """
+        Get key of a capped model in the coordinate store.
+
+        Parameters
+        ----------
+        model_type : str
+            Type of the model, also the directory of its caps file.
+        model_id : float
+            The ID of the model.
+
+        Returns
+        -------
+        str
+            Path of the caps file without suffix, e.g. 'D/12.caps'.
+        """
+        return f"{model_type}/{int(model_id)}.caps"
+
     def count_states(self, state: str) -> int:
         """
         Count all models with a certain state.
@@ -250,6 +284,21 @@ class System:
         except Exception as e:
             LOG.warning(f"Failed to remove directory {directory_path}: {str(e)}")
 
+    def write_caps_pdb(self, f: Any, caps_pdb: Path) -> None:
+        """
+        Write atoms of a caps file to an open PDB file, HETATM records are written as ATOM.
+
+        Parameters
+        ----------
+        f : Any
+            File handle to write to.
+        caps_pdb : Path
+            Path to the caps file.
+        """
+        atoms = pdbio.read_atoms(caps_pdb)
+        atoms['record'][atoms['record'] == 'HETATM'] = 'ATOM  '
+        f.writelines(pdbio.format_atoms(atoms))
+
     def write_pdb(self, pdb_out: Union[str, Path], fibril_length: float, cleanup: bool = True):
         """
         Write the system to a PDB file and optionally cleanup temporary files.
@@ -280,29 +329,26 @@ class System:
                     if model.connect is not None:
                         if len(model.connect) != 1 or fibril_length <= 300:
                             for connect in model.connect:
+                                key = self.get_caps_key(model_type=model_type, model_id=connect)
+                                if key in self.store:
+                                    self.store.write_model(key, f)
+                                    continue
                                 caps_pdb = Path(model_type) / f"{int(connect)}.caps.pdb"
                                 if not caps_pdb.exists():
                                     LOG.warning(f"Caps PDB file not found: {caps_pdb}")
                                     continue
-                                pdb_model = open(caps_pdb, 'r').readlines()
-                                for line in pdb_model:
-                                    if line.startswith(self.is_line) or line.startswith('TER'):
-                                        if line.startswith('HETATM'):
-                                            line = 'ATOM  ' + line[6:]
-                                        f.write(line)
+                                self.write_caps_pdb(f, caps_pdb)
                     else:
+                        key = self.get_caps_key(model_type=model_type, model_id=model.id)
+                        if key in self.store:
+                            self.store.write_model(key, f)
+                            continue
                         caps_pdb = Path(model_type) / f"{int(model.id)}.caps.pdb"
                         if not caps_pdb.exists():
                             LOG.warning(f"Caps PDB file not found: {caps_pdb}")
                             continue
                         try:
-                            with open(caps_pdb, 'r') as model_file:
-                                pdb_model = model_file.readlines()
-                                for line in pdb_model:
-                                    if line.startswith(self.is_line) or line.startswith('TER'):
-                                        if line.startswith('HETATM'):
-                                            line = 'ATOM  ' + line[6:]
-                                        f.write(line)
+                            self.write_caps_pdb(f, caps_pdb)
                         except Exception as e:
                             LOG.error(f"Error reading caps PDB file {caps_pdb}: {str(e)}")
                             continue
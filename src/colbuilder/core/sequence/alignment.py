@@ -2,7 +2,6 @@
 # Distributed under the terms of the Apache License 2.0
 
 import os
-import subprocess
 import tempfile
 import shutil
 from typing import List, Dict, Tuple
@@ -14,6 +13,7 @@ from pathlib import Path
 
 from colbuilder.core.utils.dec import timeit
 from colbuilder.core.utils.logger import setup_logger
+from colbuilder.core.utils.runner import run_command
 
 LOG = setup_logger(__name__)
 
@@ -163,7 +163,7 @@ class Alignment:
                 aligned_seq_list[new_pos] = 'O'
         return "".join(aligned_seq_list)
 
-    def get_muscle_version(self) -> str:
+    async def get_muscle_version(self) -> str:
         """
         Get the version of the MUSCLE tool.
 
@@ -173,13 +173,12 @@ class Alignment:
         Raises:
             RuntimeError: If MUSCLE is not installed or not found in PATH.
         """
-        try:
-            result = subprocess.run(["muscle", "-version"], capture_output=True, text=True, check=True)
-            return result.stdout.strip()
-        except subprocess.CalledProcessError:
+        result = await run_command(["muscle", "-version"], check=False)
+        if result.returncode != 0:
             raise RuntimeError("MUSCLE is not installed or not found in PATH.")
+        return result.stdout.strip()
 
-    def align_sequences_with_muscle(self, input_path: str, output_path: str) -> None:
+    async def align_sequences_with_muscle(self, input_path: str, output_path: str) -> None:
         """
         Align sequences using MUSCLE.
 
@@ -190,14 +189,13 @@ class Alignment:
         Raises:
             RuntimeError: If MUSCLE alignment fails.
         """
-        muscle_version = self.get_muscle_version()
+        muscle_version = await self.get_muscle_version()
         if "3.8" in muscle_version:
             muscle_command = ["muscle", "-in", input_path, "-out", output_path]
         else:
             muscle_command = ["muscle", "-align", input_path, "-output", output_path]
-        try:
-            subprocess.run(muscle_command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        except subprocess.CalledProcessError:
+        result = await run_command(muscle_command, check=False)
+        if result.returncode != 0:
             raise RuntimeError("MUSCLE alignment failed.")
         
     def extract_last_atom_serial_number(self, pdb_file: str) -> str:
@@ -253,7 +251,7 @@ class Alignment:
         return [SeqRecord(Seq(str(seq.seq).ljust(max_length, '-')), id=seq.id, description=seq.description) for seq in sequences]
 
     @timeit
-    def align_sequences(self) -> Tuple[str, str]:
+    async def align_sequences(self) -> Tuple[str, str]:
         """
         Align input sequences with template sequences and restore hydroxyprolines.
 
@@ -275,7 +273,7 @@ class Alignment:
             temp_input_aligned_path = os.path.join(self.temp_dir, f"{self.output_prefix}_input_aligned.afa")
 
             SeqIO.write(input_modified_sequences, temp_input_path, "fasta")
-            self.align_sequences_with_muscle(temp_input_path, temp_input_aligned_path)
+            await self.align_sequences_with_muscle(temp_input_path, temp_input_aligned_path)
         
             input_aligned_sequences = list(SeqIO.parse(temp_input_aligned_path, "fasta"))
 
@@ -291,7 +289,7 @@ class Alignment:
             temp_final_aligned_path = os.path.join(self.temp_dir, f"{self.output_prefix}_final_aligned.afa")
 
             SeqIO.write(combined_sequences, temp_combined_path, "fasta")
-            self.align_sequences_with_muscle(temp_combined_path, temp_final_aligned_path)
+            await self.align_sequences_with_muscle(temp_combined_path, temp_final_aligned_path)
 
             final_aligned_sequences = list(SeqIO.parse(temp_final_aligned_path, "fasta"))
 
@@ -340,7 +338,7 @@ class Alignment:
             raise
 
 @timeit
-def align_sequences(input_fasta_path: Path, template_fasta_path: Path, output_prefix: str, template_pdb: Path) -> t.Tuple[str, str]:
+async def align_sequences(input_fasta_path: Path, template_fasta_path: Path, output_prefix: str, template_pdb: Path) -> t.Tuple[str, str]:
     """
     Align input sequences with template sequences and restore hydroxyprolines.
 
@@ -359,7 +357,7 @@ def align_sequences(input_fasta_path: Path, template_fasta_path: Path, output_pr
     try:
         LOG.debug(f"Starting alignment process with input: {input_fasta_path}")
         alignment = Alignment(input_fasta_path, template_fasta_path, output_prefix, template_pdb)
-        msa_output, modeller_output = alignment.align_sequences()
+        msa_output, modeller_output = await alignment.align_sequences()
         LOG.debug("Alignment process completed successfully")
         return msa_output, modeller_output
     except Exception as e:
@@ -17,10 +17,12 @@ appropriate attribution in your work.
 
 import os
 from typing import Optional, List, Tuple
+import numpy as np
 import pandas as pd
 from modeller import Environ
 from modeller.scripts import complete_pdb
 
+from colbuilder.core.utils import pdbio
 from colbuilder.core.utils.logger import setup_logger
 from colbuilder.core.utils.dec import timeit
 from colbuilder.core.utils.config import ColbuilderConfig
@@ -41,16 +43,10 @@ def rename_residue_in_pdb(pdb_file: str, chain_id: str, original_resnum: int, ne
         IOError: If there's an issue reading or writing the PDB file.
     """
     try:
-        with open(pdb_file, "r") as file:
-            lines = file.readlines()
-        with open(pdb_file, "w") as file:
-            for line in lines:
-                if line.startswith(("ATOM", "HETATM")):
-                    res_num = int(line[22:26].strip())
-                    chain = line[21].strip()
-                    if res_num == original_resnum and chain == chain_id:
-                        line = f"{line[:17]}{new_resname}{line[20:]}"
-                file.write(line)
+        atoms = pdbio.read_atoms(pdb_file)
+        residue = (atoms['resid'].astype(int) == original_resnum) & (np.char.strip(atoms['chain']) == chain_id)
+        atoms['resname'][residue] = [f"{new_resname}{resname[3:]}" for resname in atoms['resname'][residue]]
+        pdbio.update_atoms(pdb_file, atoms)
     except IOError as e:
         LOG.error(f"Error renaming residue in PDB file: {str(e)}")
         raise
@@ -1,5 +1,7 @@
+import copy
+import multiprocessing
 import numpy as np
-from scipy.spatial.transform import Rotation
+from concurrent.futures import ProcessPoolExecutor
 from Bio import PDB
 import random
 import warnings
@@ -8,6 +10,7 @@ from collections import defaultdict
 from pathlib import Path
 from typing import Dict, Tuple, Any, Optional, Union, List
 import numpy.typing as npt
+from Bio.PDB.Atom import Atom
 from Bio.PDB.Residue import Residue
 from Bio.PDB.Structure import Structure
 from Bio.PDB.Chain import Chain
@@ -32,6 +35,69 @@ def distance(coord1: npt.NDArray[np.float64], coord2: npt.NDArray[np.float64]) -
     """Calculate Euclidean distance between two coordinates."""
     return np.linalg.norm(coord1 - coord2)
 
+class ResidueIndex:
+    """
+    Lookup of the residues and atoms of the first model of a structure by chain and residue number.
+
+    Built once per structure by build_residue_index and kept in structure.xtra. Atoms are
+    indexed, not coordinates, as moves assign new coordinate arrays to the atoms. Adding or
+    removing residues or atoms requires invalidate_residue_index.
+    """
+
+    def __init__(self, structure: PDB.Structure.Structure):
+        self.structure = structure
+        self.chains = set()
+        self.residues: Dict[Tuple[str, int], Residue] = {}
+        self.atoms: Dict[Tuple[str, int, str], Atom] = {}
+        for chain in structure[0]:
+            self.chains.add(chain.id)
+            for residue in chain:
+                key = (chain.id, residue.id[1])
+                if key in self.residues:
+                    continue
+                self.residues[key] = residue
+                for atom in residue:
+                    self.atoms[key + (atom.get_id(),)] = atom
+
+def build_residue_index(structure: PDB.Structure.Structure) -> ResidueIndex:
+    """Build the residue index of a structure and keep it in structure.xtra."""
+    index = ResidueIndex(structure)
+    structure.xtra['residue_index'] = index
+    return index
+
+def invalidate_residue_index(structure: PDB.Structure.Structure) -> None:
+    """Drop the residue index of a structure after a structural change."""
+    structure.xtra.pop('residue_index', None)
+
+def get_residue_index(structure: PDB.Structure.Structure) -> ResidueIndex:
+    """Get the residue index of a structure, building it if missing or copied from another structure."""
+    index = structure.xtra.get('residue_index')
+    if index is None or index.structure is not structure:
+        index = build_residue_index(structure)
+    return index
+
+def get_residue(structure: PDB.Structure.Structure,
+                chain_id: str,
+                residue_id: Union[str, int]) -> Optional[Residue]:
+    """
+    Get a residue of a structure by chain and residue number.
+
+    Args:
+        structure: PDB structure
+        chain_id: Chain identifier
+        residue_id: Residue number
+
+    Returns:
+        Residue, or None if not found in the chain
+
+    Raises:
+        KeyError: If chain not found in structure
+    """
+    index = get_residue_index(structure)
+    if chain_id not in index.chains:
+        raise KeyError(chain_id)
+    return index.residues.get((chain_id, int(residue_id)))
+
 def get_atom_coords(structure: PDB.Structure.Structure, 
                    chain_id: str, 
                    residue_id: str, 
@@ -51,11 +117,12 @@ def get_atom_coords(structure: PDB.Structure.Structure,
     Raises:
         ValueError: If atom not found in structure
     """
-    chain = structure[0][chain_id]
-    for residue in chain:
-        if residue.id[1] == int(residue_id):
-            return residue[atom_name].coord
-    raise ValueError(f"Atom {atom_name} in residue {residue_id} not found in chain {chain_id}")
+    atom = get_residue_index(structure).atoms.get((chain_id, int(residue_id), atom_name))
+    if atom is None:
+        if get_residue(structure, chain_id, residue_id) is None:
+            raise ValueError(f"Atom {atom_name} in residue {residue_id} not found in chain {chain_id}")
+        raise KeyError(atom_name)
+    return atom.coord
 
 def get_distances(structures: Dict[str, PDB.Structure.Structure],
                  crosslink: Dict[str, Dict[str, Any]]) -> Tuple[float, float]:
@@ -173,6 +240,44 @@ def log_crosslink_info(crosslink: Dict[str, Dict[str, str]], index: int) -> None
            LOG.debug(f"Atom 1: {res_info['atom31']}")
            LOG.debug(f"Atom 2: {res_info['atom32']}")
 
+BACKBONE_ATOMS = ('N', 'CA', 'C', 'O')
+
+def get_rotation_matrix(axis: npt.NDArray[np.float64], angle: float) -> npt.NDArray[np.float64]:
+   """Get the 3x3 matrix of a rotation by angle around axis (Rodrigues)."""
+   k = axis / np.linalg.norm(axis)
+   cross = np.array([[0.0, -k[2], k[1]],
+                     [k[2], 0.0, -k[0]],
+                     [-k[1], k[0], 0.0]])
+   return np.eye(3) + np.sin(angle) * cross + (1 - np.cos(angle)) * (cross @ cross)
+
+def get_rotation_matrices(axes: npt.NDArray[np.float64], angles: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+   """Get the stacked (M,3,3) matrices of rotations by angles around axes (Rodrigues)."""
+   k = axes / np.linalg.norm(axes, axis=1, keepdims=True)
+   cross = np.zeros((len(k), 3, 3))
+   cross[:, 0, 1], cross[:, 0, 2] = -k[:, 2], k[:, 1]
+   cross[:, 1, 0], cross[:, 1, 2] = k[:, 2], -k[:, 0]
+   cross[:, 2, 0], cross[:, 2, 1] = -k[:, 1], k[:, 0]
+   sin = np.sin(angles)[:, None, None]
+   cos = np.cos(angles)[:, None, None]
+   return np.eye(3) + sin * cross + (1 - cos) * (cross @ cross)
+
+def rotate_coords(coords: npt.NDArray[np.float64],
+                  rotation_matrix: npt.NDArray[np.float64],
+                  center: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+   """Rotate (N,3) coordinates by a rotation matrix around a center."""
+   return (coords - center) @ rotation_matrix.T + center
+
+def rotate_atoms(atoms: List[Atom],
+                 rotation_matrix: npt.NDArray[np.float64],
+                 center: npt.NDArray[np.float64]) -> None:
+   """Rotate atoms around a center: gather their coordinates into one (N,3) array, rotate and scatter back."""
+   if not atoms:
+       return
+   coords = np.array([atom.coord for atom in atoms], dtype=np.float64)
+   coords = rotate_coords(coords, rotation_matrix, np.array(center, dtype=np.float64))
+   for atom, coord in zip(atoms, coords):
+       atom.coord = coord
+
 class TransformationTracker:
    """Tracks and applies geometric transformations to protein structure residues."""
    
@@ -259,70 +364,63 @@ class TransformationTracker:
 
    def _apply_chi1_rotation(self, structure: Structure, chain_id: str, residue_id: int, angle: float) -> None:
        """Apply chi1 rotation to a residue."""
-       chain = structure[0][chain_id]
-       for residue in chain:
-           if residue.id[1] == residue_id:
-               backbone_atoms = set(['N', 'CA', 'C', 'O'])
-               side_chain_atoms = [atom for atom in residue if atom.name not in backbone_atoms]
-               if not side_chain_atoms:
-                   return
+       residue = get_residue(structure, chain_id, residue_id)
+       if residue is None:
+           return
+       backbone_atoms = set(['N', 'CA', 'C', 'O'])
+       side_chain_atoms = [atom for atom in residue if atom.name not in backbone_atoms]
+       if not side_chain_atoms:
+           return
                
-               axis = get_chi1_axis(residue)
-               for atom in side_chain_atoms:
-                   if atom.name != 'CB':
-                       atom.coord = rotate_around_axis(atom.coord, axis, angle, residue['CB'].coord)
+       axis = get_chi1_axis(residue)
+       rotate_atoms([atom for atom in side_chain_atoms if atom.name != 'CB'],
+                    get_rotation_matrix(axis, angle), residue['CB'].coord)
 
    def _apply_chi2_rotation(self, structure: Structure, chain_id: str, residue_id: int, angle: float) -> None:
        """Apply chi2 rotation to a residue."""
-       chain = structure[0][chain_id]
-       for residue in chain:
-           if residue.id[1] == residue_id:
-               if 'CG' not in residue:
-                   return
+       residue = get_residue(structure, chain_id, residue_id)
+       if residue is None:
+           return
+       if 'CG' not in residue:
+           return
                    
-               backbone_atoms = set(['N', 'CA', 'C', 'O'])
-               side_chain_atoms = [atom for atom in residue if atom.name not in backbone_atoms]
+       backbone_atoms = set(['N', 'CA', 'C', 'O'])
+       side_chain_atoms = [atom for atom in residue if atom.name not in backbone_atoms]
                
-               axis = get_chi2_axis(residue)
-               for atom in side_chain_atoms:
-                   if atom.name not in ['CB', 'CG']:
-                       atom.coord = rotate_around_axis(atom.coord, axis, angle, residue['CG'].coord)
+       axis = get_chi2_axis(residue)
+       rotate_atoms([atom for atom in side_chain_atoms if atom.name not in ['CB', 'CG']],
+                    get_rotation_matrix(axis, angle), residue['CG'].coord)
 
    def _apply_rotation_matrix(self, structure: Structure, chain_id: str, residue_id: int, 
                             rotation_matrix: npt.NDArray[np.float64]) -> None:
        """Apply general rotation matrix to residue side chain."""
-       chain = structure[0][chain_id]
-       for residue in chain:
-           if residue.id[1] == residue_id:
-               backbone_atoms = set(['N', 'CA', 'C', 'O'])
-               side_chain_atoms = [atom for atom in residue if atom.name not in backbone_atoms]
+       residue = get_residue(structure, chain_id, residue_id)
+       if residue is None:
+           return
+       backbone_atoms = set(['N', 'CA', 'C', 'O'])
+       side_chain_atoms = [atom for atom in residue if atom.name not in backbone_atoms]
                
-               center = residue['CB'].coord if 'CB' in residue else residue['CA'].coord
-               for atom in side_chain_atoms:
-                   atom.coord = np.dot(rotation_matrix, atom.coord - center) + center
+       center = residue['CB'].coord if 'CB' in residue else residue['CA'].coord
+       rotate_atoms(side_chain_atoms, rotation_matrix, center)
 
    def _apply_relative_backbone(self, structure: Structure, chain_id: str, residue_id: int, angle: float) -> None:
        """Apply rotation relative to backbone plane."""
-       chain = structure[0][chain_id]
-       for residue in chain:
-           if residue.id[1] == residue_id:
-               backbone_atoms = set(['N', 'CA', 'C', 'O'])
-               side_chain_atoms = [atom for atom in residue if atom.name not in backbone_atoms]
-               if not side_chain_atoms:
-                   return
+       residue = get_residue(structure, chain_id, residue_id)
+       if residue is None:
+           return
+       backbone_atoms = set(['N', 'CA', 'C', 'O'])
+       side_chain_atoms = [atom for atom in residue if atom.name not in backbone_atoms]
+       if not side_chain_atoms:
+           return
                
-               backbone_normal = get_backbone_plane(residue)
-               ca_coord = residue['CA'].coord
-               cb_coord = residue['CB'].coord if 'CB' in residue else None
+       backbone_normal = get_backbone_plane(residue)
+       ca_coord = residue['CA'].coord
+       cb_coord = residue['CB'].coord if 'CB' in residue else None
                
-               if cb_coord is not None:
-                   ca_cb = cb_coord - ca_coord
-                   rotation_axis = np.cross(backbone_normal, ca_cb)
-                   rotation_axis = rotation_axis / np.linalg.norm(rotation_axis)
-                   rotation = Rotation.from_rotvec(angle * rotation_axis)
-                   
-                   for atom in side_chain_atoms:
-                       atom.coord = ca_coord + rotation.apply(atom.coord - ca_coord)
+       if cb_coord is not None:
+           ca_cb = cb_coord - ca_coord
+           rotation_axis = np.cross(backbone_normal, ca_cb)
+           rotate_atoms(side_chain_atoms, get_rotation_matrix(rotation_axis, angle), ca_coord)
 
 def rotate_backbone(structure: Structure, 
                   chain_id: str, 
@@ -344,198 +442,269 @@ def rotate_backbone(structure: Structure,
        structure_id: Optional structure identifier for tracking
    """
    chain = structure[0][chain_id]
-   for residue in chain:
-       if residue.id[1] == int(residue_id):
-           if residue.id[1] <= 1 or residue.id[1] >= len(chain) - 1:
-               return
+   residue = get_residue(structure, chain_id, residue_id)
+   if residue is None:
+       return
+   if residue.id[1] <= 1 or residue.id[1] >= len(chain) - 1:
+       return
            
-           atoms = get_phi_psi_atoms(residue)
-           if not atoms:
-               return
+   atoms = get_phi_psi_atoms(residue)
+   if not atoms:
+       return
            
-           if tracker and structure_id:
-               tracker.add_transformation(structure_id, chain_id, residue_id,
-                                       'backbone',
-                                       {'angle': angle,
-                                        'angle_type': angle_type})
+   if tracker and structure_id:
+       tracker.add_transformation(structure_id, chain_id, residue_id,
+                               'backbone',
+                               {'angle': angle,
+                                'angle_type': angle_type})
            
-           if angle_type == 'phi':
-               rotation_axis = atoms['phi']['CA'] - atoms['phi']['N']
-               rotation_axis = rotation_axis / np.linalg.norm(rotation_axis)
-               center = atoms['phi']['N']
-               
-               for atom in residue:
-                   if atom.name != 'N':
-                       atom.coord = rotate_around_axis(atom.coord, rotation_axis, angle, center)
-               
-               start_id, end_id = atoms['range']
-               for res_idx in range(residue.id[1] + 1, end_id + 1):
-                   if res_idx in chain:
-                       for atom in chain[res_idx]:
-                           atom.coord = rotate_around_axis(atom.coord, rotation_axis, angle, center)
-                       
-           elif angle_type == 'psi':
-               rotation_axis = atoms['psi']['C'] - atoms['psi']['CA']
-               rotation_axis = rotation_axis / np.linalg.norm(rotation_axis)
-               center = atoms['psi']['CA']
-               
-               for atom in residue:
-                   if atom.name not in ['N', 'CA']:
-                       atom.coord = rotate_around_axis(atom.coord, rotation_axis, angle, center)
-               
-               start_id, end_id = atoms['range']
-               for res_idx in range(residue.id[1] + 1, end_id + 1):
-                   if res_idx in chain:
-                       for atom in chain[res_idx]:
-                           atom.coord = rotate_around_axis(atom.coord, rotation_axis, angle, center)
-
-def rotate_relative_to_backbone(structure: Structure, 
-                             chain_id: str, 
-                             residue_id: int, 
-                             angle: float,
-                             tracker: Optional[TransformationTracker] = None, 
-                             structure_id: Optional[str] = None) -> None:
+   if angle_type == 'phi':
+       rotation_axis = atoms['phi']['CA'] - atoms['phi']['N']
+       center = atoms['phi']['N']
+       fixed = ['N']
+   elif angle_type == 'psi':
+       rotation_axis = atoms['psi']['C'] - atoms['psi']['CA']
+       center = atoms['psi']['CA']
+       fixed = ['N', 'CA']
+   else:
+       return
+
+   moved = [atom for atom in residue if atom.name not in fixed]
+   start_id, end_id = atoms['range']
+   for res_idx in range(residue.id[1] + 1, end_id + 1):
+       if res_idx in chain:
+           moved.extend(chain[res_idx])
+   rotate_atoms(moved, get_rotation_matrix(rotation_axis, angle), center)
+
+class CrosslinkResidue:
    """
-   Rotate side chain relative to backbone plane with optional transformation tracking.
+   Coordinates of a crosslinked residue as (N,3) array.
 
-   Args:
-       structure: PDB structure to modify
-       chain_id: Chain identifier
-       residue_id: Residue number to rotate
-       angle: Rotation angle in radians
-       tracker: Optional transformation tracker
-       structure_id: Optional structure identifier for tracking
+   Monte Carlo moves change the array only. The Bio.PDB structure is updated once by
+   write_back, so trial moves and snapshots never copy the structure. Backbone moves
+   of rotate_backbone end at the rotated residue, so the residue holds all atoms a move
+   can change.
    """
-   chain = structure[0][chain_id]
-   for residue in chain:
-       if residue.id[1] == int(residue_id):
-           backbone_atoms = set(['N', 'CA', 'C', 'O'])
-           side_chain_atoms = [atom for atom in residue if atom.name not in backbone_atoms]
-           if not side_chain_atoms:
-               return
-           
-           backbone_normal = get_backbone_plane(residue)
-           ca_coord = residue['CA'].coord
-           cb_coord = residue['CB'].coord if 'CB' in residue else None
-           
-           if cb_coord is not None:
-               if tracker and structure_id:
-                   tracker.add_transformation(structure_id, chain_id, residue_id,
-                                           'relative_backbone',
-                                           {'angle': angle})
-               
-               ca_cb = cb_coord - ca_coord
-               rotation_axis = np.cross(backbone_normal, ca_cb)
-               rotation_axis = rotation_axis / np.linalg.norm(rotation_axis)
-               rotation = Rotation.from_rotvec(angle * rotation_axis)
-               
-               for atom in side_chain_atoms:
-                   atom.coord = ca_coord + rotation.apply(atom.coord - ca_coord)
-
-def rotate_side_chain(structure: Structure, 
-                    chain_id: str, 
-                    residue_id: int, 
-                    rotation_matrix: npt.NDArray[np.float64],
-                    tracker: Optional[TransformationTracker] = None,
-                    structure_id: Optional[str] = None) -> None:
+
+   def __init__(self, structure: Structure, chain_id: str, residue_id: str):
+       residue = get_residue(structure, chain_id, residue_id)
+       if residue is None:
+           raise ValueError(f"Residue {residue_id} not found in chain {chain_id}")
+       self.chain_id = chain_id
+       self.residue_id = residue_id
+       self.atoms = list(residue)
+       self.names = [atom.name for atom in self.atoms]
+       self.index = {name: i for i, name in enumerate(self.names)}
+       self.coords = np.array([atom.coord for atom in self.atoms], dtype=np.float64)
+       self.side_chain = np.array([name not in BACKBONE_ATOMS for name in self.names])
+       self.movable_backbone = get_phi_psi_atoms(residue) is not None
+
+   def get(self, atom_name: str) -> npt.NDArray[np.float64]:
+       """Get coordinates of an atom."""
+       return self.coords[self.index[atom_name]]
+
+   def get_mask(self, exclude: Tuple[str, ...], side_chain: bool = True) -> npt.NDArray[np.bool_]:
+       """Get mask of the atoms of the side chain (or of all atoms) except the excluded ones."""
+       mask = self.side_chain.copy() if side_chain else np.ones(len(self.names), dtype=bool)
+       for name in exclude:
+           if name in self.index:
+               mask[self.index[name]] = False
+       return mask
+
+   def rotate(self, mask: npt.NDArray[np.bool_], rotation_matrix: npt.NDArray[np.float64],
+              center: npt.NDArray[np.float64]) -> None:
+       """Rotate the masked atoms around a center."""
+       self.coords[mask] = rotate_coords(self.coords[mask], rotation_matrix, center.copy())
+
+   def __getstate__(self) -> Dict[str, Any]:
+       """Pickle without the atoms, which would pull in the whole structure."""
+       state = self.__dict__.copy()
+       state['atoms'] = None
+       return state
+
+   def write_back(self) -> None:
+       """Write the coordinates to the atoms of the structure."""
+       for atom, coord in zip(self.atoms, self.coords):
+           atom.coord = coord.copy()
+
+   def get_backbone_move(self, angle: float, angle_type: str = 'phi') -> Optional[Dict[str, Any]]:
+       """Get a rotation around phi or psi angle, see rotate_backbone. None if the backbone is fixed."""
+       if not self.movable_backbone:
+           return None
+       move = {'type': 'backbone', 'params': {'angle': angle, 'angle_type': angle_type}, 'angle': angle}
+       if angle_type == 'phi':
+           move.update(axis=self.get('CA') - self.get('N'), center=self.get('N').copy(),
+                       mask=self.get_mask(('N',), side_chain=False))
+       elif angle_type == 'psi':
+           move.update(axis=self.get('C') - self.get('CA'), center=self.get('CA').copy(),
+                       mask=self.get_mask(('N', 'CA'), side_chain=False))
+       else:
+           move.update(axis=np.array([1.0, 0.0, 0.0]), center=np.zeros(3), mask=np.zeros(len(self.names), dtype=bool))
+       return move
+
+   def get_relative_move(self, angle: float) -> Optional[Dict[str, Any]]:
+       """Get a side chain rotation around CA, perpendicular to CA-CB in the backbone plane."""
+       if not self.side_chain.any() or 'CB' not in self.index:
+           return None
+       ca_coord = self.get('CA')
+       normal = np.cross(ca_coord - self.get('N'), self.get('C') - ca_coord)
+       normal = normal / np.linalg.norm(normal)
+       return {'type': 'relative_backbone', 'params': {'angle': angle}, 'angle': angle,
+               'axis': np.cross(normal, self.get('CB') - ca_coord), 'center': ca_coord.copy(),
+               'mask': self.side_chain}
+
+   def get_side_chain_move(self, rng: Optional[np.random.RandomState] = None) -> Optional[Dict[str, Any]]:
+       """Get a random chi1 (p 0.6), chi2 (p 0.3) or small side chain rotation."""
+       if not self.side_chain.any():
+           return None
+       rng = np.random if rng is None else rng
+       rotation_type = rng.choice(['chi1', 'chi2', 'random'], p=[0.6, 0.3, 0.1])
+       if rotation_type == 'chi1':
+           angle = rng.uniform(-np.pi, np.pi)
+           return {'type': 'side_chain', 'params': {'chi_type': 'chi1', 'angle': angle}, 'angle': angle,
+                   'axis': self.get('CB') - self.get('CA'), 'center': self.get('CB').copy(),
+                   'mask': self.get_mask(('CB',))}
+       if rotation_type == 'chi2' and 'CG' in self.index:
+           angle = rng.normal(0, np.pi/6)
+           return {'type': 'side_chain', 'params': {'chi_type': 'chi2', 'angle': angle}, 'angle': angle,
+                   'axis': self.get('CG') - self.get('CB'), 'center': self.get('CG').copy(),
+                   'mask': self.get_mask(('CB', 'CG'))}
+       center = self.get('CB') if 'CB' in self.index else self.get('CA')
+       angle = rng.normal(0, 0.1)
+       axis = rng.rand(3)
+       axis /= np.linalg.norm(axis)
+       return {'type': 'side_chain', 'params': {}, 'angle': angle, 'axis': axis,
+               'center': center.copy(), 'mask': self.side_chain}
+
+   def apply_move(self, move: Optional[Dict[str, Any]],
+                  rotation_matrix: Optional[npt.NDArray[np.float64]] = None,
+                  tracker: Optional[TransformationTracker] = None,
+                  structure_id: Optional[str] = None) -> None:
+       """
+       Apply a move and record it.
+
+       Args:
+           move: Move from get_backbone_move, get_relative_move or get_side_chain_move, None for no move
+           rotation_matrix: Rotation matrix of the move if already computed
+           tracker: Optional transformation tracker
+           structure_id: Optional structure identifier for tracking
+       """
+       if move is None:
+           return
+       if rotation_matrix is None:
+           rotation_matrix = get_rotation_matrix(move['axis'], move['angle'])
+       params = move['params'] if move['params'] else {'rotation_matrix': rotation_matrix}
+       if tracker and structure_id:
+           tracker.add_transformation(structure_id, self.chain_id, self.residue_id, move['type'], params)
+       self.rotate(move['mask'], rotation_matrix, move['center'])
+
+   def rotate_backbone(self, angle: float, angle_type: str = 'phi',
+                       tracker: Optional[TransformationTracker] = None,
+                       structure_id: Optional[str] = None) -> None:
+       """Rotate around phi or psi angle, see rotate_backbone."""
+       self.apply_move(self.get_backbone_move(angle, angle_type), tracker=tracker, structure_id=structure_id)
+
+   def rotate_relative_to_backbone(self, angle: float,
+                                   tracker: Optional[TransformationTracker] = None,
+                                   structure_id: Optional[str] = None) -> None:
+       """Rotate side chain relative to backbone plane, see get_relative_move."""
+       self.apply_move(self.get_relative_move(angle), tracker=tracker, structure_id=structure_id)
+
+   def rotate_side_chain(self, tracker: Optional[TransformationTracker] = None,
+                         structure_id: Optional[str] = None,
+                         rng: Optional[np.random.RandomState] = None) -> None:
+       """Random chi1, chi2 or small side chain rotation, see get_side_chain_move."""
+       self.apply_move(self.get_side_chain_move(rng), tracker=tracker, structure_id=structure_id)
+
+class CrosslinkArrays:
    """
-   Enhanced side chain rotation with transformation tracking.
+   Residues of a crosslink as arrays, with the distances between the crosslinked atoms.
 
-   Args:
-       structure: PDB structure to modify
-       chain_id: Chain identifier 
-       residue_id: Residue number to rotate
-       rotation_matrix: 3x3 rotation matrix
-       tracker: Optional transformation tracker
-       structure_id: Optional structure identifier for tracking
+   Attributes:
+       crosslink: Crosslink specification dictionary
+       is_divalent: Whether the crosslink has no third residue
+       residue_types: Residues of the crosslink, 'R1', 'R2' and for trivalent crosslinks 'R3'
+       residues: CrosslinkResidue of each residue type
    """
-   chain = structure[0][chain_id]
-   for residue in chain:
-       if residue.id[1] == int(residue_id):
-           backbone_atoms = set(['N', 'CA', 'C', 'O'])
-           side_chain_atoms = [atom for atom in residue if atom.name not in backbone_atoms]
-           if not side_chain_atoms:
-               return
-           
-           rotation_type = np.random.choice(['chi1', 'chi2', 'random'], p=[0.6, 0.3, 0.1])
-           
-           if rotation_type == 'chi1':
-               axis = get_chi1_axis(residue)
-               center = residue['CA'].coord
-               angle = np.random.uniform(-np.pi, np.pi)
-               
-               if tracker and structure_id:
-                   tracker.add_transformation(structure_id, chain_id, residue_id,
-                                           'side_chain',
-                                           {'chi_type': 'chi1', 'angle': angle})
-               
-               for atom in side_chain_atoms:
-                   if atom.name != 'CB':
-                       atom.coord = rotate_around_axis(atom.coord, axis, angle, residue['CB'].coord)
-                       
-           elif rotation_type == 'chi2' and 'CG' in residue:
-               axis = get_chi2_axis(residue)
-               if axis is not None:
-                   center = residue['CB'].coord
-                   angle = np.random.normal(0, np.pi/6)
-                   
-                   if tracker and structure_id:
-                       tracker.add_transformation(structure_id, chain_id, residue_id,
-                                               'side_chain',
-                                               {'chi_type': 'chi2', 'angle': angle})
-                   
-                   for atom in side_chain_atoms:
-                       if atom.name not in ['CB', 'CG']:
-                           atom.coord = rotate_around_axis(atom.coord, axis, angle, residue['CG'].coord)
+
+   def __init__(self, structures: Dict[str, Structure], crosslink: Dict[str, Dict[str, Any]]):
+       self.crosslink = crosslink
+       self.is_divalent = crosslink['R3']['type'] == "NONE"
+       self.residue_types = ['R1', 'R2'] if self.is_divalent else ['R1', 'R2', 'R3']
+       self.residues: Dict[str, CrosslinkResidue] = {}
+       loaded: Dict[Tuple[str, str, str], CrosslinkResidue] = {}
+       for residue_type in self.residue_types:
+           residue = crosslink[residue_type]
+           key = (residue['structure_id'], residue['chain'], str(residue['position']))
+           if key not in loaded:
+               loaded[key] = CrosslinkResidue(structures[residue['structure_id']],
+                                              residue['chain'], residue['position'])
+           self.residues[residue_type] = loaded[key]
+
+   def get_distances(self) -> Tuple[float, float]:
+       """Calculate distances between crosslinked atoms, see get_distances."""
+       r1_coord = self.residues['R1'].get(self.crosslink['R1']['atom'])
+       r2_coord = self.residues['R2'].get(self.crosslink['R2']['atom'])
+       if self.is_divalent:
+           dist = distance(r1_coord, r2_coord)
+           return dist, dist
+       r3 = self.residues['R3']
+       return (distance(r1_coord, r3.get(self.crosslink['R3']['atom31'])),
+               distance(r2_coord, r3.get(self.crosslink['R3']['atom32'])))
+
+   def get_move_distances(self, residue_type: str, moves: List[Optional[Dict[str, Any]]],
+                          rotation_matrices: npt.NDArray[np.float64]) -> Tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+       """
+       Calculate the distances between crosslinked atoms after each of several moves of one residue.
+
+       Only the crosslinked atoms are moved, all moves at once with their stacked rotation matrices.
+
+       Args:
+           residue_type: Residue moved, 'R1', 'R2' or 'R3'
+           moves: Moves of the residue, None for no move
+           rotation_matrices: (M,3,3) rotation matrices of the moves
+
+       Returns:
+           Tuple of (M,) arrays of distances, see get_distances
+       """
+       residue = self.residues[residue_type]
+       atoms = [('R1', self.crosslink['R1']['atom']), ('R2', self.crosslink['R2']['atom'])]
+       if not self.is_divalent:
+           atoms += [('R3', self.crosslink['R3']['atom31']), ('R3', self.crosslink['R3']['atom32'])]
+       indices = [residue.index[name] for r, name in atoms if self.residues[r] is residue]
+       masks = np.array([move['mask'][indices] if move else np.zeros(len(indices), dtype=bool) for move in moves])
+       centers = np.array([move['center'] if move else np.zeros(3) for move in moves])
+
+       coords = residue.coords[indices]
+       moved = np.where(masks[:, :, None],
+                        np.einsum('mij,maj->mai', rotation_matrices, coords[None] - centers[:, None]) + centers[:, None],
+                        coords[None])
+
+       positions = []
+       for r, name in atoms:
+           if self.residues[r] is residue:
+               positions.append(moved[:, indices.index(residue.index[name])])
            else:
-               center = residue['CB'].coord if 'CB' in residue else residue['CA'].coord
-               angle = np.random.normal(0, 0.1)
-               axis = np.random.rand(3)
-               axis /= np.linalg.norm(axis)
-               rot = Rotation.from_rotvec(angle * axis)
-               
-               if tracker and structure_id:
-                   tracker.add_transformation(structure_id, chain_id, residue_id,
-                                           'side_chain',
-                                           {'rotation_matrix': rot.as_matrix()})
-               
-               for atom in side_chain_atoms:
-                   atom.coord = np.dot(rot.as_matrix(), atom.coord - center) + center
-
-def rotate_around_axis(point: npt.NDArray[np.float64],
-                     axis: npt.NDArray[np.float64],
-                     angle: float,
-                     center: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
-   """Apply Rodrigues rotation formula ref: https://en.wikipedia.org/wiki/Rodrigues%27_rotation_formula."""
-   k = axis / np.linalg.norm(axis)
-   cos_t = np.cos(angle)
-   sin_t = np.sin(angle)
-   
-   p = point - center
-   p_rot = p * cos_t + np.cross(k, p) * sin_t + k * np.dot(k, p) * (1 - cos_t)
-   
-   return p_rot + center
+               positions.append(np.broadcast_to(self.residues[r].get(name), (len(moves), 3)))
+       if self.is_divalent:
+           dist = np.linalg.norm(positions[0] - positions[1], axis=1)
+           return dist, dist
+       return (np.linalg.norm(positions[0] - positions[2], axis=1),
+               np.linalg.norm(positions[1] - positions[3], axis=1))
 
-def store_residue_coords(structure: Structure,
-                       chain_id: str,
-                       residue_id: int) -> Dict[str, npt.NDArray[np.float64]]:
-   """Store coordinates for a single residue."""
-   chain = structure[0][chain_id]
-   for residue in chain:
-       if residue.id[1] == int(residue_id):
-           return {atom.name: atom.coord.copy() for atom in residue}
-   return {}
-
-def restore_residue_coords(structure: Structure,
-                         chain_id: str, 
-                         residue_id: int,
-                         coords: Dict[str, npt.NDArray[np.float64]]) -> None:
-   """Restore coordinates for a single residue."""
-   chain = structure[0][chain_id]
-   for residue in chain:
-       if residue.id[1] == int(residue_id):
-           for atom in residue:
-               atom.coord = coords[atom.name]
+   def snapshot(self) -> Dict[str, npt.NDArray[np.float64]]:
+       """Copy the coordinates of all residues."""
+       return {residue_type: residue.coords.copy() for residue_type, residue in self.residues.items()}
+
+   def restore(self, snapshot: Dict[str, npt.NDArray[np.float64]]) -> None:
+       """Restore the coordinates of all residues from a snapshot."""
+       for residue_type, coords in snapshot.items():
+           self.residues[residue_type].coords[:] = coords
+
+   def write_back(self) -> None:
+       """Write the coordinates of all residues to their structures."""
+       for residue in set(self.residues.values()):
+           residue.write_back()
 
 def find_potential_matches(structures: Dict[str, Structure],
                          residue1_info: Dict[str, str],
@@ -748,189 +917,458 @@ def select_best_matching_crosslinks(structures: Dict[str, Structure],
             
     return selected_matches
 
+REPLICA_TEMPERATURE_RATIO = 1.5
+
+class CrosslinkMonteCarlo:
+   """
+   Monte Carlo optimization of a crosslink on the arrays of its residues.
+
+   Phase 1 (explore) scans rotations relative to the backbone, Phase 2 (run) anneals
+   with random backbone and side chain moves. The state holds no Bio.PDB structures, so
+   it can be pickled to a worker process and continued there in chunks of steps, e.g.
+   between temperature exchanges of replicas.
+
+   Attributes:
+       arrays: Residues of the crosslink
+       seed: Seed of the random generators, None to use the global generators
+       temperature_scale: Factor of the annealing temperature, exchanged between replicas
+       max_steps: Maximum optimization steps of Phase 2
+       batch_size: Moves proposed per step, the best one is tried (see apply_best_move)
+   """
+   cooling_rate = 0.999
+   min_temp = 0.2
+
+   def __init__(self, arrays: CrosslinkArrays, seed: Optional[int] = None,
+                temperature_scale: float = 1.0, max_steps: int = 20000, batch_size: int = 1):
+       self.arrays = arrays
+       self.crosslink = arrays.crosslink
+       self.is_divalent = arrays.is_divalent
+       self.target_distance = 1.5 if self.is_divalent else 0.1
+       self.seed = seed
+       self.rng = random.Random(seed) if seed is not None else None
+       self.np_rng = np.random.RandomState(seed % 2**32) if seed is not None else None
+       self.temperature_scale = temperature_scale
+       self.max_steps = max_steps
+       self.batch_size = batch_size
+
+       self.best_distance = float('inf')
+       self.best_max_distance = float('inf')
+       self.best_coords = arrays.snapshot()
+       self.best_tracker = TransformationTracker()
+       self.current_tracker = TransformationTracker()
+       self.temperature = 1.0
+       self.no_improvement_count = 0
+       self.step = 0
+       self.converged = False
+
+   @property
+   def py_random(self) -> random.Random:
+       return random if self.rng is None else self.rng
+
+   @property
+   def np_random(self) -> np.random.RandomState:
+       return np.random if self.np_rng is None else self.np_rng
+
+   @property
+   def done(self) -> bool:
+       return self.converged or self.step >= self.max_steps
+
+   def get_energy(self) -> float:
+       """Get the current crosslink distance: the distance, or the larger one of trivalent crosslinks."""
+       dist1, dist2 = self.arrays.get_distances()
+       return dist1 if self.is_divalent else max(dist1, dist2)
+
+   def get_best_energy(self) -> float:
+       """Get the crosslink distance of the best coordinates."""
+       current = self.arrays.snapshot()
+       self.arrays.restore(self.best_coords)
+       energy = self.get_energy()
+       self.arrays.restore(current)
+       return energy
+
+   def propose_moves(self, residue: CrosslinkResidue, temperature: float) -> List[Optional[Dict[str, Any]]]:
+       """Propose batch_size moves of a residue, drawn like the move of a single step."""
+       moves = []
+       for _ in range(self.batch_size):
+           if self.py_random.random() < 0.3 and temperature > 0.3:
+               angle_type = self.py_random.choice(['phi', 'psi'])
+               moves.append(residue.get_backbone_move(self.np_random.normal(0, 0.15 * temperature), angle_type))
+           elif self.py_random.random() < 0.7:
+               moves.append(residue.get_relative_move(self.np_random.normal(0, 0.3 * temperature)))
+           else:
+               moves.append(residue.get_side_chain_move(self.np_random))
+       return moves
+
+   def apply_best_move(self, residue_type: str, temperature: float,
+                       tracker: TransformationTracker) -> Tuple[float, float]:
+       """
+       Propose batch_size moves of a residue, score them all at once and apply the best one.
+
+       The best move has the shortest distance (the larger one of trivalent crosslinks), skipping
+       moves that bring trivalent crosslink atoms closer than 1.5. It is then accepted or
+       rejected like a single move.
+
+       Args:
+           residue_type: Residue moved, 'R1', 'R2' or 'R3'
+           temperature: Current temperature
+           tracker: Tracker recording the applied move
+
+       Returns:
+           Tuple of distances after the move
+       """
+       residue = self.arrays.residues[residue_type]
+       moves = self.propose_moves(residue, temperature)
+       rotation_matrices = get_rotation_matrices(
+           np.array([move['axis'] if move else (1.0, 0.0, 0.0) for move in moves]),
+           np.array([move['angle'] if move else 0.0 for move in moves])
+       )
+       dist1, dist2 = self.arrays.get_move_distances(residue_type, moves, rotation_matrices)
+       if self.is_divalent:
+           scores = dist1.copy()
+       else:
+           scores = np.maximum(dist1, dist2)
+           scores[np.minimum(dist1, dist2) < 1.5] = np.inf
+       best = int(np.argmin(scores))
+       residue.apply_move(moves[best], rotation_matrices[best], tracker=tracker,
+                          structure_id=self.crosslink[residue_type]['structure_id'])
+       return float(dist1[best]), float(dist2[best])
+
+   def explore(self) -> None:
+       """Phase 1: Backbone exploration."""
+       LOG.debug("\nPhase 1: Backbone exploration")
+       angle_steps = np.linspace(-np.pi/2, np.pi/2, 8)
+       for residue_type in self.arrays.residue_types:
+           for angle in angle_steps:
+               self.arrays.restore(self.best_coords)
+               temp_tracker = TransformationTracker()
+               residue = self.crosslink[residue_type]
+
+               self.arrays.residues[residue_type].rotate_relative_to_backbone(
+                   angle,
+                   tracker=temp_tracker,
+                   structure_id=residue['structure_id']
+               )
+
+               dist1, dist2 = self.arrays.get_distances()
+               current_distance = dist1 if self.is_divalent else (dist1 + dist2)
+
+               if current_distance < self.best_distance:
+                   self.best_distance = current_distance
+                   self.best_coords = self.arrays.snapshot()
+                   self.best_tracker = temp_tracker.copy()
+                   self.current_tracker.update_from(temp_tracker)
+                   if self.is_divalent:
+                       LOG.debug(f"Improved distance: {dist1:.2f}")
+                   else:
+                       LOG.debug(f"Improved: {dist1:.2f}, {dist2:.2f}")
+       self.arrays.restore(self.best_coords)
+
+   def run(self, n_steps: Optional[int] = None) -> bool:
+       """
+       Phase 2: Main optimization, continued for n_steps steps.
+
+       Args:
+           n_steps: Number of steps, all remaining steps if None
+
+       Returns:
+           True if the target distance is reached
+       """
+       if self.step == 0:
+           LOG.debug("\nPhase 2: Main optimization")
+       is_divalent = self.is_divalent
+       target_distance = self.target_distance
+       end = self.max_steps if n_steps is None else min(self.max_steps, self.step + n_steps)
+
+       while self.step < end:
+           step = self.step
+           temperature = self.temperature * self.temperature_scale
+           dist1, dist2 = self.arrays.get_distances()
+           current_max_distance = dist1 if is_divalent else max(dist1, dist2)
+
+           if is_divalent and dist1 <= target_distance + 1.0:
+               LOG.debug(f"Target reached at step {step}")
+               self.converged = True
+               return True
+
+           if not is_divalent and dist1 <= target_distance + 1.0 and dist2 <= target_distance + 1.0:
+               LOG.debug(f"Target reached at step {step}")
+               self.converged = True
+               return True
+
+           if self.no_improvement_count > 500:
+               LOG.debug(f"Resetting at step {step}")
+               self.temperature = 1.0
+               temperature = self.temperature * self.temperature_scale
+               if self.py_random.random() < 0.5:
+                   self.arrays.restore(self.best_coords)
+                   self.current_tracker = self.best_tracker.copy()
+               self.no_improvement_count = 0
+
+           residue_type = self.py_random.choice(['R1', 'R2']) if is_divalent else \
+                         self.py_random.choice(['R1', 'R3', 'R3']) if dist1 > dist2 else \
+                         self.py_random.choice(['R2', 'R3', 'R3'])
+
+           residue = self.crosslink[residue_type]
+           residue_arrays = self.arrays.residues[residue_type]
+
+           old_coords = residue_arrays.coords.copy()
+           temp_tracker = TransformationTracker()
+
+           # Apply transformations
+           if self.batch_size > 1:
+               new_dist1, new_dist2 = self.apply_best_move(residue_type, temperature, temp_tracker)
+           elif self.py_random.random() < 0.3 and temperature > 0.3:
+               angle_type = self.py_random.choice(['phi', 'psi'])
+               angle = self.np_random.normal(0, 0.15 * temperature)
+               residue_arrays.rotate_backbone(
+                   angle,
+                   angle_type,
+                   tracker=temp_tracker,
+                   structure_id=residue['structure_id']
+               )
+           else:
+               if self.py_random.random() < 0.7:
+                   angle = self.np_random.normal(0, 0.3 * temperature)
+                   residue_arrays.rotate_relative_to_backbone(
+                       angle,
+                       tracker=temp_tracker,
+                       structure_id=residue['structure_id']
+                   )
+               else:
+                   residue_arrays.rotate_side_chain(
+                       tracker=temp_tracker,
+                       structure_id=residue['structure_id'],
+                       rng=self.np_random
+                   )
+           if self.batch_size <= 1:
+               new_dist1, new_dist2 = self.arrays.get_distances()
+           new_max_distance = new_dist1 if is_divalent else max(new_dist1, new_dist2)
+
+           # Acceptance criteria
+           accept = False
+           if is_divalent:
+               if new_dist1 <= max(target_distance + 1.0, dist1):
+                   accept = True
+               elif self.py_random.random() < math.exp(-(new_dist1 - dist1) / temperature):
+                   accept = True
+           else:
+               if min(new_dist1, new_dist2) < 1.5:
+                   accept = False
+               elif new_dist1 <= max(target_distance + 1.0, dist1) and \
+                    new_dist2 <= max(target_distance + 1.0, dist2):
+                   accept = True
+               elif new_max_distance < current_max_distance - 0.2:
+                   accept = True
+               elif self.py_random.random() < math.exp(-(new_max_distance - current_max_distance) / temperature):
+                   accept = True
+
+           if accept:
+               self.current_tracker.update_from(temp_tracker)
+               if new_max_distance < self.best_max_distance:
+                   self.best_max_distance = new_max_distance
+                   self.best_coords = self.arrays.snapshot()
+                   self.best_tracker = self.current_tracker.copy()
+                   self.no_improvement_count = 0
+               else:
+                   self.no_improvement_count += 1
+           else:
+               residue_arrays.coords[:] = old_coords
+               self.no_improvement_count += 1
+
+           self.temperature = max(self.temperature * self.cooling_rate, self.min_temp)
+           self.step += 1
+
+           if step % 100 == 0:
+               if is_divalent:
+                   LOG.debug(f"Step {step}: Distance = {new_dist1:.2f}, T = {self.temperature:.4f}")
+               else:
+                   LOG.debug(f"Step {step}: {new_dist1:.2f}, {new_dist2:.2f}, T = {self.temperature:.4f}")
+       return False
+
+def _run_replica(mc: CrosslinkMonteCarlo, n_steps: Optional[int]) -> CrosslinkMonteCarlo:
+   """Continue a Monte Carlo replica, in a worker process."""
+   if mc.step == 0:
+       mc.explore()
+   mc.run(n_steps)
+   return mc
+
+def exchange_temperatures(replicas: List[CrosslinkMonteCarlo], offset: int = 0) -> int:
+   """
+   Exchange temperatures of neighbouring replicas, parallel tempering style.
+
+   Replicas i and i+1 (from offset on, in steps of two) swap their temperature scales with
+   probability min(1, exp((E_i - E_j) * (1/T_i - 1/T_j))), E being the crosslink distance.
+
+   Args:
+       replicas: Replicas ordered by temperature scale
+       offset: First pair to exchange, alternate 0 and 1 between rounds
+
+   Returns:
+       Number of accepted exchanges
+   """
+   accepted = 0
+   for i in range(offset, len(replicas) - 1, 2):
+       a, b = replicas[i], replicas[i + 1]
+       t_a = a.temperature * a.temperature_scale
+       t_b = b.temperature * b.temperature_scale
+       delta = (a.get_energy() - b.get_energy()) * (1.0 / t_a - 1.0 / t_b)
+       if delta >= 0 or random.random() < math.exp(delta):
+           a.temperature_scale, b.temperature_scale = b.temperature_scale, a.temperature_scale
+           replicas[i], replicas[i + 1] = b, a
+           accepted += 1
+   return accepted
+
+def optimize_crosslinks_parallel(arrays: List[CrosslinkArrays],
+                                 max_steps: int = 20000,
+                                 n_replicas: int = 1,
+                                 exchange_steps: int = 0,
+                                 n_workers: int = 1,
+                                 batch_size: int = 1) -> List[CrosslinkMonteCarlo]:
+   """
+   Optimize independent crosslinks with seeded Monte Carlo replicas, spread over worker processes.
+
+   Each crosslink runs n_replicas replicas with seeds drawn from the global random generator,
+   so results do not depend on n_workers. With exchange_steps, replicas run at increasing
+   temperature scales and exchange temperatures every exchange_steps steps.
+
+   Args:
+       arrays: Residues of each crosslink, the crosslinks must not share residues
+       max_steps: Maximum optimization steps of each replica
+       n_replicas: Number of replicas per crosslink
+       exchange_steps: Steps between temperature exchanges, 0 for independent replicas
+       n_workers: Number of worker processes, runs in this process if 1
+       batch_size: Moves proposed per Monte Carlo step
+
+   Returns:
+       Replica with the best coordinates of each crosslink, holding copies of the arrays
+
+   Raises:
+       ValueError: If n_replicas or batch_size is less than 1 or exchange_steps is negative
+   """
+   if n_replicas < 1:
+       raise ValueError(f"Number of replicas must be at least 1, got {n_replicas}")
+   if exchange_steps < 0:
+       raise ValueError(f"Steps between temperature exchanges must not be negative, got {exchange_steps}")
+   if batch_size < 1:
+       raise ValueError(f"Batch size must be at least 1, got {batch_size}")
+   replicas = [
+       [CrosslinkMonteCarlo(copy.deepcopy(crosslink_arrays), seed=random.getrandbits(63),
+                            temperature_scale=REPLICA_TEMPERATURE_RATIO ** k if exchange_steps else 1.0,
+                            max_steps=max_steps, batch_size=batch_size)
+        for k in range(n_replicas)]
+       for crosslink_arrays in arrays
+   ]
+   n_steps = exchange_steps or None
+   n_workers = min(n_workers, len(arrays) * n_replicas)
+   executor = None
+   if n_workers > 1:
+       executor = ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context('spawn'))
+   try:
+       round_index = 0
+       while True:
+           active = [(i, k) for i, crosslink_replicas in enumerate(replicas)
+                     if not any(mc.converged for mc in crosslink_replicas)
+                     for k, mc in enumerate(crosslink_replicas) if not mc.done]
+           if not active:
+               break
+           if executor is None:
+               for i, k in active:
+                   _run_replica(replicas[i][k], n_steps)
+           else:
+               futures = {(i, k): executor.submit(_run_replica, replicas[i][k], n_steps) for i, k in active}
+               for (i, k), future in futures.items():
+                   replicas[i][k] = future.result()
+           if exchange_steps:
+               for crosslink_replicas in replicas:
+                   if not any(mc.converged for mc in crosslink_replicas):
+                       exchange_temperatures(crosslink_replicas, offset=round_index % 2)
+           round_index += 1
+   finally:
+       if executor is not None:
+           executor.shutdown()
+
+   best = []
+   for i, crosslink_replicas in enumerate(replicas):
+       energies = [mc.get_best_energy() for mc in crosslink_replicas]
+       k = int(np.argmin(energies))
+       LOG.debug(f"Crosslink {i + 1}: best of {len(crosslink_replicas)} replicas with distance {energies[k]:.2f}")
+       best.append(crosslink_replicas[k])
+   return best
+
 def optimize_crosslink(structures: Dict[str, Structure],
                      crosslink: Dict[str, Dict[str, Any]], 
                      tracker: TransformationTracker,
                      max_steps: int = 20000,
-                     target_distance: float = 1.5) -> Tuple[Dict[str, Structure], TransformationTracker]:
+                     target_distance: float = 1.5,
+                     batch_size: int = 1) -> Tuple[Dict[str, Structure], TransformationTracker]:
    """
    Optimize crosslink geometry using Monte Carlo optimization.
+
+   Moves and snapshots act on the coordinate arrays of the crosslinked residues only
+   (see CrosslinkMonteCarlo). The best coordinates are written back to the structures at the end.
    
    Args:
-       structures: Dictionary of PDB structures
+       structures: Dictionary of PDB structures, updated in place
        crosslink: Crosslink specification dictionary 
        tracker: Transformation tracker for recording moves
        max_steps: Maximum optimization steps
        target_distance: Target distance for optimization
+       batch_size: Moves proposed per step, the best one is tried
        
    Returns:
        Tuple of optimized structures and transformation tracker
    """
-   best_distance = float('inf')
-   best_structures = {k: v.copy() for k, v in structures.items()}
-   best_tracker = TransformationTracker()
-   current_tracker = TransformationTracker()
-   
-   is_divalent = crosslink['R3']['type'] == "NONE"
-   residue_types = ['R1', 'R2'] if is_divalent else ['R1', 'R2', 'R3']
-   target_distance = 1.5 if is_divalent else 0.1
-   
-   # Phase 1: Backbone exploration
-   LOG.debug("\nPhase 1: Backbone exploration")
-   angle_steps = np.linspace(-np.pi/2, np.pi/2, 8)
-   for residue_type in residue_types:
-       for angle in angle_steps:
-           structures_copy = {k: v.copy() for k, v in best_structures.items()}
-           temp_tracker = TransformationTracker()
-           residue = crosslink[residue_type]
-           
-           rotate_relative_to_backbone(
-               structures_copy[residue['structure_id']],
-               residue['chain'],
-               residue['position'],
-               angle,
-               tracker=temp_tracker,
-               structure_id=residue['structure_id']
-           )
-           
-           dist1, dist2 = get_distances(structures_copy, crosslink)
-           current_distance = dist1 if is_divalent else (dist1 + dist2)
-           
-           if current_distance < best_distance:
-               best_distance = current_distance
-               best_structures = {k: v.copy() for k, v in structures_copy.items()}
-               best_tracker = temp_tracker.copy()
-               current_tracker.update_from(temp_tracker)
-               if is_divalent:
-                   LOG.debug(f"Improved distance: {dist1:.2f}")
-               else:
-                   LOG.debug(f"Improved: {dist1:.2f}, {dist2:.2f}")
+   arrays = CrosslinkArrays(structures, crosslink)
+   mc = CrosslinkMonteCarlo(arrays, max_steps=max_steps, batch_size=batch_size)
+   mc.explore()
+   mc.run()
+   arrays.restore(mc.best_coords)
+   arrays.write_back()
+   return structures, mc.best_tracker
 
-   # Phase 2: Main optimization                
-   LOG.debug("\nPhase 2: Main optimization")
-   structures = {k: v.copy() for k, v in best_structures.items()}
-   temperature = 1.0
-   cooling_rate = 0.999
-   min_temp = 0.2
-   no_improvement_count = 0
-   best_max_distance = float('inf')
-   
-   for step in range(max_steps):
-       dist1, dist2 = get_distances(structures, crosslink) 
-       current_max_distance = dist1 if is_divalent else max(dist1, dist2)
-       
-       if is_divalent and dist1 <= target_distance + 1.0:
-           LOG.debug(f"Target reached at step {step}")
-           return best_structures, best_tracker
-           
-       if not is_divalent and dist1 <= target_distance + 1.0 and dist2 <= target_distance + 1.0:
-           LOG.debug(f"Target reached at step {step}")
-           return best_structures, best_tracker
-           
-       if no_improvement_count > 500:
-           LOG.debug(f"Resetting at step {step}")
-           temperature = 1.0
-           if random.random() < 0.5:
-               structures = {k: v.copy() for k, v in best_structures.items()}
-               current_tracker = best_tracker.copy()
-           no_improvement_count = 0
-           
-       residue_type = random.choice(['R1', 'R2']) if is_divalent else \
-                     random.choice(['R1', 'R3', 'R3']) if dist1 > dist2 else \
-                     random.choice(['R2', 'R3', 'R3'])
-           
-       residue = crosslink[residue_type]
-       structure = structures[residue['structure_id']]
-       
-       old_coords = store_residue_coords(structure, residue['chain'], residue['position'])
-       temp_tracker = TransformationTracker()
-       
-       # Apply transformations
-       if random.random() < 0.3 and temperature > 0.3:
-           angle_type = random.choice(['phi', 'psi'])
-           angle = np.random.normal(0, 0.15 * temperature)
-           rotate_backbone(
-               structure,
-               residue['chain'],
-               residue['position'],
-               angle,
-               angle_type,
-               tracker=temp_tracker,
-               structure_id=residue['structure_id']
-           )
-       else:
-           if random.random() < 0.7:
-               angle = np.random.normal(0, 0.3 * temperature)
-               rotate_relative_to_backbone(
-                   structure, 
-                   residue['chain'], 
-                   residue['position'], 
-                   angle,
-                   tracker=temp_tracker,
-                   structure_id=residue['structure_id']
-               )
-           else:
-               rotation = Rotation.random()
-               rotate_side_chain(
-                   structure, 
-                   residue['chain'], 
-                   residue['position'], 
-                   rotation.as_matrix(),
-                   tracker=temp_tracker,
-                   structure_id=residue['structure_id']
-               )
-       
-       new_dist1, new_dist2 = get_distances(structures, crosslink)
-       new_max_distance = new_dist1 if is_divalent else max(new_dist1, new_dist2)
-       
-       # Acceptance criteria
-       accept = False
-       if is_divalent:
-           if new_dist1 <= max(target_distance + 1.0, dist1):
-               accept = True
-           elif random.random() < math.exp(-(new_dist1 - dist1) / temperature):
-               accept = True
-       else:
-           if min(new_dist1, new_dist2) < 1.5:
-               accept = False
-           elif new_dist1 <= max(target_distance + 1.0, dist1) and \
-                new_dist2 <= max(target_distance + 1.0, dist2):
-               accept = True
-           elif new_max_distance < current_max_distance - 0.2:
-               accept = True
-           elif random.random() < math.exp(-(new_max_distance - current_max_distance) / temperature):
-               accept = True
-               
-       if accept:
-           current_tracker.update_from(temp_tracker)
-           if new_max_distance < best_max_distance:
-               best_max_distance = new_max_distance
-               best_structures = {k: v.copy() for k, v in structures.items()}
-               best_tracker = current_tracker.copy()
-               no_improvement_count = 0
-           else:
-               no_improvement_count += 1
-       else:
-           restore_residue_coords(structure, residue['chain'], residue['position'], old_coords)
-           no_improvement_count += 1
-       
-       temperature = max(temperature * cooling_rate, min_temp)
-       
-       if step % 100 == 0:
-           if is_divalent:
-               LOG.debug(f"Step {step}: Distance = {new_dist1:.2f}, T = {temperature:.4f}")
-           else:
-               LOG.debug(f"Step {step}: {new_dist1:.2f}, {new_dist2:.2f}, T = {temperature:.4f}")
-               
-   return best_structures, best_tracker
+def get_crosslink_residues(crosslink: Dict[str, Dict[str, Any]]) -> set:
+   """Get the residues of a crosslink as (structure_id, chain, position)."""
+   residue_types = ['R1', 'R2'] if crosslink['R3']['type'] == "NONE" else ['R1', 'R2', 'R3']
+   return {(crosslink[r]['structure_id'], crosslink[r]['chain'], str(crosslink[r]['position']))
+           for r in residue_types}
+
+def group_independent_crosslinks(crosslinks: List[Dict[str, Dict[str, Any]]]) -> List[List[int]]:
+   """
+   Group crosslinks into rounds of crosslinks without shared residues, which can be optimized
+   at the same time. A crosslink sharing residues with an earlier one goes to a later round.
+
+   Returns:
+       Indices of the crosslinks of each round
+   """
+   rounds: List[List[int]] = []
+   round_residues: List[set] = []
+   for i, crosslink in enumerate(crosslinks):
+       residues = get_crosslink_residues(crosslink)
+       level = 0
+       for k, used in enumerate(round_residues):
+           if residues & used:
+               level = k + 1
+       if level == len(rounds):
+           rounds.append([])
+           round_residues.append(set())
+       rounds[level].append(i)
+       round_residues[level] |= residues
+   return rounds
 
 def optimize_structure(initial_pdb: str,
                      copy1_pdb: str, 
                      copy2_pdb: str,
                      crosslink_info: List[Dict[str, Any]],
-                     optimized_pdb: str) -> Tuple[float, TransformationTracker]:
+                     optimized_pdb: str,
+                     n_workers: int = 1,
+                     n_replicas: int = 1,
+                     exchange_steps: int = 0,
+                     batch_size: int = 1) -> Tuple[float, TransformationTracker]:
    """
    Optimize protein structure to satisfy crosslinking constraints.
+
+   Crosslinks without shared residues are optimized at the same time, see
+   optimize_crosslinks_parallel.
    
    Args:
        initial_pdb: Path to initial PDB file
@@ -938,6 +1376,10 @@ def optimize_structure(initial_pdb: str,
        copy2_pdb: Path to second copy PDB - original copy
        crosslink_info: List of crosslink specifications
        optimized_pdb: Path to save optimized structure
+       n_workers: Number of worker processes for crosslinks and replicas
+       n_replicas: Number of seeded Monte Carlo replicas per crosslink, the best is kept
+       exchange_steps: Steps between temperature exchanges of the replicas, 0 for independent replicas
+       batch_size: Moves proposed per Monte Carlo step, the best one is tried
        
    Returns:
        Tuple of total crosslink distance and transformation tracker
@@ -947,19 +1389,32 @@ def optimize_structure(initial_pdb: str,
        'copy1': load_pdb(copy1_pdb),
        'copy2': load_pdb(copy2_pdb)
    }
+   for structure in structures.values():
+       build_residue_index(structure)
    
    crosslinks = select_best_matching_crosslinks(structures, crosslink_info)
    
    master_tracker = TransformationTracker()
+   crosslink_trackers: Dict[int, TransformationTracker] = {}
    
-   for i, crosslink in enumerate(crosslinks):
-       LOG.debug(f"\nOptimizing crosslink {i+1}")
-       log_crosslink_info(crosslink, i) 
-       tracker = TransformationTracker()
-       structures, crosslink_tracker = optimize_crosslink(structures, crosslink, tracker)
-       master_tracker.update_from(crosslink_tracker)
+   for indices in group_independent_crosslinks(crosslinks):
+       for i in indices:
+           LOG.debug(f"\nOptimizing crosslink {i+1}")
+           log_crosslink_info(crosslinks[i], i)
+       arrays = [CrosslinkArrays(structures, crosslinks[i]) for i in indices]
+       best = optimize_crosslinks_parallel(arrays, n_replicas=n_replicas,
+                                           exchange_steps=exchange_steps, n_workers=n_workers,
+                                           batch_size=batch_size)
+       for i, crosslink_arrays, mc in zip(indices, arrays, best):
+           crosslink_arrays.restore(mc.best_coords)
+           crosslink_arrays.write_back()
+           crosslink_trackers[i] = mc.best_tracker
+   
+   for i in range(len(crosslinks)):
+       master_tracker.update_from(crosslink_trackers[i])
    
    optimized_initial = load_pdb(initial_pdb)
+   build_residue_index(optimized_initial)
    
    # Apply transformations to initial structure
    for crosslink in crosslinks:
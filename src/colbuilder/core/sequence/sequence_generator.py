@@ -155,7 +155,7 @@ class SequenceGenerator:
                 )
             
             with suppress_output():
-                msa_output_path, modeller_output = align_sequences(
+                msa_output_path, modeller_output = await align_sequences(
                     fasta_path,
                     template_fasta,
                     file_prefix,
@@ -544,7 +544,11 @@ class SequenceGenerator:
                 LOG.info(f"Step 4/{self.steps} Optimizing crosslink positions")
                 optimizer = CrosslinkOptimizer(
                     crosslink_pairs=self._crosslinks,
-                    chimera_scripts_dir=Path(self.config.CHIMERA_SCRIPTS_DIR)
+                    chimera_scripts_dir=Path(self.config.CHIMERA_SCRIPTS_DIR),
+                    n_workers=self.config.n_workers,
+                    n_replicas=self.config.crosslink_replicas,
+                    exchange_steps=self.config.crosslink_exchange,
+                    batch_size=self.config.crosslink_batch
                 )
                 
                 final_distance, final_output = await optimizer.optimize(
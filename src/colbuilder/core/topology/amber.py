@@ -5,6 +5,11 @@ import os
 import subprocess
 import logging
 import shutil
+import hashlib
+import itertools
+import numpy as np
+
+from colbuilder.core.utils import pdbio
 
 LOG = logging.getLogger(__name__)
 
@@ -63,6 +68,16 @@ class Amber:
         os.makedirs(type_, exist_ok=True)
         output_file = os.path.join(type_, f"{int(connect_id)}.merge.pdb")
 
+        store = getattr(self.system, 'store', None)
+        keys = [f"{type_}/{int(connected_model)}.caps" for connected_model in model.connect]
+        if store is not None and keys and all(key in store for key in keys):
+            with open(output_file, 'w') as f:
+                for key in keys:
+                    store.write_model(key, f)
+                f.write("END\n")
+            LOG.debug(f"Merged PDB written from coordinate store to: {output_file}")
+            return type_
+
         if len(model.connect) > 1:
             with open(output_file, 'w') as f:
                 for connected_model in model.connect:
@@ -70,8 +85,7 @@ class Amber:
                     if not os.path.exists(input_file):
                         LOG.error(f"Input file not found: {input_file}")
                         continue
-                    with open(input_file, 'r') as infile:
-                        f.write("".join(line for line in infile if line.startswith(self.is_line)))
+                    f.writelines(pdbio.format_atoms(pdbio.read_atoms(input_file)))
                 f.write("END\n")
             LOG.debug(f"Merged PDB written to: {output_file}")
         elif len(model.connect) == 1:  # This is the case for single-model connections
@@ -87,6 +101,83 @@ class Amber:
 
         return type_
     
+    def read_molecule(self, merge_pdb=None):
+        """
+        Read the fingerprint and coordinates of a merged PDB file.
+
+        The fingerprint covers the residue and atom sequence, including residue numbers and
+        chain breaks, but no coordinates: merged models with the same fingerprint get the
+        same topology from pdb2gmx.
+
+        Args:
+            merge_pdb (str): Path to the merged PDB file.
+
+        Returns:
+            tuple: Fingerprint (str) and coordinates (np.ndarray, shape (N, 3)) of the molecule.
+        """
+        atoms = pdbio.read_atoms(merge_pdb)
+        sequence = np.char.add(np.char.add(np.char.add(atoms['resname'], atoms['resid']), atoms['name']),
+                               np.where(atoms['ter'], 'T', ''))
+        fingerprint = hashlib.sha256('\n'.join(sequence.tolist()).encode()).hexdigest()
+        return fingerprint, pdbio.get_coords(atoms)
+
+    def get_translation(self, coords=None, ref_coords=None, tolerance=0.0015):
+        """
+        Get the translation of a molecule relative to a reference molecule with the same fingerprint.
+
+        Args:
+            coords (np.ndarray): Coordinates of the molecule (N, 3) in Angstrom.
+            ref_coords (np.ndarray): Coordinates of the reference molecule (N, 3) in Angstrom.
+            tolerance (float): Maximum deviation from a rigid translation in Angstrom,
+                covering the rounding of the PDB coordinates.
+
+        Returns:
+            np.ndarray or None: Translation (3,) in Angstrom, None if the molecule is not a translated reference.
+        """
+        if coords.shape != ref_coords.shape or not len(coords):
+            return None
+        shift = coords - ref_coords
+        translate = shift.mean(axis=0)
+        if np.abs(shift - translate).max() > tolerance:
+            return None
+        return translate
+
+    def translate_gro(self, gro_in=None, gro_out=None, translate=None):
+        """
+        Write a GRO file translated by a vector, e.g. the coordinates of a model from those of
+        the model that shares its topology.
+
+        Args:
+            gro_in (str): Path to the input GRO file.
+            gro_out (str): Path to the output GRO file.
+            translate (np.ndarray): Translation (3,) in Angstrom.
+        """
+        shift = np.asarray(translate, dtype=float) / 10
+        with open(gro_in, 'r') as f:
+            lines = f.readlines()
+        n_atoms = int(lines[1])
+        atoms = lines[2:2 + n_atoms]
+        coords = np.array([[line[20:28], line[28:36], line[36:44]] for line in atoms], dtype=float).reshape(-1, 3)
+        coords += shift
+        with open(gro_out, 'w') as f:
+            f.writelines(lines[:2])
+            f.writelines(f"{line[:20]}{x:8.3f}{y:8.3f}{z:8.3f}{line[44:]}" for line, (x, y, z) in zip(atoms, coords))
+            f.writelines(lines[2 + n_atoms:])
+
+    def read_itp(self, itp_file=None, name=None):
+        """
+        Read the content of an ITP file with its molecule name replaced, to compare topologies.
+
+        Args:
+            itp_file (str): Path to the ITP file.
+            name (str): Molecule name of the ITP file, also used in its position restraints file name.
+
+        Returns:
+            str: Content of the ITP file.
+        """
+        with open(itp_file, 'r') as f:
+            return f.read().replace(name, '<name>')
+
     def write_itp(self, itp_file=None):
         """
         Read an ITP file, clean it, and write a new version.
@@ -128,17 +219,20 @@ class Amber:
             LOG.error(f"Permission denied when writing to file: {output_file}")
             raise
     
-    def write_topology(self, system=None, topology_file=None, processed_models=None):
+    def write_topology(self, system=None, topology_file=None, processed_models=None, molecule_types=None):
         """
         Write a topology file for AMBER99-ILDNP-STAR force field.
 
         This method generates a comprehensive topology file including
         force field parameters, molecule topologies, and system composition.
+        Each molecule type is included once, consecutive models of the same
+        type are listed as one entry with their count.
 
         Args:
             system: The molecular system (not used in the current implementation).
             topology_file (str): Path to the output topology file.
             processed_models (list): List of processed model identifiers.
+            molecule_types (dict): Molecule type (ITP name) of each model, col_<model> if not given.
 
         Raises:
             ValueError: If no processed models are provided.
@@ -148,37 +242,70 @@ class Amber:
             LOG.error("No processed models to write topology")
             raise ValueError("processed_models cannot be empty")
 
+        molecule_types = molecule_types or {}
+        molecules = []
+        for model in processed_models:
+            name = molecule_types.get(model, f"col_{int(model)}")
+            if not os.path.exists(f"{name}.itp"):
+                continue
+            if molecules and molecules[-1][0] == name:
+                molecules[-1][1] += 1
+            else:
+                molecules.append([name, 1])
+
         LOG.debug(f"Writing topology file: {topology_file}")
         try:
             with open(topology_file, 'w') as f:
                 f.write('; Topology for Collagen Microfibril from Colbuilder 2.0\n')
                 f.write('#include "./' + self.ff + '/forcefield.itp"\n')
-                for model in processed_models:
-                    if os.path.exists(f"col_{int(model)}.itp"):
-                        f.write(f'#include "col_{int(model)}.itp"\n')
+                for name in dict.fromkeys(name for name, _ in molecules):
+                    f.write(f'#include "{name}.itp"\n')
                 
                 f.write('#include "./' + self.ff + '/ions.itp"\n')
                 f.write('#include "./' + self.ff + '/tip3p.itp"\n')
                 f.write('\n\n[ system ]\n ;name\nCollagen Microfibril in Water\n\n[ molecules ]\n;name  number\n')
-                for model in processed_models:
-                    if os.path.exists(f"col_{int(model)}.itp"):
-                        f.write(f'col_{int(model)}   1\n')
+                for name, count in molecules:
+                    f.write(f'{name}   {count}\n')
             LOG.debug(f"Topology file written: {topology_file}")
         except PermissionError:
             LOG.error(f"Permission denied when writing to file: {topology_file}")
             raise
 
-    def write_gro(self, system=None, gro_file=None, processed_models=None):
+    def read_gro_header(self, model_gro):
+        """
+        Read the atom count of a GRO file and the byte offsets of its atom block.
+
+        Args:
+            model_gro (str): Path to the GRO file.
+
+        Returns:
+            tuple: Number of atoms, offset of the first atom line and offset of the box line.
+        """
+        with open(model_gro, 'rb') as f:
+            f.readline()
+            n_atoms = int(f.readline())
+            start = f.tell()
+            size = os.fstat(f.fileno()).st_size
+            offset = max(start, size - 4096)
+            f.seek(offset)
+            end = offset + f.read().rstrip().rfind(b'\n') + 1
+        return n_atoms, start, end
+
+    def write_gro(self, system=None, gro_file=None, processed_models=None, renumber=True):
         """
         Write a GRO (Gromos87) file for the processed models.
 
-        This method combines information from individual GRO files of processed models
-        into a single GRO file, updating the total atom count.
+        The GRO files of the processed models are streamed into a single GRO file: the
+        total atom count is read from the second line of each file up front, so the header
+        is written once, atom blocks are copied in chunks, and the box line of the last
+        model is appended at the end. Memory use does not grow with the size of the system.
 
         Args:
             system: The molecular system (not used in the current implementation).
             gro_file (str): Path to the output GRO file.
             processed_models (list): List of processed model identifiers.
+            renumber (bool): Renumber atoms and residues consecutively over all models,
+                wrapping at 100000 like GROMACS. Otherwise atom blocks are copied unchanged.
 
         Raises:
             ValueError: If no processed models are provided.
@@ -190,35 +317,72 @@ class Amber:
             raise ValueError("processed_models cannot be empty")
 
         LOG.debug(f"Writing GRO file: {gro_file}")
-        gro = []
-        total_atoms = 0
+        model_gros = []
+        for model in processed_models:
+            model_gro = f"col_{int(model)}.gro"
+            if os.path.exists(model_gro):
+                model_gros.append((model_gro, *self.read_gro_header(model_gro)))
+            else:
+                LOG.warning(f"GRO file not found for model: {model}")
+        total_atoms = sum(n_atoms for _, n_atoms, _, _ in model_gros)
+
         try:
-            with open(gro_file, 'w') as f:
-                f.write("GROMACS GRO-FILE\n")
-                for model in processed_models:
-                    model_gro = f"col_{int(model)}.gro"
-                    if os.path.exists(model_gro):
-                        with open(model_gro, 'r') as model_f:
-                            lines = model_f.readlines()
-                            total_atoms += int(lines[1])
-                            for line in lines[2:-1]:
-                                f.write(line)
-                        gro = lines  
-                        os.remove(model_gro)
-                    else:
-                        LOG.warning(f"GRO file not found for model: {model}")
-                if gro:
-                    f.write(gro[-1]) 
-            
-            with open(gro_file, 'r+') as f:
-                content = f.read()
-                f.seek(0, 0)
-                f.write(f"GROMACS GRO-FILE\n{total_atoms}\n" + content[content.index('\n', content.index('\n') + 1) + 1:])
-            
+            with open(gro_file, 'wb') as f:
+                f.write(f"GROMACS GRO-FILE\n{total_atoms}\n".encode())
+                box = b''
+                atom, residue = 0, 0
+                for model_gro, n_atoms, start, end in model_gros:
+                    with open(model_gro, 'rb') as model_f:
+                        model_f.seek(start)
+                        if renumber:
+                            atom, residue = self._copy_renumbered(model_f, f, n_atoms, atom, residue)
+                        else:
+                            self._copy_block(model_f, f, end - start)
+                        model_f.seek(end)
+                        box = model_f.read()
+                    os.remove(model_gro)
+                if box:
+                    f.write(box if box.endswith(b'\n') else box + b'\n')
             LOG.debug(f"GRO file written: {gro_file}")
         except PermissionError:
             LOG.error(f"Permission denied when writing to file: {gro_file}")
             raise
         except FileNotFoundError:
             LOG.error(f"One or more input GRO files not found")
-            raise
\ No newline at end of file
+            raise
+
+    def _copy_block(self, src, dst, length, chunk_size=1 << 20):
+        """
+        Copy length bytes from src to dst in chunks.
+        """
+        while length > 0:
+            chunk = src.read(min(chunk_size, length))
+            if not chunk:
+                break
+            dst.write(chunk)
+            length -= len(chunk)
+
+    def _copy_renumbered(self, src, dst, n_atoms, atom, residue, chunk_lines=65536):
+        """
+        Copy n_atoms atom lines from src to dst in chunks of lines, renumbering atoms and
+        residues after the given last atom and residue number. Numbers wrap at 100000.
+
+        Returns:
+            tuple: Last atom and residue number written.
+        """
+        previous = None
+        remaining = n_atoms
+        while remaining > 0:
+            lines = list(itertools.islice(src, min(chunk_lines, remaining)))
+            if not lines:
+                break
+            remaining -= len(lines)
+            out = []
+            for line in lines:
+                atom += 1
+                if line[:10] != previous:
+                    previous = line[:10]
+                    residue += 1
+                out.append(b'%5d%s%5d%s' % (residue % 100000, line[5:15], atom % 100000, line[20:]))
+            dst.writelines(out)
+        return atom, residue
\ No newline at end of file
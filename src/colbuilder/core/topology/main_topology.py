@@ -4,9 +4,11 @@
 import subprocess
 import os
 from pathlib import Path
-from typing import Any, Optional, Set
+from typing import Any, Dict, List, Optional, Set, Tuple
+from dataclasses import dataclass, field
 import shutil
 import asyncio
+import numpy as np
 from colorama import init, Fore, Style
 
 from colbuilder.core.geometry.system import System
@@ -22,6 +24,9 @@ from colbuilder.core.utils.exceptions import (
     ColbuilderErrorDetail
 )
 from colbuilder.core.utils.logger import setup_logger
+from colbuilder.core.utils.runner import run_command
+from colbuilder.core.utils.cache import hash_file
+from colbuilder.core.utils.checkpoint import Checkpoint
 
 LOG = setup_logger(__name__)
 
@@ -66,6 +71,188 @@ def organize_topology_files(topology_dir: Path, species: str) -> None:
     except Exception as e:
         LOG.warning(f"Error organizing topology files: {str(e)}")
 
+@dataclass
+class MoleculeType:
+    """
+    Models sharing one topology: same residue and atom sequence as the representative
+    model and coordinates translated from it.
+
+    Attributes:
+        name (str): Molecule type, name of its ITP file.
+        model (float): ID of the representative model, the only one run through pdb2gmx.
+        fingerprint (str): Fingerprint of the residue and atom sequence.
+        merge_pdb (str): Path to the merged PDB file of the representative model.
+        coords (np.ndarray): Coordinates of the representative model (N, 3).
+        members (Dict[float, np.ndarray]): Translation of each model relative to the representative model.
+    """
+    name: str
+    model: float
+    fingerprint: str
+    merge_pdb: str
+    coords: np.ndarray
+    members: Dict[float, np.ndarray] = field(default_factory=dict)
+
+def merge_model(amber: Amber, model: float) -> Optional[str]:
+    """
+    Merge the PDB files of a model.
+
+    Args:
+        amber (Amber): Amber object of the system.
+        model (float): Model ID.
+
+    Returns:
+        Optional[str]: Path to the merged PDB file, None if the model has nothing to merge.
+
+    Raises:
+        TopologyGenerationError: If the merged PDB file is missing or empty.
+    """
+    type = amber.merge_pdbs(connect_id=model)
+    if type is None:
+        LOG.warning(f"Skipping model {model}: merge_pdbs returned None")
+        return None
+
+    merge_pdb_path = os.path.join(os.getcwd(), type, f"{int(model)}.merge.pdb")
+
+    if not os.path.exists(merge_pdb_path):
+        raise TopologyGenerationError(
+            message=f'Merged PDB file not found: {merge_pdb_path}',
+            error_code="TOP_ERR_004",
+            context={"model": str(model), "path": merge_pdb_path}
+        )
+    if not os.path.getsize(merge_pdb_path):
+        raise TopologyGenerationError(
+            message=f'Merged PDB file is empty: {merge_pdb_path}',
+            error_code="TOP_ERR_004",
+            context={"model": str(model), "path": merge_pdb_path}
+        )
+    return merge_pdb_path
+
+def get_molecule_types(amber: Amber, system: System,
+                       models: List[float]) -> Tuple[List[MoleculeType], List[TopologyGenerationError]]:
+    """
+    Merge all models and group them into molecule types: a model joins the first molecule type
+    with the same fingerprint whose representative it is a translation of, otherwise it
+    becomes the representative of a new molecule type col_<model type><k>.
+
+    Args:
+        amber (Amber): Amber object of the system.
+        system (System): The molecular system.
+        models (List[float]): Model IDs.
+
+    Returns:
+        Tuple[List[MoleculeType], List[TopologyGenerationError]]: Molecule types in order of
+        their representative, and the errors of models that could not be merged.
+    """
+    molecules: List[MoleculeType] = []
+    failures: List[TopologyGenerationError] = []
+    counts: Dict[str, int] = {}
+    for model in models:
+        try:
+            merge_pdb_path = merge_model(amber=amber, model=model)
+        except TopologyGenerationError as e:
+            failures.append(e)
+            continue
+        except Exception as e:
+            LOG.error(f'Error processing model {model}: {str(e)}')
+            continue
+        if merge_pdb_path is None:
+            continue
+
+        fingerprint, coords = amber.read_molecule(merge_pdb=merge_pdb_path)
+        for molecule in molecules:
+            if molecule.fingerprint != fingerprint:
+                continue
+            translate = amber.get_translation(coords=coords, ref_coords=molecule.coords)
+            if translate is not None:
+                molecule.members[model] = translate
+                break
+        else:
+            model_type = system.get_model(model_id=model).type
+            counts[model_type] = counts.get(model_type, 0) + 1
+            molecules.append(MoleculeType(
+                name=f"col_{model_type}{counts[model_type]}",
+                model=model,
+                fingerprint=fingerprint,
+                merge_pdb=merge_pdb_path,
+                coords=coords,
+                members={model: np.zeros(3)}
+            ))
+    return molecules, failures
+
+async def run_pdb2gmx(amber: Amber, molecule: MoleculeType, ff: str, checkpoint: Checkpoint,
+                      semaphore: asyncio.Semaphore) -> bool:
+    """
+    Run pdb2gmx on the representative model of a molecule type, writing <name>.itp,
+    posre_<name>.itp and col_<model>.gro. Molecule types unchanged since the checkpoint
+    are skipped when resuming.
+
+    Args:
+        amber (Amber): Amber object of the system.
+        molecule (MoleculeType): Molecule type.
+        ff (str): Force field name (without '.ff').
+        checkpoint (Checkpoint): Checkpoint manifest of the working directory.
+        semaphore (asyncio.Semaphore): Semaphore bounding concurrent pdb2gmx runs.
+
+    Returns:
+        bool: True once the topology of the molecule type is written.
+
+    Raises:
+        TopologyGenerationError: If pdb2gmx fails.
+    """
+    model, name = molecule.model, molecule.name
+    model_inputs = {'merge': hash_file(molecule.merge_pdb), 'force_field': ff, 'name': name}
+    model_outputs = [f'{name}.itp', f'posre_{name}.itp', f'col_{int(model)}.gro']
+    if checkpoint.get_model('topology', int(model), model_inputs):
+        LOG.debug(f"Resuming: topology of {name} (model {model}) unchanged, skipping pdb2gmx")
+        return True
+
+    async with semaphore:
+        result = await run_command(
+            ['gmx', 'pdb2gmx', '-f', molecule.merge_pdb, '-ignh', '-merge', 'all',
+             '-ff', ff, '-water', 'tip3p', '-p', f'{name}.top',
+             '-o', f'col_{int(model)}.gro', '-i', f'posre_{name}.itp'],
+            env={'GMXLIB': os.getcwd()},
+            check=False
+        )
+
+    if result.returncode != 0:
+        raise TopologyGenerationError(
+            message=f'GROMACS pdb2gmx failed for model {model}',
+            error_code="TOP_ERR_005",
+            context={
+                "model": str(model),
+                "stderr": result.stderr,
+                "stdout": result.stdout
+            }
+        )
+
+    amber.write_itp(itp_file=f'{name}.top')
+    checkpoint.complete_model('topology', int(model), model_inputs, model_outputs)
+    return True
+
+def merge_molecule_types(amber: Amber, molecules: List[MoleculeType]) -> Dict[str, str]:
+    """
+    Merge molecule types whose ITP files are identical apart from their name, e.g. models
+    with the same sequence that are not translations of each other. The ITP files of
+    merged molecule types are removed.
+
+    Args:
+        amber (Amber): Amber object of the system.
+        molecules (List[MoleculeType]): Molecule types with written ITP files.
+
+    Returns:
+        Dict[str, str]: Name of the molecule type used for each molecule type.
+    """
+    names, seen = {}, {}
+    for molecule in molecules:
+        content = (molecule.fingerprint, amber.read_itp(itp_file=f"{molecule.name}.itp", name=molecule.name))
+        names[molecule.name] = seen.setdefault(content, molecule.name)
+        if names[molecule.name] != molecule.name:
+            for itp_file in (f"{molecule.name}.itp", f"posre_{molecule.name}.itp"):
+                if os.path.exists(itp_file):
+                    os.remove(itp_file)
+    return names
+
 @timeit
 async def build_amber99(system: System, config: ColbuilderConfig) -> Amber:
     """
@@ -89,6 +276,7 @@ async def build_amber99(system: System, config: ColbuilderConfig) -> Amber:
     steps = 3
     temp_files = set()
     topology_dir = setup_topology_directory(f"collagen_fibril_{config.species}")
+    checkpoint = Checkpoint(config.working_directory, resume=config.resume)
 
     try:
         if not copied_ff_dir.exists():
@@ -129,61 +317,54 @@ async def build_amber99(system: System, config: ColbuilderConfig) -> Amber:
             LOG.warning(f'Force field directory {ff_name} already in current directory.')
 
         LOG.info(f'Step 2/{steps} Running pdb2gmx with GROMACS')
-        processed_models = []
-
-        for model in system.get_models():
-            try:
-                type = amber.merge_pdbs(connect_id=model)
-                if type is None:
-                    LOG.warning(f"Skipping model {model}: merge_pdbs returned None")
-                    continue
-
-                merge_pdb_path = os.path.join(os.getcwd(), type, f"{int(model)}.merge.pdb")
-
-                if not os.path.exists(merge_pdb_path):
-                    raise TopologyGenerationError(
-                        message=f'Merged PDB file not found: {merge_pdb_path}',
-                        error_code="TOP_ERR_004",
-                        context={"model": str(model), "path": merge_pdb_path}
-                    )
-                if not os.path.getsize(merge_pdb_path):
-                    raise TopologyGenerationError(
-                        message=f'Merged PDB file is empty: {merge_pdb_path}',
-                        error_code="TOP_ERR_004",
-                        context={"model": str(model), "path": merge_pdb_path}
-                    )
-
-                result = await asyncio.create_subprocess_shell(
-                    f'export GMXLIB=$PWD && gmx pdb2gmx -f {merge_pdb_path} -ignh -merge all '
-                    f'-ff {ff} -water tip3p -p col_{int(model)}.top '
-                    f'-o col_{int(model)}.gro -i posre_{int(model)}.itp',
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE
-                )
-                stdout, stderr = await result.communicate()
-
-                if result.returncode != 0:
-                    raise TopologyGenerationError(
-                        message=f'GROMACS pdb2gmx failed for model {model}',
-                        error_code="TOP_ERR_005",
-                        context={
-                            "model": str(model),
-                            "stderr": stderr.decode(),
-                            "stdout": stdout.decode()
-                        }
-                    )
+        models = system.get_models()
+        molecules, failures = get_molecule_types(amber=amber, system=system, models=models)
+        LOG.info(f"{len(molecules)} molecule types for {sum(len(m.members) for m in molecules)} models")
+
+        semaphore = asyncio.Semaphore(max(1, config.n_workers or os.cpu_count() or 1))
+        results = await asyncio.gather(
+            *(run_pdb2gmx(amber=amber, molecule=molecule, ff=ff, checkpoint=checkpoint, semaphore=semaphore)
+              for molecule in molecules),
+            return_exceptions=True
+        )
+
+        completed = []
+        for molecule, result in zip(molecules, results):
+            if isinstance(result, TopologyGenerationError):
+                failures.append(result)
+            elif isinstance(result, Exception):
+                LOG.error(f'Error processing model {molecule.model}: {str(result)}')
+            elif result:
+                completed.append(molecule)
+
+        if failures:
+            raise TopologyGenerationError(
+                message=f'Topology generation failed for {len(failures)} of {len(models)} models: '
+                        + ', '.join(str(failure.detail.context.get("model")) for failure in failures),
+                error_code=failures[0].detail.error_code or "TOP_ERR_005",
+                context={
+                    "models": [failure.detail.context.get("model") for failure in failures],
+                    "errors": [failure.detail.message for failure in failures],
+                    "stderr": failures[0].detail.context.get("stderr")
+                }
+            )
 
-                LOG.debug(f'pdb2gmx output for model {model}: {stdout.decode()}')
+        names = merge_molecule_types(amber=amber, molecules=completed)
+        molecule_types = {}
+        for molecule in completed:
+            for model, translate in molecule.members.items():
+                if model != molecule.model:
+                    amber.translate_gro(gro_in=f"col_{int(molecule.model)}.gro",
+                                        gro_out=f"col_{int(model)}.gro", translate=translate)
+                molecule_types[model] = names[molecule.name]
 
-                amber.write_itp(itp_file=f'col_{int(model)}.top')
-                processed_models.append(model)
+        # Models of the same molecule type are listed together in the topology and GRO file
+        order = list(dict.fromkeys(names[molecule.name] for molecule in completed))
+        processed_models = sorted(molecule_types, key=lambda model: (order.index(molecule_types[model]),
+                                                                     models.index(model)))
 
-            except TopologyGenerationError:
-                raise
-            except Exception as e:
-                LOG.error(f'Error processing model {model}: {str(e)}')
-
-        LOG.info(f"{Fore.BLUE}Processed {len(processed_models)} out of {len(system.get_models())} models.{Style.RESET_ALL}")
+        LOG.info(f"{Fore.BLUE}Processed {len(processed_models)} out of {len(models)} models "
+                 f"as {len(order)} molecule types.{Style.RESET_ALL}")
 
         if not processed_models:
             raise TopologyGenerationError(
@@ -196,7 +377,8 @@ async def build_amber99(system: System, config: ColbuilderConfig) -> Amber:
             amber.write_topology(
                 system=system, 
                 topology_file=f"collagen_fibril_{config.species}.top", 
-                processed_models=processed_models
+                processed_models=processed_models,
+                molecule_types=molecule_types
             )
             amber.write_gro(
                 system=system, 
@@ -0,0 +1,220 @@
+# Copyright (c) 2024, Colbuilder Development Team
+# Distributed under the terms of the Apache License 2.0
+
+"""
+Content-addressed cache of intermediate results, by default in ~/.cache/colbuilder.
+
+Each entry is a directory named by the hash of everything its content depends on
+(file contents and parameters). Entries are written to a temporary directory first
+and renamed into place, so a cache shared by concurrent runs never holds partial
+entries. The cache is bounded in size: reading an entry marks it as recently used,
+and the least recently used entries are evicted once the bound is exceeded.
+"""
+
+from __future__ import annotations
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Generator, Iterable, List, Optional, Tuple, Union
+
+from colbuilder.core.utils.logger import setup_logger
+
+LOG = setup_logger(__name__)
+
+CACHE_VERSION = 1
+STAMP = '.last_used'
+
+def get_cache_dir() -> Path:
+    """
+    Get the default cache directory: $COLBUILDER_CACHE_DIR, else $XDG_CACHE_HOME/colbuilder,
+    else ~/.cache/colbuilder.
+
+    Returns:
+        Path: Cache directory.
+    """
+    if os.environ.get('COLBUILDER_CACHE_DIR'):
+        return Path(os.environ['COLBUILDER_CACHE_DIR'])
+    return Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache') / 'colbuilder'
+
+def hash_file(path: Union[str, Path]) -> str:
+    """
+    Get the SHA-256 hash of a file's contents.
+
+    Args:
+        path (Union[str, Path]): Path to the file.
+
+    Returns:
+        str: Hex digest.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class Cache:
+    """
+    Size-bounded, content-addressed cache of directories.
+
+    Attributes:
+        cache_dir (Path): Directory holding one subdirectory per entry.
+        max_size (int): Maximum total size of all entries in bytes.
+    """
+    def __init__(self, cache_dir: Optional[Union[str, Path]] = None, max_size: float = 1024):
+        """
+        Args:
+            cache_dir (Optional[Union[str, Path]]): Cache directory. If None, uses get_cache_dir().
+            max_size (float): Maximum total size of all entries in MB.
+        """
+        self.cache_dir = Path(cache_dir).expanduser() if cache_dir else get_cache_dir()
+        self.max_size = int(max_size * 1024 ** 2)
+
+    def get_key(self, namespace: str, files: Iterable[Optional[Union[str, Path]]] = (), **params: Any) -> str:
+        """
+        Get the key of an entry from the contents of its input files and its parameters.
+
+        Args:
+            namespace (str): Kind of entry, e.g. 'geometry'.
+            files (Iterable[Optional[Union[str, Path]]]): Input files, None for a missing input.
+            **params: Parameters, serializable to JSON.
+
+        Returns:
+            str: Key of the entry.
+        """
+        content = {
+            'version': CACHE_VERSION,
+            'namespace': namespace,
+            'files': [hash_file(f) if f is not None else None for f in files],
+            'params': params,
+        }
+        return f"{namespace}-{hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()}"
+
+    def get(self, key: str) -> Optional[Path]:
+        """
+        Get the directory of an entry and mark it as recently used.
+
+        Args:
+            key (str): Key of the entry.
+
+        Returns:
+            Optional[Path]: Directory of the entry, None if not cached.
+        """
+        entry = self.cache_dir / key
+        if not entry.is_dir():
+            LOG.debug(f"Cache miss: {key}")
+            return None
+        try:
+            (entry / STAMP).touch()
+        except OSError as e:
+            LOG.debug(f"Failed to mark cache entry {key} as used: {e}")
+        LOG.debug(f"Cache hit: {key}")
+        return entry
+
+    @contextmanager
+    def put(self, key: str) -> Generator[Path, None, None]:
+        """
+        Add an entry: files written to the yielded directory are moved into the cache on exit.
+        Nothing is added if writing fails, and an existing entry is kept.
+
+        Args:
+            key (str): Key of the entry.
+
+        Yields:
+            Path: Temporary directory to write the entry to.
+        """
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp = Path(tempfile.mkdtemp(prefix=f".{key}-", dir=self.cache_dir))
+        try:
+            yield tmp
+            (tmp / STAMP).touch()
+            try:
+                os.rename(tmp, self.cache_dir / key)
+            except OSError:
+                LOG.debug(f"Cache entry {key} already exists")
+            else:
+                LOG.debug(f"Cached {key}")
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.evict()
+
+    def get_entries(self) -> List[Tuple[float, int, Path]]:
+        """
+        Get all entries with their last use and size.
+
+        Returns:
+            List[Tuple[float, int, Path]]: Time of last use, size in bytes and directory of each entry.
+        """
+        entries = []
+        if not self.cache_dir.is_dir():
+            return entries
+        for entry in self.cache_dir.iterdir():
+            if not entry.is_dir() or entry.name.startswith('.'):
+                continue
+            try:
+                files = [f for f in entry.rglob('*') if f.is_file()]
+                size = sum(f.stat().st_size for f in files)
+                stamp = entry / STAMP
+                last_used = stamp.stat().st_mtime if stamp.exists() else entry.stat().st_mtime
+            except OSError:
+                continue
+            entries.append((last_used, size, entry))
+        return entries
+
+    def evict(self) -> List[Path]:
+        """
+        Remove least recently used entries until the cache fits its maximum size.
+        Leftover temporary directories older than a day are removed as well.
+
+        Returns:
+            List[Path]: Directories of the removed entries.
+        """
+        removed = []
+        entries = sorted(self.get_entries())
+        total = sum(size for _, size, _ in entries)
+        for last_used, size, entry in entries:
+            if total <= self.max_size:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            removed.append(entry)
+        if removed:
+            LOG.debug(f"Evicted {len(removed)} cache entries, cache size {total / 1024 ** 2:.1f} MB")
+
+        for tmp in self.cache_dir.glob('.*-*'):
+            try:
+                if tmp.is_dir() and time.time() - tmp.stat().st_mtime > 86400:
+                    shutil.rmtree(tmp, ignore_errors=True)
+            except OSError:
+                continue
+        return removed
+
+    def write_json(self, entry: Path, name: str, data: Dict[str, Any]) -> None:
+        """
+        Write JSON data to a file of an entry.
+
+        Args:
+            entry (Path): Directory of the entry.
+            name (str): File name.
+            data (Dict[str, Any]): Data serializable to JSON.
+        """
+        with open(entry / name, 'w') as f:
+            json.dump(data, f)
+
+    def read_json(self, entry: Path, name: str) -> Dict[str, Any]:
+        """
+        Read JSON data from a file of an entry.
+
+        Args:
+            entry (Path): Directory of the entry.
+            name (str): File name.
+
+        Returns:
+            Dict[str, Any]: Data of the file.
+        """
+        with open(entry / name, 'r') as f:
+            return json.load(f)
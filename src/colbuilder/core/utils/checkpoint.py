@@ -0,0 +1,298 @@
+# Copyright (c) 2024, Colbuilder Development Team
+# Distributed under the terms of the Apache License 2.0
+
+"""
+Stage checkpoints of the pipeline, to resume a run after a failure.
+
+The manifest colbuilder_checkpoint.json in the working directory records each completed
+stage (sequence, geometry, mix, replace, topology) with the config fields it depends on,
+content hashes of its input and output files, and the digest of the stage before it.
+A stage is skipped on resume if all of these are unchanged. Input files are hashed once
+the stage completes, so inputs normalized in place by a stage (the geometry stage
+centers the template PDB) still match on resume.
+
+Stages producing a system keep a snapshot of it in colbuilder_checkpoint/<stage>.pkl,
+which replaces the system of a skipped stage. Single models of a stage, e.g. the
+pdb2gmx run of each model of the topology, are recorded the same way.
+"""
+
+from __future__ import annotations
+import hashlib
+import json
+import os
+import pickle
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence, Union
+
+from colbuilder.core.utils.cache import hash_file
+from colbuilder.core.utils.logger import setup_logger
+
+LOG = setup_logger(__name__)
+
+MANIFEST = 'colbuilder_checkpoint.json'
+SNAPSHOT_DIR = 'colbuilder_checkpoint'
+MANIFEST_VERSION = 1
+
+STAGE_FIELDS: Dict[str, Sequence[str]] = {
+    'sequence': ('species', 'crosslink', 'n_term_type', 'c_term_type',
+                 'n_term_combination', 'c_term_combination', 'crosslink_replicas', 'crosslink_exchange',
+                 'crosslink_batch'),
+    'geometry': ('contact_distance', 'fibril_length', 'crystalcontacts_optimize', 'solution_space',
+                 'pdb_first_line', 'mix_bool', 'ratio_mix', 'replace_bool', 'ratio_replace', 'native_caps'),
+    'mix': ('contact_distance', 'fibril_length', 'crystalcontacts_optimize', 'solution_space', 'ratio_mix',
+            'native_caps'),
+    'replace': ('ratio_replace',),
+    'topology': ('species', 'force_field'),
+}
+
+STAGE_FILES: Dict[str, Sequence[str]] = {
+    'sequence': ('fasta_file',),
+    'geometry': ('pdb_file', 'crystalcontacts_file', 'connect_file', 'files_mix', 'replace_file'),
+    'mix': ('files_mix', 'crystalcontacts_file', 'connect_file'),
+    'replace': ('replace_file',),
+    'topology': (),
+}
+
+def hash_input(path: Optional[Union[str, Path]]) -> Optional[str]:
+    """
+    Hash an input file, given with or without its .pdb/.txt suffix.
+
+    Args:
+        path (Optional[Union[str, Path]]): Path to the file.
+
+    Returns:
+        Optional[str]: Hex digest, None if not given or not found.
+    """
+    if path is None:
+        return None
+    for candidate in (Path(path), Path(path).with_suffix('.pdb'), Path(path).with_suffix('.txt')):
+        if candidate.is_file():
+            return hash_file(candidate)
+    return None
+
+def get_digest(data: Any) -> str:
+    """
+    Get the SHA-256 digest of JSON data.
+
+    Args:
+        data (Any): Data serializable to JSON.
+
+    Returns:
+        str: Hex digest.
+    """
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+class Checkpoint:
+    """
+    Checkpoint manifest of a working directory.
+
+    The manifest is read before and written after every update, so several Checkpoint
+    objects of the same working directory stay consistent.
+
+    Attributes:
+        working_directory (Path): Directory of the manifest and of the snapshots.
+        resume (bool): Whether completed stages and models may be skipped.
+        manifest (Path): Path to the manifest.
+    """
+    def __init__(self, working_directory: Union[str, Path] = '.', resume: bool = False):
+        self.working_directory = Path(working_directory)
+        self.resume = resume
+        self.manifest = self.working_directory / MANIFEST
+
+    def read(self) -> Dict[str, Any]:
+        """
+        Read the manifest.
+
+        Returns:
+            Dict[str, Any]: Manifest, empty if missing, unreadable or of another version.
+        """
+        empty = {'version': MANIFEST_VERSION, 'stages': {}, 'models': {}}
+        try:
+            with open(self.manifest, 'r') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return empty
+        except (OSError, ValueError) as e:
+            LOG.warning(f"Ignoring unreadable checkpoint manifest {self.manifest}: {str(e)}")
+            return empty
+        return manifest if manifest.get('version') == MANIFEST_VERSION else empty
+
+    def write(self, manifest: Dict[str, Any]) -> None:
+        """
+        Write the manifest atomically.
+
+        Args:
+            manifest (Dict[str, Any]): Manifest.
+        """
+        tmp = self.manifest.with_name(f".{self.manifest.name}.{os.getpid()}")
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp, self.manifest)
+
+    def get_inputs(self, stage: str, config: Any, upstream: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Get the inputs of a stage: config fields, hashes of input files and digest of the stage before.
+
+        Args:
+            stage (str): Stage name.
+            config (Any): Configuration settings.
+            upstream (Optional[str]): Digest of the stage run before, None for the first stage.
+
+        Returns:
+            Dict[str, Any]: Inputs of the stage.
+        """
+        files = {}
+        for field in STAGE_FILES[stage]:
+            value = getattr(config, field, None)
+            if isinstance(value, (list, tuple)):
+                files[field] = [hash_input(path) for path in value]
+            else:
+                files[field] = hash_input(value)
+        inputs = {
+            'params': {field: getattr(config, field, None) for field in STAGE_FIELDS[stage]},
+            'files': files,
+            'upstream': upstream
+        }
+        return json.loads(json.dumps(inputs, default=str))
+
+    def hash_outputs(self, outputs: Sequence[Union[str, Path]]) -> Dict[str, Optional[str]]:
+        """
+        Hash output files.
+
+        Args:
+            outputs (Sequence[Union[str, Path]]): Paths to the output files.
+
+        Returns:
+            Dict[str, Optional[str]]: Hex digest of each file, None for missing files.
+        """
+        return {str(path): hash_file(path) if Path(path).is_file() else None for path in outputs}
+
+    def get_stage(self, stage: str, config: Any, upstream: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Get the record of a completed stage if it can be skipped: resuming, inputs unchanged
+        and all outputs unchanged.
+
+        Args:
+            stage (str): Stage name.
+            config (Any): Configuration settings.
+            upstream (Optional[str]): Digest of the stage run before, None for the first stage.
+
+        Returns:
+            Optional[Dict[str, Any]]: Record of the stage with its digest and result, None if the stage has to run.
+        """
+        if not self.resume:
+            return None
+        record = self.read()['stages'].get(stage)
+        if record is None:
+            return None
+        if record['inputs'] != self.get_inputs(stage, config, upstream):
+            LOG.info(f"Inputs of stage {stage} changed since the checkpoint, running it again")
+            return None
+        if self.hash_outputs(list(record['outputs'])) != record['outputs']:
+            LOG.info(f"Outputs of stage {stage} changed since the checkpoint, running it again")
+            return None
+        if record.get('snapshot') and not (self.working_directory / record['snapshot']).is_file():
+            return None
+        return record
+
+    def complete_stage(self, stage: str, config: Any, upstream: Optional[str] = None,
+                       outputs: Sequence[Union[str, Path]] = (), result: Optional[Dict[str, Any]] = None,
+                       system: Optional[Any] = None) -> str:
+        """
+        Record a completed stage.
+
+        Args:
+            stage (str): Stage name.
+            config (Any): Configuration settings.
+            upstream (Optional[str]): Digest of the stage run before, None for the first stage.
+            outputs (Sequence[Union[str, Path]]): Output files of the stage.
+            result (Optional[Dict[str, Any]]): Result of the stage, serializable to JSON.
+            system (Optional[Any]): System produced by the stage, kept as snapshot.
+
+        Returns:
+            str: Digest of the stage, upstream of the next stage.
+        """
+        record = {
+            'inputs': self.get_inputs(stage, config, upstream),
+            'outputs': self.hash_outputs(outputs),
+            'result': result,
+            'snapshot': self.save_system(stage, system) if system is not None else None,
+            'completed': time.strftime('%Y-%m-%d %H:%M:%S')
+        }
+        record['digest'] = get_digest({key: record[key] for key in ('inputs', 'outputs', 'result')})
+        manifest = self.read()
+        manifest['stages'][stage] = record
+        self.write(manifest)
+        LOG.debug(f"Checkpoint of stage {stage} written to {self.manifest}")
+        return record['digest']
+
+    def save_system(self, stage: str, system: Any) -> str:
+        """
+        Keep a snapshot of the system produced by a stage.
+
+        Args:
+            stage (str): Stage name.
+            system (Any): System.
+
+        Returns:
+            str: Path of the snapshot relative to the working directory.
+        """
+        snapshot = Path(SNAPSHOT_DIR) / f"{stage}.pkl"
+        path = self.working_directory / snapshot
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}")
+        with open(tmp, 'wb') as f:
+            pickle.dump(system, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        return str(snapshot)
+
+    def load_system(self, record: Dict[str, Any]) -> Any:
+        """
+        Load the snapshot of the system of a completed stage.
+
+        Args:
+            record (Dict[str, Any]): Record of the stage returned by get_stage.
+
+        Returns:
+            Any: System.
+        """
+        with open(self.working_directory / record['snapshot'], 'rb') as f:
+            return pickle.load(f)
+
+    def get_model(self, stage: str, model: Union[str, int], inputs: Dict[str, Any]) -> bool:
+        """
+        Check if a model of a stage can be skipped: resuming, inputs unchanged and outputs unchanged.
+
+        Args:
+            stage (str): Stage name.
+            model (Union[str, int]): Model identifier.
+            inputs (Dict[str, Any]): Inputs of the model, e.g. hashes of its input files.
+
+        Returns:
+            bool: True if the model is complete.
+        """
+        if not self.resume:
+            return False
+        record = self.read()['models'].get(stage, {}).get(str(model))
+        if record is None or record['inputs'] != json.loads(json.dumps(inputs, default=str)):
+            return False
+        return self.hash_outputs(list(record['outputs'])) == record['outputs']
+
+    def complete_model(self, stage: str, model: Union[str, int], inputs: Dict[str, Any],
+                       outputs: Sequence[Union[str, Path]]) -> None:
+        """
+        Record a completed model of a stage.
+
+        Args:
+            stage (str): Stage name.
+            model (Union[str, int]): Model identifier.
+            inputs (Dict[str, Any]): Inputs of the model, e.g. hashes of its input files.
+            outputs (Sequence[Union[str, Path]]): Output files of the model.
+        """
+        manifest = self.read()
+        manifest['models'].setdefault(stage, {})[str(model)] = {
+            'inputs': json.loads(json.dumps(inputs, default=str)),
+            'outputs': self.hash_outputs(outputs)
+        }
+        self.write(manifest)
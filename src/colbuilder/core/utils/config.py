@@ -47,6 +47,9 @@ class ColbuilderConfig(BaseModel):
     c_term_type: Optional[str] = Field(None, description="C-terminal type")
     n_term_combination: Optional[str] = Field(None, description="N-terminal combination")
     c_term_combination: Optional[str] = Field(None, description="C-terminal combination")
+    crosslink_replicas: int = Field(default=1, ge=1, description="Seeded Monte Carlo replicas per crosslink optimization, the best is kept")
+    crosslink_exchange: int = Field(default=0, ge=0, description="Steps between temperature exchanges of the crosslink replicas, 0 for independent replicas")
+    crosslink_batch: int = Field(default=1, ge=1, description="Crosslink Monte Carlo moves scored per step, the best one is tried")
 
     # Fibril geometry generation mode
     geometry_generator: bool = Field(default=False, description="Run geometry generation")
@@ -60,6 +63,13 @@ class ColbuilderConfig(BaseModel):
         default=(1, 1, 1),
         description="Solution space"
     )
+    geometry_cache: bool = Field(default=True, description="Reuse crystal contacts, connections and cut models of identical geometry inputs")
+    cache_dir: Optional[Path] = Field(None, description="Cache directory, ~/.cache/colbuilder if not set")
+    cache_size: float = Field(default=1024, description="Maximum size of the cache in MB, least recently used entries are evicted")
+    resume: bool = Field(default=False, description="Skip stages and topology models unchanged since the last checkpoint")
+    native_caps: bool = Field(default=True, description="Place terminal caps from ideal internal coordinates instead of with PyMOL")
+    chimera_worker: bool = Field(default=True, description="Run all Chimera calls in one persistent Chimera process")
+    n_workers: Optional[int] = Field(None, description="Number of worker processes and concurrent external tools, all CPUs if not set")
     pdb_first_line: Optional[str] = Field(
         default="CRYST1   39.970   26.950  677.900  89.24  94.59 105.58 P 1           2",
         description="Crystal contacts information"
@@ -16,4 +16,14 @@ FASTA_EXTENSION: Final = ".fasta"
 
 # PDB format constants
 DEFAULT_PDB_HEADER: Final = "CRYST1   39.970   26.950  677.900  89.24  94.59 105.58 P 1           2"
-ATOM_RECORD_LENGTH: Final = 80
\ No newline at end of file
+ATOM_RECORD_LENGTH: Final = 80
+
+# Atomic masses (Dalton) of the elements found in collagen PDB files
+ATOM_MASSES: Final = {
+    "H": 1.008,
+    "C": 12.011,
+    "N": 14.007,
+    "O": 15.999,
+    "S": 32.06,
+    "P": 30.974,
+}
@@ -1,6 +1,5 @@
 # crosslinks.py
 import os
-import asyncio
 import subprocess
 from pathlib import Path
 from typing import List, Tuple, Dict, Optional, Any
@@ -16,6 +15,7 @@ from .constants import (
 from colbuilder.core.utils.exceptions import SequenceGenerationError, SystemError
 from colbuilder.core.sequence.optimize_crosslinks import optimize_structure
 from colbuilder.core.utils.logger import setup_logger
+from colbuilder.core.geometry.chimera import run_chimera_script
 
 LOG = setup_logger(__name__)
 
@@ -130,9 +130,15 @@ def extract_crosslinks_from_dataframe(
 class CrosslinkOptimizer:
     """Handles the optimization of crosslink positions."""
     
-    def __init__(self, crosslink_pairs: List[CrosslinkPair], chimera_scripts_dir: Path):
+    def __init__(self, crosslink_pairs: List[CrosslinkPair], chimera_scripts_dir: Path,
+                 n_workers: Optional[int] = None, n_replicas: int = 1, exchange_steps: int = 0,
+                 batch_size: int = 1):
         self.crosslink_pairs = crosslink_pairs
         self.chimera_scripts_dir = chimera_scripts_dir
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.n_replicas = n_replicas
+        self.exchange_steps = exchange_steps
+        self.batch_size = batch_size
         self.state = OptimizationState()
 
     def _get_distance_threshold(self) -> float:
@@ -178,7 +184,11 @@ class CrosslinkOptimizer:
                     copy1_pdb=str(generated_pdbs[0]),
                     copy2_pdb=str(generated_pdbs[1]),
                     crosslink_info=crosslink_info,
-                    optimized_pdb=str(output_pdb)
+                    optimized_pdb=str(output_pdb),
+                    n_workers=self.n_workers,
+                    n_replicas=self.n_replicas,
+                    exchange_steps=self.exchange_steps,
+                    batch_size=self.batch_size
                 )
                 
                 current_input = output_pdb
@@ -211,32 +221,21 @@ class CrosslinkOptimizer:
     async def _generate_copies(self, input_pdb: Path) -> List[Path]:
         """Generate copies using Chimera."""
         try:
-            generate_copies_script = self.chimera_scripts_dir / 'generate_copies.py'
             generated_pdbs_file = Path("generated_pdbs.txt")
             
-            env = os.environ.copy()
-            env['INPUT_PDB'] = str(input_pdb)
+            env = {'INPUT_PDB': str(input_pdb)}
             
-            generate_command = ['chimera', '--nogui', '--script', str(generate_copies_script)]
+            result = await run_chimera_script(self.chimera_scripts_dir, 'generate_copies.py', env=env)
             
-            process = await asyncio.create_subprocess_exec(
-                *generate_command,
-                env=env,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            
-            stdout, stderr = await process.communicate()
-            
-            if process.returncode != 0:
+            if result.returncode != 0:
                 raise SystemError(
                     "Chimera process failed during copy generation",
                     error_code="SYS_ERR_001",
                     context={
-                        "returncode": process.returncode,
-                        "stdout": stdout.decode() if stdout else None,
-                        "stderr": stderr.decode() if stderr else None,
-                        "command": generate_command
+                        "returncode": result.returncode,
+                        "stdout": result.stdout or None,
+                        "stderr": result.stderr or None,
+                        "command": result.command
                     }
                 )
             
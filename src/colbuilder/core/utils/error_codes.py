@@ -54,6 +54,16 @@ SYSTEM_ERRORS: Dict[str, ErrorInfo] = {
             "Ensure module path is correct",
             "Check for version conflicts between dependencies"
         ]
+    ),
+    "SYS_ERR_003": ErrorInfo(
+        code="SYS_ERR_003",
+        message="External tool failed or timed out",
+        suggestions=[
+            "Verify the tool (chimera, gmx, muscle) is installed and in PATH",
+            "Check the tool output in the debug log",
+            "Increase the timeout for long-running calls",
+            "Reduce the number of concurrent external processes"
+        ]
     )
 }
 
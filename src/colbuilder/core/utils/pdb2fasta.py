@@ -1,6 +1,8 @@
 # Adapted from https://github.com/kad-ecoli/pdb2fasta
-import re
 import sys
+import numpy as np
+
+from colbuilder.core.utils import pdbio
 
 def pdb_to_fasta(pdb_file):
     aa3to1 = {
@@ -15,29 +17,20 @@ def pdb_to_fasta(pdb_file):
         "L3X": "-", "LYY": "-"
     }
     
-    ca_pattern = re.compile(
-        "^ATOM\s{2,6}\d{1,5}\s{2}CA\s[\sA]([A-Z]{3})\s([\s\w])|"
-        "^ATOM\s{2,6}\d{1,5}\s{2}CA\s[\sA](HYP|L4Y|L5Y|L4X|L5X|LY4|LY5|LX4|LX5)\s([\s\w])|"
-        "^ATOM\s{2,6}\d{1,5}\s{2}CA\s[\sA](LY2|LY3|LYX|LX2|LX3|LXX|L2Y|L3Y|LXY|L2X|L3X|LYY)\s([\s\w])|"
-        "^HETATM\s{0,4}\d{1,5}\s{2}CA\s[\sA](MSE)\s([\s\w])"
-    )
+    atoms = pdbio.read_atoms(pdb_file, first_model=True)
+    resname = np.char.strip(atoms['resname'])
+    is_ca = (atoms['name'] == ' CA ') & np.isin(atoms['altloc'], [' ', 'A', ''])
+    is_residue = (atoms['record'] == 'ATOM  ') | ((atoms['record'] == 'HETATM') & (resname == 'MSE'))
     
     chain_dict = {}
     chain_list = []
     
-    with open(pdb_file, 'r') as fp:
-        for line in fp:
-            if line.startswith("ENDMDL"):
-                break
-            match_list = ca_pattern.findall(line)
-            if match_list:
-                resn = match_list[0][0] + match_list[0][2] + match_list[0][4]
-                chain = match_list[0][1] + match_list[0][3] + match_list[0][5]
-                if chain in chain_dict:
-                    chain_dict[chain] += aa3to1[resn]
-                else:
-                    chain_dict[chain] = aa3to1[resn]
-                    chain_list.append(chain)
+    for resn, chain in zip(resname[is_ca & is_residue], atoms['chain'][is_ca & is_residue]):
+        if chain in chain_dict:
+            chain_dict[chain] += aa3to1[resn]
+        else:
+            chain_dict[chain] = aa3to1[resn]
+            chain_list.append(chain)
     
     fasta_content = ""
     for chain in chain_list:
@@ -0,0 +1,205 @@
+# Copyright (c) 2024, Colbuilder Development Team
+# Distributed under the terms of the Apache License 2.0
+
+"""
+Fixed-column reader and writer for ATOM/HETATM records of PDB files.
+
+Atom records are parsed in bulk into NumPy structured arrays (ATOM_DTYPE): the selected
+lines are padded to 80 columns, joined into one buffer and sliced column-wise with
+np.frombuffer. Writing formats whole columns at once. TER records are kept as a flag
+on the atom before them.
+"""
+
+from __future__ import annotations
+import numpy as np
+from functools import reduce
+from pathlib import Path
+from typing import List, Optional, Sequence, Union
+
+from colbuilder.core.utils.constants import ATOM_RECORD_LENGTH
+
+ATOM_RECORDS = ('ATOM  ', 'HETATM')
+
+ATOM_DTYPE = np.dtype([
+    ('record', 'U6'), ('serial', 'U5'), ('name', 'U4'), ('altloc', 'U1'), ('resname', 'U4'),
+    ('chain', 'U1'), ('resid', 'U4'), ('icode', 'U1'), ('x', 'f8'), ('y', 'f8'), ('z', 'f8'),
+    ('tail', 'U26'), ('ter', '?')
+])
+
+_COLUMNS = {
+    'record': (0, 6), 'serial': (6, 11), 'name': (12, 16), 'altloc': (16, 17), 'resname': (17, 21),
+    'chain': (21, 22), 'resid': (22, 26), 'icode': (26, 27), 'x': (30, 38), 'y': (38, 46),
+    'z': (46, 54), 'tail': (54, ATOM_RECORD_LENGTH)
+}
+
+_RAW_DTYPE = np.dtype({
+    'names': list(_COLUMNS),
+    'formats': [f"S{end - start}" for start, end in _COLUMNS.values()],
+    'offsets': [start for start, _ in _COLUMNS.values()],
+    'itemsize': ATOM_RECORD_LENGTH
+})
+
+def read_lines(pdb: Union[str, Path]) -> List[str]:
+    """
+    Read all lines of a PDB file.
+
+    Args:
+        pdb (Union[str, Path]): Path to the PDB file.
+
+    Returns:
+        List[str]: Lines including line endings.
+    """
+    with open(pdb, 'r') as f:
+        return f.readlines()
+
+def parse_atoms(lines: Union[str, Sequence[str]], first_model: bool = False) -> np.ndarray:
+    """
+    Parse ATOM/HETATM records into a structured array.
+
+    Args:
+        lines (Union[str, Sequence[str]]): Content or lines of a PDB file.
+        first_model (bool): Stop at the first ENDMDL record.
+
+    Returns:
+        np.ndarray: Structured atoms (ATOM_DTYPE).
+    """
+    if isinstance(lines, str):
+        lines = lines.splitlines()
+
+    atom_lines, ter = [], []
+    for line in lines:
+        record = line[:6]
+        if record in ATOM_RECORDS:
+            atom_lines.append(line.rstrip('\r\n')[:ATOM_RECORD_LENGTH].ljust(ATOM_RECORD_LENGTH))
+        elif record.startswith('TER') and atom_lines:
+            ter.append(len(atom_lines) - 1)
+        elif first_model and record == 'ENDMDL':
+            break
+
+    atoms = np.zeros(len(atom_lines), dtype=ATOM_DTYPE)
+    if not atom_lines:
+        return atoms
+
+    raw = np.frombuffer(''.join(atom_lines).encode('latin-1'), dtype=_RAW_DTYPE)
+    for field in ('x', 'y', 'z'):
+        atoms[field] = raw[field].astype(float)
+    for field in ('record', 'serial', 'name', 'altloc', 'resname', 'chain', 'resid', 'icode'):
+        atoms[field] = np.char.decode(raw[field], 'latin-1')
+    atoms['tail'] = np.char.rstrip(np.char.decode(raw['tail'], 'latin-1'))
+    atoms['ter'][ter] = True
+    return atoms
+
+def read_atoms(pdb: Union[str, Path], first_model: bool = False) -> np.ndarray:
+    """
+    Read ATOM/HETATM records of a PDB file into a structured array.
+
+    Args:
+        pdb (Union[str, Path]): Path to the PDB file.
+        first_model (bool): Stop at the first ENDMDL record.
+
+    Returns:
+        np.ndarray: Structured atoms (ATOM_DTYPE).
+    """
+    return parse_atoms(read_lines(pdb), first_model=first_model)
+
+def read_coords(pdb: Union[str, Path]) -> np.ndarray:
+    """
+    Read atom coordinates of a PDB file.
+
+    Args:
+        pdb (Union[str, Path]): Path to the PDB file.
+
+    Returns:
+        np.ndarray: Coordinates with shape (N, 3).
+    """
+    return get_coords(read_atoms(pdb))
+
+def get_coords(atoms: np.ndarray) -> np.ndarray:
+    """
+    Get coordinates of structured atoms.
+
+    Args:
+        atoms (np.ndarray): Structured atoms.
+
+    Returns:
+        np.ndarray: Coordinates with shape (N, 3).
+    """
+    return np.column_stack((atoms['x'], atoms['y'], atoms['z'])).reshape(-1, 3)
+
+def set_coords(atoms: np.ndarray, coords: np.ndarray) -> np.ndarray:
+    """
+    Set coordinates of structured atoms in place, rounded to the precision of PDB files.
+
+    Args:
+        atoms (np.ndarray): Structured atoms.
+        coords (np.ndarray): Coordinates with shape (N, 3).
+
+    Returns:
+        np.ndarray: The updated atoms.
+    """
+    coords = np.round(np.asarray(coords, dtype=float).reshape(-1, 3), decimals=3)
+    atoms['x'], atoms['y'], atoms['z'] = coords[:, 0], coords[:, 1], coords[:, 2]
+    return atoms
+
+def format_atoms(atoms: np.ndarray, ter: bool = True) -> List[str]:
+    """
+    Format structured atoms as PDB lines.
+
+    Args:
+        atoms (np.ndarray): Structured atoms.
+        ter (bool): Write a TER record after each flagged atom.
+
+    Returns:
+        List[str]: Lines of a PDB file.
+    """
+    if not len(atoms):
+        return []
+    columns = [
+        np.char.ljust(atoms['record'], 6), np.char.rjust(atoms['serial'], 5), ' ',
+        np.char.ljust(atoms['name'], 4), np.char.ljust(atoms['altloc'], 1),
+        np.char.ljust(atoms['resname'], 4), np.char.ljust(atoms['chain'], 1),
+        np.char.rjust(atoms['resid'], 4), np.char.ljust(atoms['icode'], 1), '   ',
+        np.char.mod('%8.3f', atoms['x']), np.char.mod('%8.3f', atoms['y']), np.char.mod('%8.3f', atoms['z']),
+        atoms['tail'], '\n'
+    ]
+    lines = reduce(np.char.add, columns).astype(object)
+    if ter and atoms['ter'].any():
+        lines = np.insert(lines, np.flatnonzero(atoms['ter']) + 1, 'TER\n')
+    return lines.tolist()
+
+def write_atoms(pdb: Union[str, Path], atoms: np.ndarray, header: Optional[str] = None, end: bool = True) -> None:
+    """
+    Write structured atoms to a PDB file.
+
+    Args:
+        pdb (Union[str, Path]): Path to the output PDB file.
+        atoms (np.ndarray): Structured atoms.
+        header (Optional[str]): Line written before the atoms, e.g. the CRYST1 record.
+        end (bool): Close the file with an END record.
+    """
+    with open(pdb, 'w') as f:
+        if header:
+            f.write(header if header.endswith('\n') else f"{header}\n")
+        f.writelines(format_atoms(atoms))
+        if end:
+            f.write('END\n')
+
+def update_atoms(pdb: Union[str, Path], atoms: np.ndarray) -> None:
+    """
+    Rewrite the ATOM/HETATM records of a PDB file in place, all other records are kept.
+
+    Args:
+        pdb (Union[str, Path]): Path to the PDB file.
+        atoms (np.ndarray): Structured atoms, one for each ATOM/HETATM record of the file.
+
+    Raises:
+        ValueError: If the number of atoms does not match the file.
+    """
+    lines = read_lines(pdb)
+    idx = [i for i, line in enumerate(lines) if line[:6] in ATOM_RECORDS]
+    if len(idx) != len(atoms):
+        raise ValueError(f"Expected {len(idx)} atoms for {pdb}, got {len(atoms)}")
+    for i, line in zip(idx, format_atoms(atoms, ter=False)):
+        lines[i] = line
+    with open(pdb, 'w') as f:
+        f.writelines(lines)
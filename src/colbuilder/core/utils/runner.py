@@ -0,0 +1,171 @@
+# Copyright (c) 2024, Colbuilder Development Team
+# Distributed under the terms of the Apache License 2.0
+
+"""
+Asynchronous runner for external tools (chimera, gmx, muscle).
+
+Commands are started with asyncio.create_subprocess_exec, never through a shell.
+Output is streamed line by line to the debug log while the process runs, and a
+global limit bounds the number of external processes running at the same time.
+Each call reports its wall time, CPU time and maximum resident set size.
+"""
+
+from __future__ import annotations
+import asyncio
+import os
+import resource
+import time
+import weakref
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+
+from colbuilder.core.utils.exceptions import SystemError
+from colbuilder.core.utils.logger import setup_logger
+
+LOG = setup_logger(__name__)
+
+_MAX_PROCESSES: int = os.cpu_count() or 1
+_SEMAPHORES: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+@dataclass
+class RunResult:
+    """
+    Result of an external tool call.
+
+    Attributes:
+        command (List[str]): Command with arguments.
+        returncode (int): Exit code of the process.
+        stdout (str): Standard output.
+        stderr (str): Standard error.
+        wall_time (float): Wall time in seconds.
+        cpu_time (float): User and system CPU time of terminated child processes during the call in seconds.
+            With concurrent calls this includes children of other calls that terminated meanwhile.
+        max_rss (int): Maximum resident set size of all terminated child processes so far in kB.
+        timed_out (bool): Whether the process was killed after the timeout.
+    """
+    command: List[str]
+    returncode: int
+    stdout: str = ''
+    stderr: str = ''
+    wall_time: float = 0.0
+    cpu_time: float = 0.0
+    max_rss: int = 0
+    timed_out: bool = False
+
+def set_max_processes(n_processes: Optional[int]) -> None:
+    """
+    Set the global limit of external processes running at the same time.
+
+    Args:
+        n_processes (Optional[int]): Maximum number of processes. If None, uses all CPUs.
+    """
+    global _MAX_PROCESSES
+    _MAX_PROCESSES = max(1, n_processes or os.cpu_count() or 1)
+    _SEMAPHORES.clear()
+
+def get_semaphore() -> asyncio.Semaphore:
+    """
+    Get the semaphore limiting external processes of the running event loop.
+
+    Returns:
+        asyncio.Semaphore: Semaphore with the global process limit.
+    """
+    loop = asyncio.get_running_loop()
+    if loop not in _SEMAPHORES:
+        _SEMAPHORES[loop] = asyncio.Semaphore(_MAX_PROCESSES)
+    return _SEMAPHORES[loop]
+
+async def _stream(stream: Optional[asyncio.StreamReader], name: str, lines: List[str]) -> None:
+    """
+    Read a stream line by line, logging and collecting each line.
+
+    Args:
+        stream (Optional[asyncio.StreamReader]): Output stream of the process.
+        name (str): Prefix of the log lines, e.g. 'chimera stdout'.
+        lines (List[str]): Collected lines.
+    """
+    if stream is None:
+        return
+    async for line in stream:
+        line = line.decode(errors='replace')
+        lines.append(line)
+        LOG.debug(f"{name}: {line.rstrip()}")
+
+async def run_command(command: Sequence[Union[str, Path]], env: Optional[Dict[str, str]] = None,
+                      cwd: Optional[Union[str, Path]] = None, timeout: Optional[float] = None,
+                      check: bool = True) -> RunResult:
+    """
+    Run an external tool without a shell, within the global process limit.
+
+    Args:
+        command (Sequence[Union[str, Path]]): Command with arguments.
+        env (Optional[Dict[str, str]]): Environment variables set on top of the current environment.
+        cwd (Optional[Union[str, Path]]): Working directory of the process.
+        timeout (Optional[float]): Seconds until the process is killed. If None, waits indefinitely.
+        check (bool): Raise if the process fails or times out.
+
+    Returns:
+        RunResult: Exit code, output and resource usage of the call.
+
+    Raises:
+        SystemError: If check is set and the tool is missing, fails or times out.
+    """
+    command = [str(arg) for arg in command]
+    name = Path(command[0]).name
+    process_env = {**os.environ, **env} if env else None
+
+    async with get_semaphore():
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        start = time.perf_counter()
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *command, env=process_env, cwd=cwd,
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+            )
+        except OSError as e:
+            if not check:
+                return RunResult(command=command, returncode=127, stderr=str(e))
+            raise SystemError(
+                message=f"Failed to start {name}",
+                original_error=e,
+                error_code="SYS_ERR_003",
+                context={"command": command}
+            )
+
+        stdout, stderr = [], []
+        readers = asyncio.gather(_stream(process.stdout, f"{name} stdout", stdout),
+                                 _stream(process.stderr, f"{name} stderr", stderr))
+        timed_out = False
+        try:
+            await asyncio.wait_for(asyncio.shield(readers), timeout=timeout)
+            await process.wait()
+        except asyncio.TimeoutError:
+            timed_out = True
+            process.kill()
+            await process.wait()
+            await readers
+
+        wall_time = time.perf_counter() - start
+        after = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    result = RunResult(
+        command=command,
+        returncode=process.returncode,
+        stdout=''.join(stdout),
+        stderr=''.join(stderr),
+        wall_time=wall_time,
+        cpu_time=(after.ru_utime - usage.ru_utime) + (after.ru_stime - usage.ru_stime),
+        max_rss=after.ru_maxrss,
+        timed_out=timed_out
+    )
+    LOG.debug(f"{name} finished with code {result.returncode} in {result.wall_time:.2f} s "
+              f"(CPU {result.cpu_time:.2f} s, max RSS {result.max_rss} kB)")
+
+    if check and (timed_out or result.returncode != 0):
+        raise SystemError(
+            message=f"{name} timed out after {timeout} s" if timed_out else f"{name} failed with code {result.returncode}",
+            error_code="SYS_ERR_003",
+            context={"command": command, "returncode": result.returncode, "stderr": result.stderr[-2000:]}
+        )
+    return result
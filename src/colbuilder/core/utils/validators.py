@@ -3,6 +3,7 @@ from typing import List, Set, Optional
 from pathlib import Path
 import re
 
+from . import pdbio
 from .exceptions import (
     ColbuilderError,
     ColbuilderErrorDetail,
@@ -169,30 +170,11 @@ class BioformatValidator:
                 error_code="GEO_ERR_001"
             )
 
-        cryst_found = False
-        chains = set()
-        current_chain = None
-        ter_count = 0
-
-        for line in lines:
-            if not line.strip():
-                continue
-
-            if line.startswith('CRYST1'):
-                cryst_found = True
-            elif line.startswith('ATOM'):
-                try:
-                    chain_id = line[21]
-                    chains.add(chain_id)
-                    current_chain = chain_id
-                except IndexError:
-                    raise GeometryGenerationError(
-                        message=f"Invalid ATOM record format found: {line}",
-                        error_code="GEO_ERR_005"
-                    )
-            elif line.startswith('TER'):
-                if current_chain:
-                    ter_count += 1
+        cryst_found = any(line.startswith('CRYST1') for line in lines)
+        atoms = pdbio.parse_atoms(lines)
+        chains = set(atoms['chain'][atoms['record'] == 'ATOM  '].tolist())
+        first_atom = next((i for i, line in enumerate(lines) if line.startswith('ATOM')), len(lines))
+        ter_count = sum(1 for line in lines[first_atom:] if line.startswith('TER'))
 
         # Check for CRYST1 record
         if not cryst_found:
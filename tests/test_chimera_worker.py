@@ -0,0 +1,105 @@
+# Copyright (c) 2024, Colbuilder Development Team
+# Distributed under the terms of the Apache License 2.0
+
+"""
+Tests of the persistent Chimera worker protocol against the fake worker of
+chimera_scripts/worker.py, which answers requests without running Chimera.
+"""
+
+import asyncio
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import colbuilder
+from colbuilder.core.geometry import chimera
+from colbuilder.core.geometry.chimera import WORKER_PREFIX, ChimeraWorker, close_workers, get_worker
+
+CHIMERA_DIR = Path(colbuilder.__file__).parent / 'chimera_scripts'
+FAKE_COMMAND = [sys.executable, str(CHIMERA_DIR / 'worker.py'), '--fake']
+
+@pytest.fixture
+def worker():
+    return ChimeraWorker(CHIMERA_DIR, command=FAKE_COMMAND)
+
+def test_ready_handshake():
+    process = subprocess.run(FAKE_COMMAND, input='', capture_output=True, text=True, timeout=30)
+    assert process.returncode == 0
+    line = process.stdout.splitlines()[0]
+    assert line.startswith(WORKER_PREFIX)
+    assert json.loads(line[len(WORKER_PREFIX):]) == {'ready': True}
+
+def test_start(worker):
+    async def run():
+        await worker.start(timeout=30)
+        running = worker.running
+        await worker.close()
+        return running
+
+    assert asyncio.run(run())
+
+def test_request_existing_script(worker):
+    async def run():
+        try:
+            return await worker.request('swapaa.py', env={'FOO': 'bar'}, args=['1.pdb', 2], timeout=30)
+        finally:
+            await worker.close()
+
+    result = asyncio.run(run())
+    assert result.returncode == 0
+    assert result.stderr == ''
+    assert result.command[-3:] == ['swapaa.py', '1.pdb', '2']
+
+def test_request_unknown_script(worker):
+    async def run():
+        try:
+            return await worker.request('missing.py', timeout=30)
+        finally:
+            await worker.close()
+
+    result = asyncio.run(run())
+    assert result.returncode == 1
+    assert 'Script not found' in result.stderr
+
+def test_process_reused(worker):
+    async def run():
+        try:
+            results = []
+            pids = set()
+            for script in ('swapaa.py', 'missing.py', 'matrixset.py'):
+                results.append(await worker.request(script, timeout=30))
+                pids.add(worker.process.pid)
+            return results, pids
+        finally:
+            await worker.close()
+
+    results, pids = asyncio.run(run())
+    assert [result.returncode for result in results] == [0, 1, 0]
+    assert len(pids) == 1
+    assert worker.n_requests == 3
+
+def test_close(worker):
+    async def run():
+        await worker.request('swapaa.py', timeout=30)
+        await worker.close()
+
+    asyncio.run(run())
+    assert not worker.running
+    assert worker.process.returncode == 0
+
+def test_close_workers():
+    async def run():
+        shared = get_worker(CHIMERA_DIR)
+        assert get_worker(CHIMERA_DIR) is shared
+        shared.command = FAKE_COMMAND
+        result = await shared.request('swapaa.py', timeout=30)
+        await close_workers()
+        return shared, result
+
+    shared, result = asyncio.run(run())
+    assert result.returncode == 0
+    assert not shared.running
+    assert chimera._WORKERS == {}